@@ -0,0 +1,113 @@
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+# Seconds a verified credential stays cached (0 disables the cache)
+AUTH_CACHE_TTL = float(os.getenv("AUTH_CACHE_TTL", "300"))
+# Maximum number of cached users before least recently used entries are evicted
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+
+
+class AuthenticatedUser(NamedTuple):
+    """The parts of a User row that request handlers need after authentication"""
+    id: int
+    email: str
+    role: str
+
+
+class AuthCache:
+    """In-process TTL + LRU cache of verified credentials keyed on email.
+
+    Only a keyed digest of the password is kept, never the password itself.
+    Entries are per worker: call invalidate() wherever a user's password or
+    role changes; other workers keep the old entry for at most the TTL.
+    """
+
+    def __init__(self, ttl: float = AUTH_CACHE_TTL, max_size: int = AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # email -> (digest, user, expires_at)
+        self._lock = threading.Lock()
+        self._secret = os.urandom(32)
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    @staticmethod
+    def _key(email: str) -> str:
+        """The email from a request header and from the users row may differ in case"""
+        return email.strip().lower()
+
+    def _digest(self, password: str) -> bytes:
+        return hmac.new(self._secret, password.encode("utf-8"), hashlib.sha256).digest()
+
+    def get(self, email: str, password: str) -> Optional[AuthenticatedUser]:
+        """Return the cached user if the credentials match a live entry"""
+        if not self.enabled:
+            return None
+        digest = self._digest(password)
+        key = self._key(email)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            cached_digest, user, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            if not hmac.compare_digest(cached_digest, digest):
+                # Wrong password: let the caller fall back to the database check
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return user
+
+    def put(self, user: AuthenticatedUser, password: str) -> AuthenticatedUser:
+        """Remember credentials that were just verified against the database"""
+        if not self.enabled:
+            return user
+        entry = (self._digest(password), user, time.monotonic() + self.ttl)
+        key = self._key(user.email)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return user
+
+    def invalidate(self, email: str) -> None:
+        """Drop a user's entry, e.g. after registration, role or password change"""
+        with self._lock:
+            self._entries.pop(self._key(email), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+auth_cache = AuthCache()
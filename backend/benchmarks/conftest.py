@@ -0,0 +1,44 @@
+"""pytest-benchmark suite, kept out of the default test run:
+
+    python -m pytest benchmarks                # full scale (1M books, users and orders scaled to match)
+    python -m pytest benchmarks --scale 10k    # quick run
+    python -m pytest benchmarks --benchmark-save=before
+    python -m pytest benchmarks --benchmark-compare --benchmark-compare-fail=median:25%
+
+The backend reads its configuration when imported, so the environment is set
+in pytest_configure, before any benchmark imports it. The endpoint benchmarks
+seed backend/benchmark-<scale>.db once and reuse it (delete it to reseed);
+BENCHMARK_DB_URL points them at another, already seeded database.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+# (books, users, orders) per scale
+SCALES = {
+    "10k": (10_000, 1_000, 10_000),
+    "100k": (100_000, 10_000, 100_000),
+    "1m": (1_000_000, 100_000, 1_000_000),
+}
+
+
+def pytest_addoption(parser):
+    parser.addoption("--scale", choices=sorted(SCALES), default="1m", help="Catalog size to benchmark (default 1m)")
+
+
+def pytest_configure(config):
+    scale = config.getoption("--scale")
+    os.environ["DB_URL"] = os.getenv("BENCHMARK_DB_URL") or f"sqlite:///{BACKEND_DIR / f'benchmark-{scale}.db'}"
+    os.environ.setdefault("MAIL_ENABLED", "false")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("DB_SLOW_QUERY_MS", "1000000")
+
+
+@pytest.fixture(scope="session")
+def scale(request) -> str:
+    return request.config.getoption("--scale")
@@ -0,0 +1,186 @@
+"""Latency of the API endpoints, in-process, against a seeded catalog.
+
+Every case also has a budget of SQL statements per request, checked on one
+warm call before timing: a query per row (N+1) fails the benchmark even when
+the seeded scale hides it in the timings.
+"""
+import itertools
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import SCALES
+
+# Rough time budget per case; every case runs between 5 and 100 rounds
+CASE_SECONDS = 2.0
+
+
+class Context:
+    """Seeded ids and logged-in clients shared by the cases"""
+
+    def __init__(self, client, user_headers, admin_headers, book_ids, owned_book_id):
+        self.client = client
+        self.user = user_headers
+        self.admin = admin_headers
+        self.book_ids = book_ids
+        self.owned_book_id = owned_book_id
+        self._books = itertools.cycle(book_ids)
+        self._emails = itertools.count()
+
+    def next_book(self) -> int:
+        return next(self._books)
+
+    def new_email(self) -> str:
+        return f"bench-{time.time_ns()}-{next(self._emails)}@example.com"
+
+
+class Case:
+    """One benchmarked request; prepare() runs untimed before each call and returns its argument"""
+
+    def __init__(self, name, request, max_queries, prepare=None):
+        self.name = name
+        self.request = request
+        self.max_queries = max_queries
+        self.prepare = prepare
+
+
+def pending_order(ctx: Context) -> int:
+    return ctx.client.post("/buy", json={"book_id": ctx.next_book()}, headers=ctx.user).json()["order_id"]
+
+
+def download_link(ctx: Context) -> str:
+    return ctx.client.get(f"/books/{ctx.owned_book_id}/download-link", headers=ctx.user).json()["url"]
+
+
+def export_window() -> dict:
+    end = datetime.utcnow()
+    return {"start": (end - timedelta(days=7)).isoformat(), "end": end.isoformat()}
+
+
+CASES = [
+    Case("GET /books", lambda ctx, _: ctx.client.get("/books"), 0),
+    Case("GET /books (user)", lambda ctx, _: ctx.client.get("/books", headers=ctx.user), 1),
+    Case("GET /books?limit=50&sort=price", lambda ctx, _: ctx.client.get("/books", params={"limit": 50, "sort": "price"}), 1),
+    Case("GET /books?limit=200", lambda ctx, _: ctx.client.get("/books", params={"limit": 200}, headers=ctx.user), 2),
+    Case("GET /books?author=...", lambda ctx, _: ctx.client.get("/books", params={"limit": 50, "author": "Author 1"}), 1),
+    Case("GET /books/search", lambda ctx, _: ctx.client.get("/books/search", params={"q": "silent gar"}), 1),
+    Case("POST /login", lambda ctx, _: ctx.client.post("/login", json={"email": ctx.user_email, "password": ctx.password}), 1),
+    Case(
+        "POST /register",
+        lambda ctx, email: ctx.client.post("/register", json={"email": email, "password": "Password123!"}),
+        3,
+        prepare=lambda ctx: ctx.new_email(),
+    ),
+    Case("POST /buy", lambda ctx, _: ctx.client.post("/buy", json={"book_id": ctx.next_book()}, headers=ctx.user), 3),
+    Case(
+        "POST /cart/checkout",
+        lambda ctx, book_ids: ctx.client.post("/cart/checkout", json={"book_ids": book_ids}, headers=ctx.user),
+        3,
+        prepare=lambda ctx: [ctx.next_book() for _ in range(5)],
+    ),
+    Case(
+        "POST /payment/verify",
+        lambda ctx, order_id: ctx.client.post("/payment/verify", params={"order_id": order_id}, headers=ctx.user),
+        3,
+        prepare=pending_order,
+    ),
+    Case("GET /me/library", lambda ctx, _: ctx.client.get("/me/library", headers=ctx.user), 1),
+    Case(
+        "GET /books/{id}/download",
+        lambda ctx, _: ctx.client.get(f"/books/{ctx.owned_book_id}/download", headers=ctx.user, follow_redirects=False),
+        0,
+    ),
+    Case("GET /downloads/{token}", lambda ctx, url: ctx.client.get(url, follow_redirects=False), 0, prepare=download_link),
+    Case("GET /admin/orders", lambda ctx, _: ctx.client.get("/admin/orders", params={"limit": 50}, headers=ctx.admin), 2),
+    Case("GET /admin/orders?limit=500", lambda ctx, _: ctx.client.get("/admin/orders", params={"limit": 500}, headers=ctx.admin), 2),
+    Case(
+        "GET /admin/orders/export",
+        lambda ctx, _: ctx.client.get("/admin/orders/export", params=export_window(), headers=ctx.admin),
+        1,
+    ),
+    Case("GET /admin/stats", lambda ctx, _: ctx.client.get("/admin/stats", headers=ctx.admin), 0),
+    Case("GET /admin/books", lambda ctx, _: ctx.client.get("/admin/books", headers=ctx.admin), 1),
+]
+
+
+@pytest.fixture(scope="session")
+def ctx(scale):
+    from fastapi.testclient import TestClient
+
+    import manage
+    from db import SessionLocal, engine
+    from models import Book, Entitlement, User
+
+    manage.run_migrations()
+    with SessionLocal() as db:
+        seeded = db.query(Book.id).first() is not None
+    if not seeded:
+        start = time.perf_counter()
+        counts = manage.seed_database(engine, *SCALES[scale])
+        print(f"\nSeeded {counts} in {time.perf_counter() - start:.1f}s")
+
+    import main
+
+    with SessionLocal() as db:
+        user_id, user_email = db.query(User.id, User.email).filter(User.role == "user").order_by(User.id).first()
+        book_ids = [book_id for (book_id,) in db.query(Book.id).order_by(Book.id).limit(1000)]
+        owned = db.query(Entitlement.book_id).filter(Entitlement.user_id == user_id).first()
+    if owned is None:
+        pytest.fail(f"{user_email} owns no book; reseed the benchmark database")
+
+    with TestClient(main.app) as client:
+        # Startup builds the search index in the background; wait for it
+        deadline = time.monotonic() + 600
+        while not main.search_index.ready and time.monotonic() < deadline:
+            time.sleep(0.1)
+
+        def login(email):
+            res = client.post("/login", json={"email": email, "password": manage.SEED_PASSWORD})
+            res.raise_for_status()
+            return {"Authorization": f"Bearer {res.json()['access_token']}"}
+
+        context = Context(client, login(user_email), login(manage.SEED_ADMIN_EMAIL), book_ids, owned[0])
+        context.user_email, context.password = user_email, manage.SEED_PASSWORD
+        yield context
+
+
+class StatementCount:
+    """SQL statements sent through the engine while active"""
+
+    def __enter__(self):
+        from db_metrics import pool_metrics
+
+        self.pool_metrics = pool_metrics
+        self.before = pool_metrics.queries
+        return self
+
+    def __exit__(self, *exc):
+        self.count = self.pool_metrics.queries - self.before
+
+
+@pytest.mark.parametrize("case", CASES, ids=[case.name for case in CASES])
+def test_endpoint(benchmark, ctx, case):
+    def call(argument=None):
+        res = case.request(ctx, argument)
+        assert res.status_code < 400, f"{case.name} returned {res.status_code}: {res.text[:200]}"
+        return res
+
+    def prepared():
+        return ((case.prepare(ctx) if case.prepare else None,), {})
+
+    # Warm caches (auth, catalog snapshot) so the budget counts the steady state
+    call(*prepared()[0])
+    argument = prepared()[0]
+    start = time.perf_counter()
+    with StatementCount() as statements:
+        res = call(*argument)
+    elapsed = time.perf_counter() - start
+    benchmark.extra_info["queries_per_request"] = statements.count
+    body = res.json() if res.headers.get("content-type", "").startswith("application/json") else None
+    benchmark.extra_info["rows"] = len(body) if isinstance(body, list) else 1
+    assert statements.count <= case.max_queries, f"{case.name}: {statements.count} statements (budget {case.max_queries})"
+
+    # Whole-catalog responses take seconds at 1M books; spend about as long on each case
+    rounds = max(5, min(100, int(CASE_SECONDS / max(elapsed, 1e-6))))
+    benchmark.pedantic(call, setup=prepared, rounds=rounds, warmup_rounds=min(5, rounds))
@@ -0,0 +1,57 @@
+"""The in-memory index must answer in single-digit milliseconds at 1M titles"""
+import itertools
+import random
+import statistics
+import time
+
+import pytest
+
+from conftest import SCALES
+from search import SearchIndex
+
+SYLLABLES = "ka lo mi ren tor sa vel dun ar el om pre qui zan bo th ess ul ine ca".split()
+
+
+@pytest.fixture(scope="module")
+def vocabulary():
+    """Made-up words, most frequent first"""
+    rng = random.Random(11)
+    words = sorted({"".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))) for _ in range(40_000)})
+    rng.shuffle(words)
+    return words
+
+
+@pytest.fixture(scope="module")
+def index(scale, vocabulary):
+    """Synthetic titles drawn from a Zipf-like vocabulary, so some words are very common"""
+    rng = random.Random(11)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(vocabulary))))
+    index = SearchIndex()
+    start = time.perf_counter()
+    for book_id in range(1, SCALES[scale][0] + 1):
+        words = rng.choices(vocabulary, cum_weights=cum_weights, k=4)
+        index._add(book_id, " ".join(words[:3]), f"Author {book_id % 50_000}", words[3])
+    index._sorted_terms = sorted(index._postings)
+    index._terms_dirty = False
+    print(f"\nIndexed {len(index)} books in {time.perf_counter() - start:.1f}s")
+    return index
+
+
+def queries(vocabulary) -> dict:
+    common, rare = vocabulary[0], vocabulary[5_000]
+    return {
+        "common word": common,
+        "rare word": rare,
+        "prefix": common[:2],
+        "two common words": f"{common} {vocabulary[1]}",
+        "word and prefix": f"{vocabulary[2]} {common[:3]}",
+        "author": "author 4217",
+    }
+
+
+@pytest.mark.parametrize("case", ["common word", "rare word", "prefix", "two common words", "word and prefix", "author"])
+def test_search(benchmark, index, vocabulary, case):
+    query = queries(vocabulary)[case]
+    result = benchmark(index.search, query, 20)
+    assert result
+    assert statistics.median(benchmark.stats.stats.data) < 0.010, f"{query!r} is slower than 10ms"
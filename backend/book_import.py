@@ -0,0 +1,209 @@
+import csv
+import json
+import os
+import tempfile
+from decimal import Decimal, InvalidOperation
+from typing import AsyncIterator, Iterable, Iterator, Optional, Tuple
+
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session
+
+from models import Book
+
+
+# Rows written per executemany; each batch is committed on its own
+BOOK_IMPORT_BATCH_SIZE = int(os.getenv("BOOK_IMPORT_BATCH_SIZE", "1000"))
+# Row errors listed in the import report; any further errors are only counted
+BOOK_IMPORT_MAX_ERRORS = int(os.getenv("BOOK_IMPORT_MAX_ERRORS", "1000"))
+# Request bodies larger than this are spooled to a temporary file
+BOOK_IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+IMPORT_FORMATS = ("ndjson", "csv")
+
+# Column lengths of the books table
+_MAX_LENGTHS = {"title": 255, "author": 255, "pdf_url": 500}
+_MAX_PRICE = Decimal("99999999.99")  # Numeric(10, 2)
+
+_books = Book.__table__
+# Matched by id; the SET clause comes from the other keys of each row
+_UPDATE_BOOK = _books.update().where(_books.c.id == bindparam("book_id"))
+
+
+def validate_book_urls(pdf_url: str, cover_url: Optional[str]) -> None:
+    """URL rules shared by POST /admin/books and the bulk import; raises ValueError"""
+    if not pdf_url.startswith(("http://", "https://")):
+        raise ValueError("PDF URL must be a valid HTTP/HTTPS URL")
+    if cover_url and not cover_url.startswith(("http://", "https://")):
+        raise ValueError("Cover image URL must be a valid HTTP/HTTPS URL")
+
+
+def _text(record: dict, field: str, required: bool) -> Optional[str]:
+    value = record.get(field)
+    if value is None or value == "":
+        if required:
+            raise ValueError(f"{field} is required")
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f"{field} must be a string")
+    value = value.strip()
+    if field in _MAX_LENGTHS and len(value) > _MAX_LENGTHS[field]:
+        raise ValueError(f"{field} is longer than {_MAX_LENGTHS[field]} characters")
+    if required and not value:
+        raise ValueError(f"{field} is required")
+    return value or None
+
+
+def _price(value) -> Decimal:
+    if value is None or value == "" or isinstance(value, bool):
+        raise ValueError("price is required")
+    try:
+        price = Decimal(str(value).strip())
+    except InvalidOperation:
+        raise ValueError("price must be a number")
+    if not price.is_finite() or price < 0 or price > _MAX_PRICE:
+        raise ValueError("price must be a non-negative number below 100000000")
+    return price.quantize(Decimal("0.01"))
+
+
+def book_values(record) -> dict:
+    """Validate one import record and return its books table values; raises ValueError"""
+    if not isinstance(record, dict):
+        raise ValueError("Expected a JSON object")
+    values = {
+        "title": _text(record, "title", True),
+        "author": _text(record, "author", True),
+        "price": _price(record.get("price")),
+        "description": _text(record, "description", False),
+        "pdf_path": _text(record, "pdf_url", True),  # pdf_path stores the URL
+        "cover_url": _text(record, "cover_url", False),
+    }
+    validate_book_urls(values["pdf_path"], values["cover_url"])
+    return values
+
+
+def decode_lines(lines: Iterable[bytes]) -> Iterator[str]:
+    """UTF-8 text lines from binary lines, dropping a leading byte order mark"""
+    first = True
+    for line in lines:
+        text = line.decode("utf-8", errors="replace")
+        if first:
+            text = text.lstrip("\ufeff")
+            first = False
+        yield text
+
+
+def read_records(lines: Iterable[str], format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """(line number, record, parse error) for each record of a CSV or NDJSON stream"""
+    if format == "csv":
+        reader = csv.DictReader(lines)
+        try:
+            fieldnames = reader.fieldnames
+        except csv.Error as e:
+            raise ValueError(f"Invalid CSV header: {str(e)}")
+        missing = {"title", "author", "price", "pdf_url"} - set(fieldnames or ())
+        if missing:
+            raise ValueError(f"CSV header is missing: {', '.join(sorted(missing))}")
+        while True:
+            # A malformed row (e.g. a field over csv.field_size_limit()) fails on
+            # its own, reported at the line it starts on; the reader carries on
+            start = reader.line_num + 1
+            try:
+                record = next(reader)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                yield start, None, f"Invalid CSV: {str(e)}"
+                continue
+            yield reader.line_num, record, None
+    for number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            yield number, json.loads(line), None
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {str(e)}"
+
+
+def existing_books(db: Session, pdf_urls) -> dict:
+    """pdf_path -> id of the books already stored under these URLs"""
+    return dict(db.execute(select(_books.c.pdf_path, _books.c.id).where(_books.c.pdf_path.in_(pdf_urls))).all())
+
+
+def _write_batch(db: Session, batch: dict, superseded: int, report: dict) -> None:
+    """Insert new URLs and update known ones: one lookup, one INSERT and one UPDATE executemany"""
+    try:
+        existing = existing_books(db, list(batch))
+        inserts, updates = [], []
+        for pdf_path, (line, values) in batch.items():
+            if pdf_path in existing:
+                updates.append(dict(values, book_id=existing[pdf_path]))
+            else:
+                inserts.append(values)
+        if inserts:
+            db.execute(_books.insert(), inserts)
+        if updates:
+            db.execute(_UPDATE_BOOK, updates)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        message = f"Database error: {str(e).splitlines()[0]}"
+        for line, _ in batch.values():
+            _add_error(report, line, message)
+        return
+    report["inserted"] += len(inserts)
+    # Rows replaced by a later row for the same URL count as updates of it
+    report["updated"] += len(updates) + superseded
+
+
+def _add_error(report: dict, line: int, message: str) -> None:
+    report["failed"] += 1
+    if len(report["errors"]) < BOOK_IMPORT_MAX_ERRORS:
+        report["errors"].append({"line": line, "error": message})
+
+
+def import_books(db: Session, lines: Iterable[str], format: str = "ndjson", batch_size: int = BOOK_IMPORT_BATCH_SIZE) -> dict:
+    """Upsert books from CSV or NDJSON lines, matching existing books by pdf_url.
+
+    Invalid rows are reported by line number and skipped; the valid rows are
+    written in batches. A later row for the same pdf_url updates the book
+    written by an earlier one. Raises ValueError if the input can't be read
+    at all (e.g. a CSV header without the required columns).
+    """
+    if format not in IMPORT_FORMATS:
+        raise ValueError(f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    report = {"rows": 0, "inserted": 0, "updated": 0, "failed": 0, "errors": []}
+    batch = {}  # pdf_path -> (line, values)
+    superseded = 0
+    for line, record, error in read_records(lines, format):
+        report["rows"] += 1
+        if error is None:
+            try:
+                values = book_values(record)
+            except ValueError as e:
+                error = str(e)
+        if error is not None:
+            _add_error(report, line, error)
+            continue
+        if values["pdf_path"] in batch:
+            superseded += 1
+        batch[values["pdf_path"]] = (line, values)
+        if len(batch) >= batch_size:
+            _write_batch(db, batch, superseded, report)
+            batch, superseded = {}, 0
+    if batch:
+        _write_batch(db, batch, superseded, report)
+    return report
+
+
+def import_books_file(db: Session, file, format: str = "ndjson") -> dict:
+    """import_books over a binary file object"""
+    file.seek(0)
+    return import_books(db, decode_lines(file), format)
+
+
+async def spool_body(chunks: AsyncIterator[bytes]):
+    """Copy a streamed request body to a temporary file, in memory until it gets large"""
+    file = tempfile.SpooledTemporaryFile(max_size=BOOK_IMPORT_SPOOL_BYTES)
+    async for chunk in chunks:
+        file.write(chunk)
+    return file
@@ -0,0 +1,410 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+# memory keeps one cache per worker; file shares a SQLite file between the
+# workers of one host; redis shares a server between hosts (needs redis)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# file: path of the SQLite file; redis: redis://host:6379/0
+CACHE_URL = os.getenv("CACHE_URL", "")
+# Entries kept by the memory and file backends before the oldest are dropped
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# Seconds a namespace version read from a shared backend is reused by this worker
+CACHE_VERSION_CHECK_INTERVAL = float(os.getenv("CACHE_VERSION_CHECK_INTERVAL", "1"))
+# Longest a caller waits for another worker's loader before running its own (seconds)
+CACHE_LOCK_TIMEOUT = float(os.getenv("CACHE_LOCK_TIMEOUT", "10"))
+
+_DEFAULT_FILE = Path(__file__).parent / "cache.sqlite3"
+
+
+class MemoryBackend:
+    """Values held in this process, least recently used dropped first.
+
+    Counters (the namespace versions) are kept apart and never evicted:
+    losing one would restart it at 0 and bring old entries back to life.
+    """
+
+    shared = False
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, expires_at or None)
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _live(self, key: str, now: float):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= now:
+            del self._entries[key]
+            return None
+        return entry
+
+    def _store(self, key: str, value: Any, ttl: Optional[float]) -> None:
+        """Insert or replace an entry (caller holds the lock)"""
+        self._entries[key] = (value, time.monotonic() + ttl if ttl else None)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._live(key, time.monotonic())
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._store(key, value, ttl)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """Set only if the key is absent; True if this call set it"""
+        with self._lock:
+            if self._live(key, time.monotonic()) is not None:
+                return False
+            self._store(key, value, ttl)
+            return True
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = self._versions.get(key, 0) + 1
+            self._versions[key] = value
+            return value
+
+    def get_version(self, key: str) -> int:
+        with self._lock:
+            return self._versions.get(key, 0)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class FileBackend:
+    """Pickled values in a SQLite file shared by the workers of one host.
+
+    SQLite does the cross-process locking; WAL mode lets readers proceed
+    while another worker writes.
+    """
+
+    shared = True
+
+    def __init__(self, path: str = "", max_entries: int = CACHE_MAX_ENTRIES):
+        self.path = path or str(_DEFAULT_FILE)
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Any:
+        row = self._connect().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._connect().execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, pickle.dumps(value), time.time() + ttl if ttl else None),
+        )
+        self._after_write()
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        now = time.time()
+        conn = self._connect()
+        # Takes the write lock first, so the check and the insert are atomic
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM cache WHERE key = ? AND expires_at <= ?", (key, now))
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, pickle.dumps(value), now + ttl if ttl else None),
+            ).rowcount == 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return inserted
+
+    def delete(self, key: str) -> None:
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def incr(self, key: str) -> int:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = (pickle.loads(row[0]) if row else 0) + 1
+            conn.execute("INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, NULL)", (key, pickle.dumps(value)))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def _after_write(self) -> None:
+        """Every 100 writes, drop expired rows and trim to max_entries (soonest to expire first)"""
+        self._writes += 1
+        if self._writes % 100:
+            return
+        conn = self._connect()
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            "DELETE FROM cache WHERE key IN (SELECT key FROM cache WHERE expires_at IS NOT NULL "
+            "ORDER BY expires_at LIMIT max(0, (SELECT count(*) FROM cache) - ?))",
+            (self.max_entries,),
+        )
+
+    def __len__(self) -> int:
+        return self._connect().execute("SELECT count(*) FROM cache").fetchone()[0]
+
+
+class RedisBackend:
+    """Pickled values in Redis, shared by every worker on every host.
+
+    Pass client to use an existing connection (e.g. fakeredis.FakeRedis()).
+    """
+
+    shared = True
+
+    def __init__(self, url: str = "", client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url or "redis://localhost:6379/0", socket_timeout=0.5, socket_connect_timeout=0.5)
+        self._client = client
+
+    def get(self, key: str) -> Any:
+        value = self._client.get(key)
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        self._client.set(key, pickle.dumps(value), px=int(ttl * 1000) if ttl else None)
+
+    def add(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        return bool(self._client.set(key, pickle.dumps(value), px=int(ttl * 1000) if ttl else None, nx=True))
+
+    def delete(self, key: str) -> None:
+        self._client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return int(self._client.incr(key))
+
+    def get_version(self, key: str) -> int:
+        value = self._client.get(key)
+        return int(value) if value is not None else 0
+
+    def __len__(self) -> int:
+        return -1  # Not tracked; the keys live in Redis
+
+
+class _Flight:
+    __slots__ = ("done", "value", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class Cache:
+    """Namespaced, versioned cache with single-flight loading over a backend.
+
+    Each namespace has a version number stored in the backend; bump()
+    increments it, which orphans every key of the namespace at once on every
+    worker sharing the backend (orphans expire through their TTL or LRU).
+    Backend errors are logged and treated as misses, so a cache outage slows
+    requests down but never fails them.
+    """
+
+    def __init__(self, backend, prefix: str = "nopaper", version_check_interval: float = CACHE_VERSION_CHECK_INTERVAL):
+        self.backend = backend
+        self.prefix = prefix
+        self.version_check_interval = version_check_interval if backend.shared else 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.errors = 0
+        self._versions: Dict[str, tuple] = {}  # namespace -> (version, read_at)
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+
+    def _failed(self, action: str, e: Exception) -> None:
+        with self._lock:
+            self.errors += 1
+        print(f"Cache {action} failed: {str(e)}")
+
+    def _version_key(self, namespace: str) -> str:
+        return f"{self.prefix}:{namespace}:version"
+
+    def version(self, namespace: str) -> int:
+        """Current version of a namespace, re-read from a shared backend at most once per interval"""
+        now = time.monotonic()
+        cached = self._versions.get(namespace)
+        if cached is not None and now - cached[1] < self.version_check_interval:
+            return cached[0]
+        try:
+            key = self._version_key(namespace)
+            # Redis INCR stores a plain integer rather than a pickle
+            getter = getattr(self.backend, "get_version", self.backend.get)
+            version = getter(key) or 0
+        except Exception as e:
+            self._failed("version read", e)
+            return cached[0] if cached else 0
+        self._versions[namespace] = (version, now)
+        return version
+
+    def bump(self, namespace: str) -> int:
+        """Invalidate every key of the namespace, on every worker sharing the backend"""
+        try:
+            version = self.backend.incr(self._version_key(namespace))
+        except Exception as e:
+            self._failed("bump", e)
+            # Still move this worker on, so at least its own stale entries are dropped
+            version = self.version(namespace) + 1
+        self._versions[namespace] = (version, time.monotonic())
+        return version
+
+    def key(self, namespace: str, key: str) -> str:
+        return f"{self.prefix}:{namespace}:v{self.version(namespace)}:{key}"
+
+    def get(self, namespace: str, key: str) -> Any:
+        """Cached value, or None on a miss (so None itself cannot be cached)"""
+        try:
+            value = self.backend.get(self.key(namespace, key))
+        except Exception as e:
+            self._failed("get", e)
+            value = None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, namespace: str, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        try:
+            self.backend.set(self.key(namespace, key), value, ttl)
+        except Exception as e:
+            self._failed("set", e)
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self.backend.delete(self.key(namespace, key))
+        except Exception as e:
+            self._failed("delete", e)
+
+    def get_or_set(self, namespace: str, key: str, loader: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """Return the cached value or load it, running the loader once per key at a time.
+
+        Threads of this worker wait for the first one's result. With a shared
+        backend, other workers wait (up to CACHE_LOCK_TIMEOUT) for the value
+        the lock holder stores.
+        """
+        value = self.get(namespace, key)
+        if value is not None:
+            return value
+        full_key = self.key(namespace, key)
+        with self._lock:
+            flight = self._flights.get(full_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[full_key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+        try:
+            flight.value = self._load(namespace, key, full_key, loader, ttl)
+            return flight.value
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[full_key]
+            flight.done.set()
+
+    def _load(self, namespace: str, key: str, full_key: str, loader: Callable[[], Any], ttl: Optional[float]) -> Any:
+        lock_key = full_key + ":lock"
+        locked = False
+        if self.backend.shared:
+            try:
+                locked = self.backend.add(lock_key, 1, CACHE_LOCK_TIMEOUT)
+                if not locked:
+                    # Another worker is loading: wait for the value it stores
+                    deadline = time.monotonic() + CACHE_LOCK_TIMEOUT
+                    while time.monotonic() < deadline:
+                        time.sleep(0.02)
+                        value = self.backend.get(full_key)
+                        if value is not None:
+                            return value
+            except Exception as e:
+                self._failed("lock", e)
+        try:
+            with self._lock:
+                self.loads += 1
+            value = loader()
+            if value is not None:
+                try:
+                    self.backend.set(full_key, value, ttl)
+                except Exception as e:
+                    self._failed("set", e)
+            return value
+        finally:
+            if locked:
+                try:
+                    self.backend.delete(lock_key)
+                except Exception as e:
+                    self._failed("unlock", e)
+
+    def stats(self) -> dict:
+        try:
+            entries = len(self.backend)
+        except Exception:
+            entries = -1
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__.replace("Backend", "").lower(),
+                "entries": entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "loads": self.loads,
+                "errors": self.errors,
+            }
+
+
+def create_backend(name: str = CACHE_BACKEND, url: str = CACHE_URL):
+    if name == "redis":
+        return RedisBackend(url)
+    if name == "file":
+        return FileBackend(url)
+    if name != "memory":
+        raise ValueError(f"Unknown CACHE_BACKEND: {name}")
+    return MemoryBackend()
+
+
+shared_cache = Cache(create_backend())
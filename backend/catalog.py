@@ -0,0 +1,177 @@
+import base64
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Optional, Set, Tuple
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from cache import shared_cache
+from db import run_db_threaded
+from dto import BOOK_COLUMNS, BookDTO
+from models import Book
+from serialization import dumps
+
+
+# Rebuild the snapshot at least this often, even if no catalog change was
+# announced through the shared cache
+CATALOG_TTL = float(os.getenv("CATALOG_TTL", "30"))
+
+
+# Sort keys accepted by GET /books, each backed by a (column, id) index
+SORT_COLUMNS = {
+    "price": Book.price,
+    "created_at": Book.created_at,
+    "title": Book.title,
+}
+
+
+class CatalogSnapshot:
+    """Pre-serialized GET /books payload, rebuilt when the catalog version changes.
+
+    The version lives in the shared cache, so a book created or deleted on
+    one worker makes every worker sharing the cache backend rebuild. Each
+    book is stored as two JSON fragments, one per is_purchased value, so a
+    user's view is spliced together without re-serializing the shared data.
+    """
+
+    def __init__(self, ttl: float = CATALOG_TTL):
+        self.ttl = ttl
+        self._built_version = -1
+        self._built_at = 0.0
+        self._fragments = []  # [(book_id, not_purchased_json, purchased_json)]
+        self._public = (b"[]", "")  # (body, ETag), swapped as one so they always match
+        self._rebuild_lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return shared_cache.version("catalog")
+
+    def bump(self) -> None:
+        """Mark the snapshot stale on every worker after a book is created or deleted"""
+        shared_cache.bump("catalog")
+
+    def is_fresh(self) -> bool:
+        return self._built_version == self.version and time.monotonic() - self._built_at < self.ttl
+
+    def rebuild(self, db: Session) -> None:
+        # Requests that find the snapshot stale together wait for one rebuild
+        with self._rebuild_lock:
+            if not self.is_fresh():
+                self._rebuild(db)
+
+    async def refresh(self) -> None:
+        """Rebuild a stale snapshot from an async handler, once for all concurrent callers.
+
+        Always on a worker thread: with DB_ASYNC, run_db would serialize every
+        book on the event loop and wait on the thread lock there.
+        """
+        await run_db_threaded(self.rebuild)
+
+    def _rebuild(self, db: Session) -> None:
+        version = self.version
+        fragments = []
+        for row in db.query(*BOOK_COLUMNS).order_by(Book.id):
+            book = BookDTO.from_row(row)
+            not_purchased = dumps(book)
+            book.is_purchased = True
+            fragments.append((book.id, not_purchased, dumps(book)))
+        public_body = b"[" + b",".join(f[1] for f in fragments) + b"]"
+        # Swap in the new state in one go; readers never see a half-built snapshot
+        self._fragments = fragments
+        self._public = (public_body, '"%s"' % hashlib.sha1(public_body).hexdigest())
+        self._built_version = version
+        self._built_at = time.monotonic()
+
+    def render(self, owned_ids: Optional[Set[int]] = None) -> Tuple[bytes, str]:
+        """Return (body, strong ETag) with is_purchased set for the owned books"""
+        fragments = self._fragments
+        if not owned_ids:
+            return self._public
+        body = b"[" + b",".join(
+            purchased if book_id in owned_ids else not_purchased
+            for book_id, not_purchased, purchased in fragments
+        ) + b"]"
+        return body, '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def encode_book_cursor(book, sort: str) -> str:
+    """Opaque keyset cursor pointing just after the given book row"""
+    value = getattr(book, sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    elif isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps([value, book.id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_book_cursor(cursor: str, sort: str):
+    """Parse a cursor from encode_book_cursor into (sort value, id); raises ValueError"""
+    try:
+        value, book_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if sort == "created_at":
+            value = datetime.fromisoformat(value)
+        elif sort == "price":
+            value = Decimal(value)
+        else:
+            value = str(value)
+        return value, int(book_id)
+    except (TypeError, ArithmeticError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+
+
+def query_books_page(
+    db: Session,
+    limit: int,
+    cursor: Optional[str] = None,
+    author: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    sort: str = "created_at",
+    descending: bool = True,
+):
+    """Return (book rows, next_cursor) for one keyset-paginated, filtered page"""
+    column = SORT_COLUMNS[sort]
+    query = db.query(*BOOK_COLUMNS)
+    if author:
+        query = query.filter(Book.author == author)
+    if min_price is not None:
+        query = query.filter(Book.price >= min_price)
+    if max_price is not None:
+        query = query.filter(Book.price <= max_price)
+    if cursor:
+        value, book_id = decode_book_cursor(cursor, sort)
+        if descending:
+            query = query.filter(or_(column < value, and_(column == value, Book.id < book_id)))
+        else:
+            query = query.filter(or_(column > value, and_(column == value, Book.id > book_id)))
+    if descending:
+        query = query.order_by(column.desc(), Book.id.desc())
+    else:
+        query = query.order_by(column.asc(), Book.id.asc())
+    # Fetch one extra row to know whether another page exists
+    books = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(books) > limit:
+        books = books[:limit]
+        next_cursor = encode_book_cursor(books[-1], sort)
+    return books, next_cursor
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against our ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag[2:] == etag if tag.startswith("W/") else tag == etag for tag in candidates)
+
+
+catalog = CatalogSnapshot()
@@ -0,0 +1,289 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import urllib.parse
+from pathlib import Path
+from typing import Tuple
+
+# Pillow is imported on first use, so workers that never resize a cover do
+# not pay for loading it
+
+
+# Thumbnails and fetched originals live here, named by the hash of their content
+COVER_CACHE_DIR = Path(os.getenv("COVER_CACHE_DIR", str(Path(__file__).parent / "uploads" / "covers")))
+# Least recently used files are deleted once the cache grows past this size
+COVER_CACHE_MAX_BYTES = int(os.getenv("COVER_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Widths thumbnails are generated at; a requested width is rounded up to one of these
+COVER_WIDTHS = tuple(sorted(int(width) for width in os.getenv("COVER_WIDTHS", "160,320,640").split(",")))
+COVER_QUALITY = int(os.getenv("COVER_QUALITY", "80"))
+# Browsers and CDNs may reuse a thumbnail this long without asking again (seconds)
+COVER_MAX_AGE = int(os.getenv("COVER_MAX_AGE", "604800"))
+COVER_FETCH_TIMEOUT = float(os.getenv("COVER_FETCH_TIMEOUT", "10"))
+# Larger source images are refused
+COVER_MAX_SOURCE_BYTES = int(os.getenv("COVER_MAX_SOURCE_BYTES", str(10 * 1024 * 1024)))
+# Source images declaring more pixels are refused before they are decoded; a
+# small compressed file can expand to gigabytes of pixels
+COVER_MAX_SOURCE_PIXELS = int(os.getenv("COVER_MAX_SOURCE_PIXELS", str(40 * 1000 * 1000)))
+# Covers are only fetched from public addresses; comma-separated networks listed
+# here (e.g. an image server on the private network) are allowed as well
+COVER_ALLOWED_NETWORKS = tuple(
+    ipaddress.ip_network(network.strip()) for network in os.getenv("COVER_ALLOWED_NETWORKS", "").split(",") if network.strip()
+)
+
+# format -> (Pillow format, media type, file extension)
+COVER_FORMATS = {
+    "webp": ("WEBP", "image/webp", ".webp"),
+    "jpeg": ("JPEG", "image/jpeg", ".jpg"),
+}
+
+
+class CoverError(Exception):
+    """The source image could not be fetched or decoded"""
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _allowed_address(ip) -> bool:
+    if ip.version == 6 and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    if any(ip in network for network in COVER_ALLOWED_NETWORKS):
+        return True
+    # Not private, loopback, link-local (cloud metadata), reserved or multicast
+    return ip.is_global and not ip.is_multicast
+
+
+def _public_address(host: str, port: int) -> tuple:
+    """Resolve host and return an address to connect to, refusing internal ones"""
+    try:
+        addresses = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    except OSError as e:
+        raise CoverError(f"Could not resolve {host}: {str(e)}")
+    # Every address is checked, so a name that also points inside is refused
+    for _, _, _, _, address in addresses:
+        if not _allowed_address(ipaddress.ip_address(address[0].split("%", 1)[0])):
+            raise CoverError(f"{host} resolves to a non-public address")
+    return addresses[0][4][:2]
+
+
+class _PublicConnection:
+    """HTTP(S) connection to the address _public_address approved.
+
+    Connecting by name would look the host up a second time, and that answer
+    could point somewhere else (DNS rebinding).
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = self._connect_public
+
+    @staticmethod
+    def _connect_public(address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        return socket.create_connection(_public_address(*address), timeout, source_address)
+
+
+class _PublicHTTPConnection(_PublicConnection, http.client.HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicConnection, http.client.HTTPSConnection):
+    pass
+
+
+class CoverCache:
+    """Fetch-once, resize-once cover thumbnails in a size-bounded directory.
+
+    A cover URL maps to the hash of the image it returned (urls/), the image
+    is kept under that hash (sources/), and each thumbnail is named by the
+    source hash, width and format (thumbs/), so books sharing a cover share
+    its thumbnails. Every hit touches the file's mtime; eviction deletes the
+    oldest files first. Files are written to a temporary name and renamed, so
+    several workers can share the directory.
+    """
+
+    def __init__(self, root: Path = COVER_CACHE_DIR, max_bytes: int = COVER_CACHE_MAX_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.evictions = 0
+        self._size = None  # bytes on disk, counted on first write
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(64)]
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        """Striped lock: one fetch or resize per URL/thumbnail at a time within this worker"""
+        return self._key_locks[int(key[:8], 16) % len(self._key_locks)]
+
+    def _path(self, kind: str, name: str) -> Path:
+        return self.root / kind / name[:2] / name
+
+    def _read(self, path: Path):
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return data
+
+    def _write(self, path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            if self._size is None:
+                self._size = self._disk_usage()
+            else:
+                self._size += len(data)
+            over = self._size > self.max_bytes
+        if over:
+            self.evict()
+
+    def _files(self):
+        return [path for path in self.root.glob("*/*/*") if path.is_file() and not path.name.startswith(".tmp-")]
+
+    def _disk_usage(self) -> int:
+        return sum(path.stat().st_size for path in self._files())
+
+    def evict(self) -> None:
+        """Delete least recently used files until the cache is at 90% of its limit"""
+        entries = []
+        for path in self._files():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in sorted(entries):
+            if total <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            with self._lock:
+                self.evictions += 1
+        with self._lock:
+            self._size = total
+
+    def _fetch(self, url: str) -> bytes:
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise CoverError("Cover URL must be HTTP/HTTPS")
+        connection_class = _PublicHTTPSConnection if parts.scheme == "https" else _PublicHTTPConnection
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        try:
+            connection = connection_class(parts.hostname, parts.port, timeout=COVER_FETCH_TIMEOUT)
+            try:
+                # http.client follows no redirects: a redirect could lead anywhere
+                connection.request("GET", path, headers={"User-Agent": "NoPaper cover proxy"})
+                response = connection.getresponse()
+                if response.status != 200:
+                    raise CoverError(f"Cover URL answered {response.status} {response.reason}")
+                data = response.read(COVER_MAX_SOURCE_BYTES + 1)
+            finally:
+                connection.close()
+        except CoverError:
+            raise
+        except Exception as e:
+            raise CoverError(f"Could not fetch cover: {str(e)}")
+        if len(data) > COVER_MAX_SOURCE_BYTES:
+            raise CoverError("Cover image is too large")
+        with self._lock:
+            self.fetches += 1
+        return data
+
+    def source(self, url: str) -> Tuple[str, bytes]:
+        """(content hash, bytes) of the image at url, fetched at most once"""
+        url_key = _sha256(url.encode("utf-8"))
+        url_path = self._path("urls", url_key)
+        with self._key_lock(url_key):
+            digest = self._read(url_path)
+            if digest:
+                data = self._read(self._path("sources", digest.decode("ascii")))
+                if data is not None:
+                    return digest.decode("ascii"), data
+            data = self._fetch(url)
+            digest = _sha256(data)
+            self._write(self._path("sources", digest), data)
+            self._write(url_path, digest.encode("ascii"))
+            return digest, data
+
+    def thumbnail(self, url: str, width: int, format: str) -> Tuple[bytes, str]:
+        """Return (image bytes, etag) of the cover at url resized to a configured width"""
+        width = next((w for w in COVER_WIDTHS if w >= width), COVER_WIDTHS[-1])
+        pil_format, _, extension = COVER_FORMATS[format]
+        url_digest = self._read(self._path("urls", _sha256(url.encode("utf-8"))))
+        if url_digest:
+            name = f"{url_digest.decode('ascii')}-{width}{extension}"
+            thumb = self._read(self._path("thumbs", name))
+            if thumb is not None:
+                with self._lock:
+                    self.hits += 1
+                return thumb, name
+        with self._lock:
+            self.misses += 1
+        digest, data = self.source(url)
+        name = f"{digest}-{width}{extension}"
+        path = self._path("thumbs", name)
+        with self._key_lock(digest):
+            thumb = self._read(path)
+            if thumb is None:
+                thumb = self._resize(data, width, pil_format)
+                self._write(path, thumb)
+        return thumb, name
+
+    @staticmethod
+    def _resize(data: bytes, width: int, pil_format: str) -> bytes:
+        from PIL import Image, UnidentifiedImageError
+
+        try:
+            image = Image.open(io.BytesIO(data))
+            # Image.open reads only the header; nothing is decoded yet
+            if image.width * image.height > COVER_MAX_SOURCE_PIXELS:
+                raise CoverError(f"Cover image is too large ({image.width}x{image.height} pixels)")
+            image.draft("RGB", (width, width * 4))  # JPEG sources decode at a reduced scale
+            if image.width > width:
+                image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA") or pil_format == "JPEG":
+                image = image.convert("RGBA" if pil_format == "WEBP" and "A" in image.getbands() else "RGB")
+            output = io.BytesIO()
+            image.save(output, pil_format, quality=COVER_QUALITY, optimize=pil_format == "JPEG")
+        except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError) as e:
+            # The caller logs the reason along with the book it belongs to
+            raise CoverError(f"Could not read cover image: {str(e)}")
+        return output.getvalue()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size_bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "fetches": self.fetches,
+                "evictions": self.evictions,
+            }
+
+
+cover_cache = CoverCache()
@@ -1,7 +1,12 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from starlette.concurrency import run_in_threadpool
 import os
 
+from db_metrics import TimedAsyncQueuePool, TimedQueuePool, instrument_engine, ping_idle_connections
+
 
 # Update this to match your MySQL credentials and database name.
 # Your MySQL setup: user=root, password=lijo, db=online_bookshop
@@ -11,12 +16,126 @@ MYSQL_HOST = os.getenv("MYSQL_HOST", "localhost")
 MYSQL_PORT = os.getenv("MYSQL_PORT", "3306")
 MYSQL_DB = os.getenv("MYSQL_DB", "online_bookshop")
 
-# Standard SQLAlchemy MySQL URL
-DB_URL = f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}"
+# Any SQLAlchemy URL; defaults to MySQL built from the settings above.
+# SQLite works for local runs and benchmarks, e.g. DB_URL=sqlite:///./nopaper.db
+DB_URL = os.getenv(
+    "DB_URL",
+    f"mysql+pymysql://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DB}",
+)
+
+# Async driver used for each supported database when DB_ASYNC=true
+ASYNC_DRIVERS = {"mysql": "mysql+aiomysql", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_url(url: str) -> str:
+    """The DB_URL with its driver swapped for the matching async driver"""
+    parsed = make_url(url)
+    driver = ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)
+    return parsed.set(drivername=driver).render_as_string(hide_password=False)
+
+
+# Set DB_ASYNC=true to serve async handlers through SQLAlchemy asyncio
+DB_ASYNC = os.getenv("DB_ASYNC", "false").lower() == "true"
+ASYNC_DB_URL = os.getenv("ASYNC_DB_URL", async_url(DB_URL))
+
+# Connection pool tuning
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds, below MySQL wait_timeout
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# 0 pings on every checkout; N > 0 pings only connections idle for more than N seconds
+DB_PRE_PING_INTERVAL = float(os.getenv("DB_PRE_PING_INTERVAL", "0"))
+
+# SQLite tuning, applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # readers do not block the writer
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL, far fewer fsyncs
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+IS_SQLITE = make_url(DB_URL).get_backend_name() == "sqlite"
+
+
+def is_memory_sqlite(url: str) -> bool:
+    database = make_url(url).database
+    return not database or database == ":memory:"
+
+
+def apply_sqlite_pragmas(engine) -> None:
+    """Tune every new SQLite connection of the engine"""
+    in_memory = is_memory_sqlite(str(engine.url))
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if not in_memory:
+                cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+                cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            cursor.execute("PRAGMA temp_store=MEMORY")
+            cursor.execute("PRAGMA foreign_keys=ON")
+        finally:
+            cursor.close()
+
+
+pool_options = {
+    "pool_size": DB_POOL_SIZE,
+    "max_overflow": DB_MAX_OVERFLOW,
+    "pool_recycle": DB_POOL_RECYCLE,
+    "pool_timeout": DB_POOL_TIMEOUT,
+}
 
-engine = create_engine(DB_URL, pool_pre_ping=True)
+if IS_SQLITE:
+    # Sessions are used from the threadpool, not only the thread that opened them
+    sqlite_args = {"check_same_thread": False}
+    if is_memory_sqlite(DB_URL):
+        # Each connection to :memory: is a separate empty database; share one
+        engine = create_engine(DB_URL, poolclass=StaticPool, connect_args=sqlite_args)
+    else:
+        engine = create_engine(DB_URL, poolclass=TimedQueuePool, connect_args=sqlite_args, **pool_options)
+    apply_sqlite_pragmas(engine)
+else:
+    engine = create_engine(
+        DB_URL,
+        poolclass=TimedQueuePool,
+        pool_pre_ping=DB_PRE_PING_INTERVAL <= 0,
+        **pool_options,
+    )
+    if DB_PRE_PING_INTERVAL > 0:
+        ping_idle_connections(engine, DB_PRE_PING_INTERVAL)
+instrument_engine(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = None
+AsyncSessionLocal = None
+if DB_ASYNC:
+    from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+
+    # Same pool class and ping policy as the sync engine, so async checkouts
+    # show up in /admin/metrics too
+    if make_url(ASYNC_DB_URL).get_backend_name() == "sqlite":
+        if is_memory_sqlite(ASYNC_DB_URL):
+            async_engine = create_async_engine(ASYNC_DB_URL, poolclass=StaticPool)
+        else:
+            async_engine = create_async_engine(ASYNC_DB_URL, poolclass=TimedAsyncQueuePool, **pool_options)
+        apply_sqlite_pragmas(async_engine.sync_engine)
+    else:
+        async_engine = create_async_engine(
+            ASYNC_DB_URL,
+            poolclass=TimedAsyncQueuePool,
+            pool_pre_ping=DB_PRE_PING_INTERVAL <= 0,
+            **pool_options,
+        )
+        if DB_PRE_PING_INTERVAL > 0:
+            ping_idle_connections(async_engine.sync_engine, DB_PRE_PING_INTERVAL)
+    instrument_engine(async_engine.sync_engine)
+    AsyncSessionLocal = sessionmaker(
+        async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False
+    )
+
 
 def get_db():
     db = SessionLocal()
@@ -26,3 +145,35 @@ def get_db():
         db.close()
 
 
+def _run_with_session(fn, *args, **kwargs):
+    db = SessionLocal()
+    try:
+        return fn(db, *args, **kwargs)
+    finally:
+        db.close()
+
+
+async def run_db(fn, *args, **kwargs):
+    """Run fn(session, *args, **kwargs) from an async handler without blocking the event loop.
+
+    In async mode fn runs on an AsyncSession through run_sync, so the same ORM
+    code drives the async driver. Otherwise it runs on a sync session in the threadpool.
+
+    run_sync calls fn on the event loop thread, so fn must spend its time
+    waiting on queries. CPU-heavy work goes through run_db_threaded instead.
+    """
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            return await db.run_sync(fn, *args, **kwargs)
+    return await run_in_threadpool(_run_with_session, fn, *args, **kwargs)
+
+
+async def run_db_threaded(fn, *args, **kwargs):
+    """Run fn(session, *args, **kwargs) on a sync session in the threadpool, even with DB_ASYNC.
+
+    For callers that serialize or parse a lot (catalog rebuild, book import)
+    and would otherwise hold up every other request on the event loop.
+    """
+    return await run_in_threadpool(_run_with_session, fn, *args, **kwargs)
+
+
@@ -0,0 +1,163 @@
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import DisconnectionError, TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+# Statements slower than this are kept in the slow query log
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# Number of recent slow queries to keep
+DB_SLOW_QUERY_LOG_SIZE = int(os.getenv("DB_SLOW_QUERY_LOG_SIZE", "50"))
+
+
+class PoolMetrics:
+    """Counters for connection checkouts and statement timings"""
+
+    def __init__(self, slow_query_ms: float = DB_SLOW_QUERY_MS, slow_log_size: int = DB_SLOW_QUERY_LOG_SIZE):
+        self.slow_query_ms = slow_query_ms
+        self.checkouts = 0
+        self.checkout_time = 0.0
+        self.checkout_max = 0.0
+        self.checkout_timeouts = 0
+        self.overflow_checkouts = 0
+        self.queries = 0
+        self.query_time = 0.0
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def record_checkout(self, seconds: float, overflowed: bool) -> None:
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_time += seconds
+            self.checkout_max = max(self.checkout_max, seconds)
+            if overflowed:
+                self.overflow_checkouts += 1
+
+    def record_timeout(self) -> None:
+        with self._lock:
+            self.checkout_timeouts += 1
+
+    def record_query(self, statement: str, seconds: float) -> None:
+        with self._lock:
+            self.queries += 1
+            self.query_time += seconds
+            if seconds * 1000 >= self.slow_query_ms:
+                self.slow_queries.append({
+                    "statement": statement[:500],
+                    "duration_ms": round(seconds * 1000, 2),
+                    "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                })
+
+    def snapshot(self, pool) -> dict:
+        """Current counters plus live pool state"""
+        with self._lock:
+            data = {
+                "checkouts": self.checkouts,
+                "checkout_avg_ms": round(self.checkout_time / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                "checkout_max_ms": round(self.checkout_max * 1000, 3),
+                "checkout_timeouts": self.checkout_timeouts,
+                "overflow_checkouts": self.overflow_checkouts,
+                "queries": self.queries,
+                "query_avg_ms": round(self.query_time / self.queries * 1000, 3) if self.queries else 0.0,
+                "slow_query_ms": self.slow_query_ms,
+                "slow_queries": list(self.slow_queries),
+            }
+        data.update(self.pool_state(pool))
+        return data
+
+    @staticmethod
+    def pool_state(pool) -> dict:
+        """Live size and usage of one pool (the counters above cover every engine)"""
+        data = {}
+        if isinstance(pool, QueuePool):
+            capacity = pool.size() + max(pool._max_overflow, 0)
+            data.update({
+                "pool_size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": max(pool.overflow(), 0),
+                "saturation": round(pool.checkedout() / capacity, 3) if capacity else None,
+            })
+        data["status"] = pool.status()
+        return data
+
+
+pool_metrics = PoolMetrics()
+
+
+class _TimedCheckout:
+    """Pool mixin that reports how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.record_timeout()
+            raise
+        pool_metrics.record_checkout(time.perf_counter() - start, self.checkedout() > self.size())
+        return conn
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+
+
+class TimedAsyncQueuePool(_TimedCheckout, AsyncAdaptedQueuePool):
+    """The async engine's pool, reporting checkouts like TimedQueuePool"""
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement executed through the engine"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_start"].pop()
+        pool_metrics.record_query(statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, "handle_error")
+    def _stop_timer_on_error(exception_context):
+        # A failed statement never reaches after_cursor_execute; without this its
+        # start time would stay on the stack and skew every later timing. Errors
+        # raised before a statement was being executed (connecting) never pushed one.
+        conn = exception_context.connection
+        if conn is None or exception_context.execution_context is None:
+            return
+        starts = conn.info.get("query_start")
+        if starts:
+            pool_metrics.record_query(exception_context.statement or "", time.perf_counter() - starts.pop())
+
+
+def ping_idle_connections(engine, interval: float) -> None:
+    """Ping connections on checkout only if they sat idle for more than interval seconds.
+
+    Replaces pool_pre_ping, which issues a round trip on every checkout.
+    """
+
+    @event.listens_for(engine, "checkin")
+    def _mark_idle(dbapi_connection, connection_record):
+        connection_record.info["idle_since"] = time.monotonic()
+
+    @event.listens_for(engine, "checkout")
+    def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+        idle_since = connection_record.info.get("idle_since")
+        if idle_since is None or time.monotonic() - idle_since < interval:
+            return
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception:
+            # The pool retries the checkout with a fresh connection
+            raise DisconnectionError()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
@@ -0,0 +1,165 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import NamedTuple, Optional, Tuple
+
+
+# Signs download links; set the same value on every worker, otherwise a link
+# only works on the worker that issued it (and not after a restart)
+DOWNLOAD_TOKEN_SECRET = os.getenv("DOWNLOAD_TOKEN_SECRET", "")
+# Seconds a signed download link stays valid
+DOWNLOAD_TOKEN_TTL = int(os.getenv("DOWNLOAD_TOKEN_TTL", "300"))
+# Seconds a confirmed (user, book) ownership check is reused (0 disables the cache)
+ENTITLEMENT_CACHE_TTL = float(os.getenv("ENTITLEMENT_CACHE_TTL", "60"))
+# Maximum number of cached (user, book) pairs before least recently used ones are evicted
+ENTITLEMENT_CACHE_SIZE = int(os.getenv("ENTITLEMENT_CACHE_SIZE", "50000"))
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+class DownloadGrant(NamedTuple):
+    user_id: int
+    book_id: int
+    expires_at: int
+    url: str
+
+
+class DownloadSigner:
+    """Stateless download links: an HMAC over user, book, expiry and PDF URL.
+
+    Verifying a link needs neither the database nor any shared state, so a
+    link keeps working until it expires even if the book is deleted or the
+    purchase is revoked in the meantime; keep the TTL short.
+    """
+
+    def __init__(self, secret: str = DOWNLOAD_TOKEN_SECRET, ttl: int = DOWNLOAD_TOKEN_TTL):
+        self.ttl = ttl
+        self._key = secret.encode("utf-8") if secret else os.urandom(32)
+        self.issued = 0
+        self.verified = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def _signature(self, payload: bytes) -> bytes:
+        return hmac.new(self._key, payload, hashlib.sha256).digest()
+
+    def sign(self, user_id: int, book_id: int, url: str) -> Tuple[str, int]:
+        """Return (token, expires_at unix time) for a download the user is entitled to"""
+        expires_at = int(time.time()) + self.ttl
+        payload = f"{user_id}:{book_id}:{expires_at}:{url}".encode("utf-8")
+        with self._lock:
+            self.issued += 1
+        return f"{_b64encode(payload)}.{_b64encode(self._signature(payload))}", expires_at
+
+    def verify(self, token: str) -> Optional[DownloadGrant]:
+        """Return the grant of a genuine, unexpired token, else None"""
+        grant = None
+        try:
+            encoded_payload, encoded_signature = token.split(".", 1)
+            payload = _b64decode(encoded_payload)
+            if hmac.compare_digest(self._signature(payload), _b64decode(encoded_signature)):
+                user_id, book_id, expires_at, url = payload.decode("utf-8").split(":", 3)
+                if int(expires_at) > time.time():
+                    grant = DownloadGrant(int(user_id), int(book_id), int(expires_at), url)
+        except ValueError:  # Malformed token (binascii.Error is a ValueError)
+            pass
+        with self._lock:
+            if grant is None:
+                self.rejected += 1
+            else:
+                self.verified += 1
+        return grant
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "ttl_seconds": self.ttl,
+                "shared_secret": bool(DOWNLOAD_TOKEN_SECRET),
+                "issued": self.issued,
+                "verified": self.verified,
+                "rejected": self.rejected,
+            }
+
+
+class EntitlementCache:
+    """In-process TTL + LRU cache of (user_id, book_id) -> PDF URL for owned books.
+
+    Only positive results are cached, so a new purchase is visible at once.
+    Revocations and deletions invalidate the entry on this worker; other
+    workers notice within the TTL.
+    """
+
+    def __init__(self, ttl: float = ENTITLEMENT_CACHE_TTL, max_size: int = ENTITLEMENT_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (user_id, book_id) -> (url, expires_at)
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0 and self.max_size > 0
+
+    def get(self, user_id: int, book_id: int) -> Optional[str]:
+        if not self.enabled:
+            return None
+        key = (user_id, book_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, user_id: int, book_id: int, url: str) -> None:
+        if not self.enabled:
+            return
+        key = (user_id, book_id)
+        with self._lock:
+            self._entries[key] = (url, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, user_id: int, book_id: int) -> None:
+        with self._lock:
+            self._entries.pop((user_id, book_id), None)
+
+    def invalidate_book(self, book_id: int) -> None:
+        """Drop every user's entry for a deleted book"""
+        with self._lock:
+            for key in [key for key in self._entries if key[1] == book_id]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+download_signer = DownloadSigner()
+entitlement_cache = EntitlementCache()
@@ -0,0 +1,76 @@
+"""Compact response rows built from column-only queries.
+
+Slotted dataclasses: no per-instance __dict__, and orjson serializes them
+natively without going through FastAPI's jsonable_encoder. Prices are
+converted to float once here because JSON has no decimal type.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from models import Book
+
+
+# Columns needed to build a BookDTO; created_at is kept for keyset cursors
+BOOK_COLUMNS = (
+    Book.id, Book.title, Book.author, Book.price, Book.description, Book.pdf_path, Book.cover_url, Book.created_at,
+)
+
+
+@dataclass
+class BookDTO:
+    __slots__ = ("id", "title", "author", "price", "description", "pdf_url", "cover_url", "is_purchased")
+    id: int
+    title: str
+    author: str
+    price: float
+    description: Optional[str]
+    pdf_url: str  # pdf_path now contains URL
+    cover_url: Optional[str]
+    is_purchased: bool
+
+    @classmethod
+    def from_row(cls, row, is_purchased: bool = False) -> "BookDTO":
+        return cls(
+            row.id, row.title, row.author, float(row.price), row.description, row.pdf_path, row.cover_url, is_purchased
+        )
+
+
+@dataclass
+class LibraryBookDTO(BookDTO):
+    __slots__ = ("granted_at",)
+    granted_at: Optional[datetime]
+
+
+@dataclass
+class AdminBookDTO:
+    __slots__ = ("id", "title", "author", "price", "description", "cover_url", "purchase_count", "created_at")
+    id: int
+    title: str
+    author: str
+    price: float
+    description: Optional[str]
+    cover_url: Optional[str]
+    purchase_count: int
+    created_at: Optional[datetime]
+
+
+@dataclass
+class OrderBookDTO:
+    __slots__ = ("id", "title", "author", "price")
+    id: int
+    title: str
+    author: str
+    price: float  # price paid, from the order item
+
+
+@dataclass
+class AdminOrderDTO:
+    __slots__ = ("order_id", "user_email", "user_id", "total", "status", "created_at", "books")
+    order_id: int
+    user_email: str
+    user_id: Optional[int]
+    total: float
+    status: str
+    created_at: Optional[datetime]
+    books: List[OrderBookDTO]
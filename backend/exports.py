@@ -0,0 +1,115 @@
+import csv
+import io
+import os
+from datetime import datetime, timezone
+from typing import Callable, Iterator, Optional
+
+from sqlalchemy.orm import Session
+
+from dto import AdminOrderDTO, OrderBookDTO
+from models import Book, Order, OrderItem, User
+from serialization import dumps
+
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "1000"))
+# Lines buffered before a chunk is written to the response
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "500"))
+
+CSV_COLUMNS = (
+    "order_id", "created_at", "status", "user_id", "user_email", "total", "book_id", "title", "author", "price",
+)
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """created_at is stored as naive UTC; convert aware query parameters to match"""
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def order_rows(db: Session, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """One row per order item (or per order without items), oldest order first.
+
+    yield_per streams the result through a server-side cursor, so only one
+    batch of rows is held in memory at a time. Rows of the same order are
+    adjacent because they share the (created_at, id) sort key.
+    """
+    query = (
+        db.query(
+            Order.id, Order.created_at, Order.status, Order.total, User.id.label("user_id"), User.email,
+            Book.id.label("book_id"), Book.title, Book.author, OrderItem.price_each,
+        )
+        .outerjoin(User, User.id == Order.user_id)
+        .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+        .outerjoin(Book, Book.id == OrderItem.book_id)
+        .order_by(Order.created_at, Order.id)
+    )
+    if start is not None:
+        query = query.filter(Order.created_at >= start)
+    if end is not None:
+        query = query.filter(Order.created_at < end)
+    return query.yield_per(EXPORT_BATCH_SIZE)
+
+
+def group_orders(rows) -> Iterator[AdminOrderDTO]:
+    """Fold consecutive item rows into one AdminOrderDTO per order"""
+    current = None
+    for row in rows:
+        if current is None or current.order_id != row.id:
+            if current is not None:
+                yield current
+            current = AdminOrderDTO(
+                row.id, row.email or "Unknown", row.user_id, float(row.total), row.status, row.created_at, []
+            )
+        if row.book_id is not None:
+            current.books.append(OrderBookDTO(row.book_id, row.title, row.author, float(row.price_each)))
+    if current is not None:
+        yield current
+
+
+def stream_ndjson(session_factory: Callable[[], Session], start=None, end=None) -> Iterator[bytes]:
+    """One JSON order per line, in the /admin/orders format"""
+    db = session_factory()
+    try:
+        chunk = []
+        for order in group_orders(order_rows(db, start, end)):
+            chunk.append(dumps(order))
+            if len(chunk) >= EXPORT_CHUNK_ROWS:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+    finally:
+        db.close()
+
+
+def stream_csv(session_factory: Callable[[], Session], start=None, end=None) -> Iterator[bytes]:
+    """One CSV line per order item; amounts keep their exact decimal value"""
+    db = session_factory()
+    try:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_COLUMNS)
+        lines = 0
+        for row in order_rows(db, start, end):
+            writer.writerow((
+                row.id, row.created_at.isoformat() if row.created_at else None, row.status, row.user_id, row.email,
+                row.total, row.book_id, row.title, row.author, row.price_each,
+            ))
+            lines += 1
+            if lines >= EXPORT_CHUNK_ROWS:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+                lines = 0
+        yield buffer.getvalue().encode("utf-8")
+    finally:
+        db.close()
+
+
+# format -> (media type, stream function)
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", stream_ndjson),
+    "csv": ("text/csv; charset=utf-8", stream_csv),
+}
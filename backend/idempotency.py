@@ -0,0 +1,76 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+
+# Seconds a response is replayed for a repeated Idempotency-Key
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "86400"))
+# Maximum number of remembered keys before least recently used ones are evicted
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "100000"))
+
+# Request header carrying the client's key
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+
+class IdempotencyStore:
+    """In-process TTL + LRU map of idempotency keys to the first response sent.
+
+    Each key also stores a fingerprint of the request it was first used with,
+    so reusing a key for a different request can be rejected. Keys are only
+    remembered by the worker that handled them; the handlers must stay safe
+    to repeat on their own (e.g. through conditional updates).
+    """
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self.replays = 0
+        self.conflicts = 0
+        self._entries = OrderedDict()  # key -> (fingerprint, response, expires_at)
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Tuple[Hashable, dict]]:
+        """Return (fingerprint, response) stored for a live key"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            fingerprint, response, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return fingerprint, response
+
+    def lookup(self, key: Hashable, fingerprint: Hashable) -> Optional[dict]:
+        """Stored response for a key reused with the same request; raises ValueError for another request"""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            if entry[0] != fingerprint:
+                self.conflicts += 1
+                raise ValueError(f"{IDEMPOTENCY_HEADER} was already used for a different request")
+            self.replays += 1
+        return entry[1]
+
+    def put(self, key: Hashable, fingerprint: Hashable, response: dict) -> None:
+        with self._lock:
+            self._entries[key] = (fingerprint, response, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_keys:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_keys": self.max_keys,
+                "ttl_seconds": self.ttl,
+                "replays": self.replays,
+                "conflicts": self.conflicts,
+            }
+
+
+idempotency_store = IdempotencyStore()
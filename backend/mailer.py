@@ -0,0 +1,284 @@
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from pathlib import Path
+
+# smtplib and the email package are imported by the worker threads on first
+# use, so processes that never send mail do not pay for loading them
+
+
+# Email configuration
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+EMAIL_USER = os.getenv("EMAIL_USER", "lijorajpr321@gmail.com")
+EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")  # Set via environment variable
+# Sending is on once a password is set; override for unauthenticated local SMTP servers
+MAIL_ENABLED = os.getenv("MAIL_ENABLED", "true" if EMAIL_PASSWORD else "false").lower() == "true"
+
+# Delivery queue configuration
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "1"))
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "5"))
+MAIL_RETRY_BACKOFF = float(os.getenv("MAIL_RETRY_BACKOFF", "2"))  # seconds, doubled per attempt
+# Idle SMTP connections older than this are checked with NOOP before reuse
+MAIL_IDLE_CHECK = float(os.getenv("MAIL_IDLE_CHECK", "30"))
+MAIL_OUTBOX_DIR = Path(os.getenv("MAIL_OUTBOX_DIR", str(Path(__file__).parent / "outbox")))
+
+
+class SMTPConnection:
+    """A persistent, authenticated SMTP connection owned by one worker thread"""
+
+    def __init__(self):
+        self._server = None  # smtplib.SMTP once connected
+        self._last_used = 0.0
+
+    def _connect(self):
+        import smtplib
+
+        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=30)
+        if SMTP_STARTTLS:
+            server.starttls()
+        if EMAIL_PASSWORD:
+            server.login(EMAIL_USER, EMAIL_PASSWORD)
+        return server
+
+    def _is_alive(self) -> bool:
+        import smtplib
+
+        try:
+            return self._server.noop()[0] == 250
+        except smtplib.SMTPException:
+            return False
+        except OSError:
+            return False
+
+    def send(self, msg) -> None:
+        import smtplib
+
+        if self._server is not None and time.monotonic() - self._last_used > MAIL_IDLE_CHECK:
+            if not self._is_alive():
+                self.close()
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+            # Connection went stale between messages: reconnect once and resend.
+            # (Not every OSError: SMTP refusals are OSErrors too and are retried
+            # by the queue with backoff.)
+            self.close()
+            self._server = self._connect()
+            self._server.send_message(msg)
+        self._last_used = time.monotonic()
+
+    def close(self) -> None:
+        import smtplib
+
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+
+# Claim directories of MailQueue instances running in this process
+_live_claims = set()
+
+
+def _process_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows; assume it is alive
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # Exists but belongs to another user
+    return True
+
+
+class MailQueue:
+    """Bounded background delivery queue backed by an on-disk outbox.
+
+    Every message is written to the outbox before it is queued and removed only
+    after the SMTP server accepts it, so messages survive a crash or restart.
+    Several worker processes can share the outbox: a message is sent only by
+    the queue that moves it into its own claim directory (an atomic rename).
+    Claims of processes that are no longer running go back to the outbox when
+    a queue starts.
+    """
+
+    def __init__(
+        self,
+        outbox_dir: Path = MAIL_OUTBOX_DIR,
+        workers: int = MAIL_WORKERS,
+        max_size: int = MAIL_QUEUE_SIZE,
+    ):
+        self.outbox_dir = Path(outbox_dir)
+        self.failed_dir = self.outbox_dir / "failed"
+        self.claims_dir = self.outbox_dir / "claimed"
+        self.claim_dir = self.claims_dir / f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.workers = workers
+        self.sent = 0
+        self.failed = 0
+        self.retried = 0
+        self._queue = queue.Queue(maxsize=max_size)
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def start(self) -> None:
+        """Start the worker threads and requeue anything left in the outbox"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            self.outbox_dir.mkdir(parents=True, exist_ok=True)
+            self.failed_dir.mkdir(parents=True, exist_ok=True)
+            self.claim_dir.mkdir(parents=True, exist_ok=True)
+            _live_claims.add(self.claim_dir.name)
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._run, name="mail-worker", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self._release_orphaned_claims()
+        for path in sorted(self.outbox_dir.glob("*.json")):
+            self._offer(path)
+
+    def stop(self, timeout: float = 5) -> None:
+        """Ask workers to finish; undelivered messages stay in the outbox"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        for _ in threads:
+            try:
+                self._queue.put_nowait(None)
+            except queue.Full:
+                pass
+        for thread in threads:
+            thread.join(timeout)
+        _live_claims.discard(self.claim_dir.name)
+
+    def enqueue(self, to: str, subject: str, body: str) -> str:
+        """Persist a message to the outbox and hand it to a worker"""
+        self.start()
+        message_id = uuid.uuid4().hex
+        path = self.outbox_dir / f"{time.time_ns()}-{message_id}.json"
+        self._write(path, {"id": message_id, "to": to, "subject": subject, "body": body, "attempts": 0})
+        self._offer(path)
+        return message_id
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.qsize(),
+                "sent": self.sent,
+                "retried": self.retried,
+                "failed": self.failed,
+            }
+
+    def _count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _release_orphaned_claims(self) -> None:
+        """Return messages claimed by processes that died before sending them"""
+        for claim_dir in self.claims_dir.iterdir():
+            name = claim_dir.name
+            pid = name.split("-", 1)[0]
+            if name in _live_claims or not pid.isdigit():
+                continue
+            if int(pid) != os.getpid() and _process_alive(int(pid)):
+                continue
+            # Left by a dead process, or by an earlier process that had our pid
+            for path in claim_dir.glob("*.json"):
+                try:
+                    os.replace(path, self.outbox_dir / path.name)
+                except OSError:
+                    pass
+            try:
+                claim_dir.rmdir()
+            except OSError:
+                pass
+
+    def _claim(self, path: Path):
+        """Move a message into this queue's claim directory; None if another worker took it"""
+        claimed = self.claim_dir / path.name
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        return claimed
+
+    def _offer(self, path: Path) -> None:
+        try:
+            self._queue.put_nowait(path)
+        except queue.Full:
+            print(f"Mail queue full, {path.name} stays in the outbox until the next restart")
+
+    @staticmethod
+    def _write(path: Path, data: dict) -> None:
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def _run(self) -> None:
+        connection = SMTPConnection()
+        try:
+            while True:
+                path = self._queue.get()
+                if path is None or self._stopping.is_set():
+                    break
+                self._deliver(connection, path)
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: SMTPConnection, path: Path) -> None:
+        path = self._claim(path)
+        if path is None:
+            return  # Sent or being sent by another worker
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            print(f"Unreadable email {path.name} moved to {self.failed_dir}: {str(e)}")
+            os.replace(path, self.failed_dir / path.name)
+            return
+        from email.mime.text import MIMEText
+
+        msg = MIMEText(data["body"], "plain")
+        msg["From"] = EMAIL_USER
+        msg["To"] = data["to"]
+        msg["Subject"] = data["subject"]
+        while True:
+            try:
+                connection.send(msg)
+                path.unlink(missing_ok=True)
+                self._count("sent")
+                print(f"Email {data['id']} sent: {data['subject']}")
+                return
+            except Exception as e:
+                connection.close()
+                data["attempts"] += 1
+                if data["attempts"] >= MAIL_MAX_ATTEMPTS:
+                    self._write(self.failed_dir / path.name, data)
+                    path.unlink(missing_ok=True)
+                    self._count("failed")
+                    print(f"Failed to send email {data['id']} after {data['attempts']} attempts: {str(e)}")
+                    return
+                self._write(path, data)
+                self._count("retried")
+                if self._stopping.wait(MAIL_RETRY_BACKOFF * 2 ** (data["attempts"] - 1)):
+                    # Unclaim, so the next start (of any worker) sends it
+                    os.replace(path, self.outbox_dir / path.name)
+                    return
+
+
+mail_queue = MailQueue()
@@ -1,12 +1,12 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Header
+from fastapi import FastAPI, Depends, HTTPException, status, Header, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import Headers
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, or_, and_, func, insert
 from datetime import datetime
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from decimal import Decimal
 from pydantic import BaseModel, EmailStr, Field
 try:
     from pydantic import field_validator
@@ -15,6 +15,7 @@ except ImportError:
     from pydantic import validator as field_validator
 from typing import List, Optional
 import os
+import threading
 
 # Import handling for both package and direct execution
 import sys
@@ -23,27 +24,53 @@ backend_path = Path(__file__).parent
 if str(backend_path) not in sys.path:
     sys.path.insert(0, str(backend_path))
 
-from db import get_db, engine
-from models import Base, User, Book, Order, OrderItem
+from db import get_db, run_db, run_db_threaded, engine, async_engine, SessionLocal
+from db_metrics import pool_metrics
+from models import Base, User, Book, Order, OrderItem, Entitlement
+from auth_cache import auth_cache, AuthenticatedUser
+from sessions import session_store, SESSION_TTL
+from ratelimit import rate_limiter, client_ip, normalize_email
+from mailer import mail_queue, MAIL_ENABLED
+from catalog import catalog, etag_matches, query_books_page, SORT_COLUMNS
+from dto import BOOK_COLUMNS, BookDTO, LibraryBookDTO, AdminBookDTO, OrderBookDTO, AdminOrderDTO
+from search import search_index, database_search, SEARCH_BACKEND
+from exports import EXPORT_FORMATS, naive_utc
+from downloads import download_signer, entitlement_cache
+from idempotency import IDEMPOTENCY_HEADER, idempotency_store
+from cache import shared_cache
+from covers import COVER_FORMATS, COVER_MAX_AGE, CoverError, cover_cache
+from book_import import IMPORT_FORMATS, import_books_file, spool_body, validate_book_urls
+from profiling import (
+    PROFILING_ENABLED, ProfilingMiddleware, ProfiledRoute, TimedJSONResponse, metrics_response, track_queries
+)
 
 
-Base.metadata.create_all(bind=engine)
+# The schema is managed by Alembic (python manage.py migrate). Nothing here
+# touches the database at import time, so workers boot even if MySQL is down.
+# DB_CREATE_SCHEMA=true creates missing tables at startup for quick local runs.
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() == "true"
 
 # Simple authentication - no JWT tokens needed
 
 # Password encryption removed - storing passwords as plain text
 
-# Email configuration
-SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
-EMAIL_USER = os.getenv("EMAIL_USER", "lijorajpr321@gmail.com")
-EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD", "")  # Set via environment variable
+# Seconds the admin dashboard totals are served from the shared cache; every
+# book, user or payment change invalidates them sooner
+ADMIN_STATS_TTL = float(os.getenv("ADMIN_STATS_TTL", "60"))
+
+# Email configuration (SMTP settings live in mailer.py)
 ADMIN_EMAIL = "lijorajpr321@gmail.com"
 UPI_ID = "lijorajpr321@okaxis"
 
 # File upload removed - using URLs instead
 
-app = FastAPI(title="Online Book Shop API")
+app = FastAPI(title="Online Book Shop API", default_response_class=TimedJSONResponse)
+if PROFILING_ENABLED:
+    # Lets admins profile sync endpoints in the worker thread they run in
+    app.router.route_class = ProfiledRoute
+    track_queries(engine)
+    if async_engine is not None:
+        track_queries(async_engine.sync_engine)
 
 # CORS configuration - allow multiple origins
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000").split(",")
@@ -53,14 +80,57 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Server-Timing"],
 )
 
 
+@app.on_event("startup")
+def start_background_workers():
+    if DB_CREATE_SCHEMA:
+        try:
+            Base.metadata.create_all(bind=engine)
+        except Exception as e:
+            print(f"Schema creation failed: {str(e)}")
+    # Starting the mail workers also re-sends anything left in the outbox
+    if MAIL_ENABLED:
+        mail_queue.start()
+    if SEARCH_BACKEND == "memory":
+        threading.Thread(target=build_search_index, name="search-index", daemon=True).start()
+
+
+# One build at a time, so an older build can never replace a newer index
+_search_index_build_lock = threading.Lock()
+
+
+def build_search_index():
+    """Build the in-memory search index; /books/search uses the database until it is ready"""
+    with _search_index_build_lock:
+        db = SessionLocal()
+        try:
+            search_index.build(db)
+            print(f"Search index built: {len(search_index)} books")
+        except Exception as e:
+            print(f"Search index build failed, falling back to database search: {str(e)}")
+        finally:
+            db.close()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    mail_queue.stop()
+
+
 class AuthResponse(BaseModel):
     message: str
     role: str
 
 
+class LoginResponse(AuthResponse):
+    access_token: str
+    token_type: str
+    expires_in: int
+
+
 class UserCreate(BaseModel):
     email: EmailStr
     password: str = Field(..., min_length=7, description="Password must be at least 7 characters")
@@ -93,6 +163,22 @@ class BuyRequest(BaseModel):
     book_id: int
 
 
+# Most books one cart checkout may order
+CART_MAX_BOOKS = 100
+
+
+class CartCheckoutRequest(BaseModel):
+    book_ids: List[int] = Field(..., description=f"Books to buy in one order (1 to {CART_MAX_BOOKS})")
+
+    # Checked here rather than with Field(min_length=...), which Pydantic v1 ignores on lists
+    @field_validator('book_ids')
+    @classmethod
+    def validate_book_ids(cls, v):
+        if not 1 <= len(v) <= CART_MAX_BOOKS:
+            raise ValueError(f'Order between 1 and {CART_MAX_BOOKS} books')
+        return v
+
+
 def get_password_hash(password: str) -> str:
     # No encryption - return password as-is
     return password
@@ -103,19 +189,69 @@ def verify_password(plain_password: str, stored_password: str) -> bool:
     return plain_password == stored_password
 
 
-def get_current_user(
-    email: str = Header(..., description="User email"),
-    password: str = Header(..., description="User password"),
-    db: Session = Depends(get_db),
-):
-    """Simple authentication using email and password from headers"""
+def load_credentials(db: Session, email: str, password: str) -> Optional[AuthenticatedUser]:
+    """Verify credentials against the users table and cache the result"""
     user = db.query(User).filter(User.email == email).first()
-    if not user:
+    if not user or not verify_password(password, user.password_hash):
+        return None
+    return auth_cache.put(AuthenticatedUser(user.id, user.email, user.role), password)
+
+
+def enforce_rate_limit(*hits) -> None:
+    """Reject with 429 when any (rule, key) bucket is empty; call before touching the database"""
+    retry_after = rate_limiter.check(*hits)
+    if retry_after is not None:
         raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid email or password",
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many attempts, please try again later",
+            headers={"Retry-After": str(retry_after)},
         )
-    if not verify_password(password, user.password_hash):
+
+
+async def authenticate(email: str, password: str, ip: Optional[str] = None) -> Optional[AuthenticatedUser]:
+    """Verify credentials, serving repeat requests from the auth cache"""
+    cached = auth_cache.get(email, password)
+    if cached:
+        return cached
+    # Only attempts that would reach the database count against the limits
+    enforce_rate_limit(("auth_ip", ip), ("auth_email", normalize_email(email)))
+    return await run_db(load_credentials, email, password)
+
+
+def parse_bearer_token(authorization: Optional[str]) -> Optional[str]:
+    """Extract the token from an 'Authorization: Bearer <token>' header"""
+    if not authorization:
+        return None
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    return token.strip()
+
+
+async def resolve_user(
+    authorization: Optional[str],
+    email: Optional[str],
+    password: Optional[str],
+    ip: Optional[str] = None,
+) -> Optional[AuthenticatedUser]:
+    """Identify the caller by session token, falling back to email/password headers"""
+    token = parse_bearer_token(authorization)
+    if token:
+        return session_store.get(token)
+    if email and password:
+        return await authenticate(email, password, ip)
+    return None
+
+
+async def get_current_user(
+    request: Request,
+    authorization: Optional[str] = Header(default=None, description="Bearer session token from /login"),
+    email: Optional[str] = Header(default=None, description="User email"),
+    password: Optional[str] = Header(default=None, description="User password"),
+):
+    """Authenticate with a session token, or email and password from headers"""
+    user = await resolve_user(authorization, email, password, client_ip(request.scope))
+    if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
@@ -123,23 +259,19 @@ def get_current_user(
     return user
 
 
-def require_admin(
-    email: str = Header(..., description="Admin email"),
-    password: str = Header(..., description="Admin password"),
-    db: Session = Depends(get_db),
+async def require_admin(
+    request: Request,
+    authorization: Optional[str] = Header(default=None, description="Bearer session token from /login"),
+    email: Optional[str] = Header(default=None, description="Admin email"),
+    password: Optional[str] = Header(default=None, description="Admin password"),
 ):
-    """Require admin role - simple authentication"""
-    user = db.query(User).filter(User.email == email).first()
+    """Require admin role - session token or email/password headers"""
+    user = await resolve_user(authorization, email, password, client_ip(request.scope))
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid email or password",
         )
-    if not verify_password(password, user.password_hash):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid email or password",
-        )
     if user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -148,8 +280,13 @@ def require_admin(
     return user
 
 
-@app.post("/register", response_model=AuthResponse)
-def register(user_in: UserCreate, db: Session = Depends(get_db)):
+def credentials_changed(email: str) -> None:
+    """Forget the cached credentials and sessions of a new user or one whose password or role changed"""
+    auth_cache.invalidate(email)
+    session_store.revoke_user(email)
+
+
+def register_user(db: Session, user_in: UserCreate) -> dict:
     try:
         existing = db.query(User).filter(User.email == user_in.email).first()
         if existing:
@@ -162,6 +299,8 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
         db.add(user)
         db.commit()
         db.refresh(user)
+        credentials_changed(user.email)
+        shared_cache.bump("admin_stats")
         return {"message": "Registration successful", "role": user.role}
     except HTTPException:
         raise
@@ -173,13 +312,27 @@ def register(user_in: UserCreate, db: Session = Depends(get_db)):
         )
 
 
-@app.post("/login", response_model=AuthResponse)
-def login(login_req: LoginRequest, db: Session = Depends(get_db)):
+@app.post("/register", response_model=AuthResponse)
+async def register(user_in: UserCreate, request: Request):
+    # Throttled before a database session is opened
+    enforce_rate_limit(("register_ip", client_ip(request.scope)))
+    return await run_db(register_user, user_in)
+
+
+def login_user(db: Session, login_req: LoginRequest) -> dict:
     try:
         user = db.query(User).filter(User.email == login_req.email).first()
         if not user or not verify_password(login_req.password, user.password_hash):
             raise HTTPException(status_code=400, detail="Incorrect email or password")
-        return {"message": "Login successful", "role": user.role}
+        # Credentials are checked once here; later requests present the token
+        token = session_store.create(AuthenticatedUser(user.id, user.email, user.role))
+        return {
+            "message": "Login successful",
+            "role": user.role,
+            "access_token": token,
+            "token_type": "bearer",
+            "expires_in": SESSION_TTL,
+        }
     except HTTPException:
         raise
     except Exception as e:
@@ -189,42 +342,119 @@ def login(login_req: LoginRequest, db: Session = Depends(get_db)):
         )
 
 
+@app.post("/login", response_model=LoginResponse)
+async def login(login_req: LoginRequest, request: Request):
+    # Per IP against credential stuffing, per email against password guessing
+    enforce_rate_limit(
+        ("login_ip", client_ip(request.scope)),
+        ("login_email", normalize_email(login_req.email)),
+    )
+    return await run_db(login_user, login_req)
+
+
+@app.post("/logout")
+def logout(authorization: Optional[str] = Header(default=None, description="Bearer session token from /login")):
+    """Revoke the session token sent in the Authorization header"""
+    token = parse_bearer_token(authorization)
+    if token:
+        session_store.revoke(token)
+    return {"message": "Logged out"}
+
+
+def load_books_page(db: Session, user_id: Optional[int], **filters):
+    """Load one filtered page of books with purchase flags for the user"""
+    rows, next_cursor = query_books_page(db, **filters)
+    owned_ids = owned_book_ids(db, user_id) if user_id else set()
+    return [BookDTO.from_row(row, row.id in owned_ids) for row in rows], next_cursor
+
+
 @app.get("/books")
-def list_books(
+async def list_books(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size; enables pagination"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    author: Optional[str] = Query(None, description="Only books by this author"),
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[str] = Query(None, description="price, created_at or title"),
+    order: str = Query("desc", description="asc or desc"),
+    authorization: Optional[str] = Header(default=None, description="Bearer session token (optional)"),
     email: Optional[str] = Header(default=None, description="User email (optional)"),
     password: Optional[str] = Header(default=None, description="User password (optional)"),
-    db: Session = Depends(get_db),
+    if_none_match: Optional[str] = Header(default=None, description="ETag from a previous response"),
 ):
-    """Get all books, optionally with purchase status for authenticated users"""
-    books = db.query(Book).all()
-    
+    """Get books, optionally with purchase status for authenticated users
+
+    Without query parameters the whole catalog is served from a pre-serialized
+    snapshot with If-None-Match / 304 support. With any of limit, cursor,
+    author, min_price, max_price or sort, one keyset-paginated page is returned
+    and the X-Next-Cursor header holds the cursor for the next page.
+    """
     # Check if user is authenticated
-    user = None
-    if email and password:
-        user = db.query(User).filter(User.email == email).first()
-        if user and not verify_password(password, user.password_hash):
-            user = None
-    
-    result = []
-    for book in books:
-        book_data = {
-            "id": book.id,
-            "title": book.title,
-            "author": book.author,
-            "price": float(book.price),
-            "description": book.description,
-            "pdf_url": book.pdf_path,  # pdf_path now contains URL
-            "cover_url": book.cover_url,  # Cover image URL
-            "is_purchased": False,
-        }
-        
-        # Check if user has purchased this book
-        if user:
-            book_data["is_purchased"] = user_has_book(db, user.id, book.id)
-        
-        result.append(book_data)
-    
-    return result
+    user = await resolve_user(authorization, email, password, client_ip(request.scope))
+
+    if any(param is not None for param in (limit, cursor, author, min_price, max_price, sort)):
+        sort = sort or "created_at"
+        if sort not in SORT_COLUMNS:
+            raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+        if order not in ("asc", "desc"):
+            raise HTTPException(status_code=400, detail="order must be asc or desc")
+        try:
+            books, next_cursor = await run_db(
+                load_books_page,
+                user.id if user else None,
+                limit=limit or 50,
+                cursor=cursor,
+                author=author,
+                min_price=min_price,
+                max_price=max_price,
+                sort=sort,
+                descending=order == "desc",
+            )
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        return TimedJSONResponse(books, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+    if not catalog.is_fresh():
+        await catalog.refresh()
+    owned_ids = await run_db(owned_book_ids, user.id) if user else set()
+    body, etag = catalog.render(owned_ids)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Vary": "Authorization, email, password",
+    }
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def load_search_results(db: Session, q: str, limit: int, offset: int, user_id: Optional[int]) -> list:
+    """Rank matching book ids, then load just those books"""
+    if SEARCH_BACKEND == "memory" and search_index.ready:
+        book_ids = search_index.search(q, limit, offset)
+    else:
+        book_ids = database_search(db, q, limit, offset)
+    if not book_ids:
+        return []
+    rows = {row.id: row for row in db.query(*BOOK_COLUMNS).filter(Book.id.in_(book_ids))}
+    owned_ids = owned_book_ids(db, user_id) if user_id else set()
+    return [BookDTO.from_row(rows[book_id], book_id in owned_ids) for book_id in book_ids if book_id in rows]
+
+
+@app.get("/books/search")
+async def search_books(
+    request: Request,
+    q: str = Query(..., min_length=1, max_length=200, description="Search words; each word also matches as a prefix"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=1000),
+    authorization: Optional[str] = Header(default=None, description="Bearer session token (optional)"),
+    email: Optional[str] = Header(default=None, description="User email (optional)"),
+    password: Optional[str] = Header(default=None, description="User password (optional)"),
+):
+    """Ranked search over book title, author and description"""
+    user = await resolve_user(authorization, email, password, client_ip(request.scope))
+    return TimedJSONResponse(await run_db(load_search_results, q, limit, offset, user.id if user else None))
 
 
 class BookCreate(BaseModel):
@@ -236,25 +466,25 @@ class BookCreate(BaseModel):
     cover_url: Optional[str] = Field(None, description="URL to the cover image (optional)")
 
 
+def books_changed():
+    """Invalidate everything derived from the books table, on every worker sharing the cache"""
+    catalog.bump()
+    shared_cache.bump("admin_stats")
+
+
 @app.post("/admin/books")
 def create_book(
     book_data: BookCreate,
-    admin_user: User = Depends(require_admin),
+    admin_user: AuthenticatedUser = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     """Create a new book with PDF URL"""
-    # Validate URL format
-    if not book_data.pdf_url.startswith(("http://", "https://")):
-        raise HTTPException(status_code=400, detail="PDF URL must be a valid HTTP/HTTPS URL")
-    
-    # Optional: Validate that URL ends with .pdf (can be removed if URLs don't have extensions)
-    # if not book_data.pdf_url.lower().endswith(".pdf"):
-    #     raise HTTPException(status_code=400, detail="URL should point to a PDF file")
+    # Validate URL format (the bulk import applies the same rules)
+    try:
+        validate_book_urls(book_data.pdf_url, book_data.cover_url)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    # Validate cover URL if provided
-    if book_data.cover_url and not book_data.cover_url.startswith(("http://", "https://")):
-        raise HTTPException(status_code=400, detail="Cover image URL must be a valid HTTP/HTTPS URL")
-    
     book = Book(
         title=book_data.title,
         author=book_data.author,
@@ -266,21 +496,47 @@ def create_book(
     db.add(book)
     db.commit()
     db.refresh(book)
+    books_changed()
+    search_index.add(book)
     return {"id": book.id, "message": "Book created successfully"}
 
 
+@app.post("/admin/books/import")
+async def import_books(
+    request: Request,
+    format: str = Query("ndjson", description="ndjson (one book per line) or csv (with a header row)"),
+    admin_user: AuthenticatedUser = Depends(require_admin),
+):
+    """Create or update books in bulk from a CSV or NDJSON request body.
+
+    Books are matched by pdf_url: known URLs are updated, new ones inserted.
+    Invalid rows are skipped and listed by line number in the response.
+    """
+    if format not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(IMPORT_FORMATS)}")
+    body = await spool_body(request.stream())
+    try:
+        report = await run_db_threaded(import_books_file, body, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        body.close()
+    if report["inserted"] or report["updated"]:
+        books_changed()
+        # New rows have no ids here, so re-index rather than adding them one by one
+        if SEARCH_BACKEND == "memory":
+            threading.Thread(target=build_search_index, name="search-index", daemon=True).start()
+    return report
+
+
 def send_payment_email(order_id: int, user_email: str, book_title: str, amount: float, status: str, payment_time: str):
-    """Send payment confirmation email"""
+    """Queue a payment confirmation email for background delivery"""
     try:
-        if not EMAIL_PASSWORD:
+        if not MAIL_ENABLED:
             print(f"Email not configured. Payment details: Order {order_id}, Amount: {amount}, Status: {status}")
             return
         
-        msg = MIMEMultipart()
-        msg['From'] = EMAIL_USER
-        msg['To'] = ADMIN_EMAIL
-        msg['Subject'] = f"Payment {status.upper()} - Order #{order_id}"
-        
+        subject = f"Payment {status.upper()} - Order #{order_id}"
         body = f"""
 Payment Details:
 ---------------
@@ -292,199 +548,486 @@ Status: {status.upper()}
 Payment Time: {payment_time}
 UPI ID: {UPI_ID}
 """
-        msg.attach(MIMEText(body, 'plain'))
-        
-        server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT)
-        server.starttls()
-        server.login(EMAIL_USER, EMAIL_PASSWORD)
-        server.send_message(msg)
-        server.quit()
-        print(f"Payment email sent for order {order_id}")
+        mail_queue.enqueue(ADMIN_EMAIL, subject, body)
+        print(f"Payment email queued for order {order_id}")
     except Exception as e:
-        print(f"Failed to send email: {str(e)}")
+        print(f"Failed to queue email: {str(e)}")
 
 
-@app.post("/buy")
-def buy_book(
-    req: BuyRequest,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
-):
-    """Create order and redirect to UPI payment"""
-    book = db.query(Book).filter(Book.id == req.book_id).first()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    # Create order with pending status
-    order = Order(user_id=user.id, total=book.price, status="pending")
-    db.add(order)
-    db.commit()
-    db.refresh(order)
+def create_order(db: Session, user_id: int, books: list) -> dict:
+    """Write a pending order and its items in one transaction.
 
-    item = OrderItem(
-        order_id=order.id,
-        book_id=book.id,
-        quantity=1,
-        price_each=book.price,
-    )
-    db.add(item)
-    db.commit()
+    books holds (book_id, price) pairs. The order row is flushed to get its id,
+    the items go out as a single executemany, and everything commits once.
+    """
+    total = sum((price for _, price in books), Decimal("0"))
+    try:
+        order = Order(user_id=user_id, total=total, status="pending")
+        db.add(order)
+        db.flush()
+        order_id = order.id
+        db.bulk_insert_mappings(OrderItem, [
+            {"order_id": order_id, "book_id": book_id, "quantity": 1, "price_each": price}
+            for book_id, price in books
+        ])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
 
     # Generate UPI payment URL
-    upi_url = f"upi://pay?pa={UPI_ID}&am={float(book.price)}&cu=INR&tn=Book Purchase - Order {order.id}"
+    upi_url = f"upi://pay?pa={UPI_ID}&am={float(total)}&cu=INR&tn=Book Purchase - Order {order_id}"
     
     return {
         "message": "Redirecting to payment",
-        "order_id": order.id,
-        "amount": float(book.price),
+        "order_id": order_id,
+        "amount": float(total),
         "upi_url": upi_url,
         "upi_id": UPI_ID,
         "status": "pending"
     }
 
 
-@app.post("/payment/verify")
-def verify_payment(
-    order_id: int,
-    status: str = "success",
-    user: User = Depends(get_current_user),
+@app.post("/buy")
+def buy_book(
+    req: BuyRequest,
+    user: AuthenticatedUser = Depends(get_current_user),
     db: Session = Depends(get_db),
 ):
-    """Verify payment and update order status"""
-    order = db.query(Order).filter(Order.id == order_id, Order.user_id == user.id).first()
-    if not order:
-        raise HTTPException(status_code=404, detail="Order not found")
-    
-    if status.lower() == "success":
-        order.status = "paid"
+    """Create order and redirect to UPI payment"""
+    book = db.query(Book.id, Book.price).filter(Book.id == req.book_id).first()
+    if not book:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    # Create order with pending status
+    return create_order(db, user.id, [(book.id, book.price)])
+
+
+@app.post("/cart/checkout")
+def checkout_cart(
+    req: CartCheckoutRequest,
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Create one order for several books and redirect to UPI payment"""
+    book_ids = list(dict.fromkeys(req.book_ids))
+    prices = dict(db.query(Book.id, Book.price).filter(Book.id.in_(book_ids)).all())
+    missing = [book_id for book_id in book_ids if book_id not in prices]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Books not found: {missing}")
+
+    response = create_order(db, user.id, [(book_id, prices[book_id]) for book_id in book_ids])
+    response["book_ids"] = book_ids
+    return response
+
+
+def transition_order(db: Session, order_id: int, user_id: int, from_statuses: tuple, to_status: str) -> bool:
+    """Move the user's order to to_status if it is in one of from_statuses (caller commits).
+
+    A single conditional UPDATE: concurrent requests for the same order queue
+    on its row lock and only the first still finds a matching status, so it
+    returns True for exactly one of them.
+    """
+    changed = (
+        db.query(Order)
+        .filter(Order.id == order_id, Order.user_id == user_id, Order.status.in_(from_statuses))
+        .update({Order.status: to_status}, synchronize_session=False)
+    )
+    return changed == 1
+
+
+def complete_payment(db: Session, user: AuthenticatedUser, order_id: int) -> dict:
+    """Mark an order paid and grant its books; only the call that changed the status sends the email"""
+    try:
+        changed = transition_order(db, order_id, user.id, ("pending", "failed"), "paid")
+        # The total and every book of the order (a cart order can hold several) in one query
+        rows = (
+            db.query(Order.total, OrderItem.book_id, Book.title)
+            .outerjoin(OrderItem, OrderItem.order_id == Order.id)
+            .outerjoin(Book, Book.id == OrderItem.book_id)
+            .filter(Order.id == order_id, Order.user_id == user.id)
+            .all()
+        )
+        if not rows:
+            raise HTTPException(status_code=404, detail="Order not found")
+        if changed:
+            # Granted in the same transaction as the status change
+            grant_entitlements(db, user.id, [row.book_id for row in rows if row.book_id is not None])
         db.commit()
-        
-        # Get book details
-        order_item = db.query(OrderItem).filter(OrderItem.order_id == order_id).first()
-        book = db.query(Book).filter(Book.id == order_item.book_id).first() if order_item else None
-        
+    except Exception:
+        db.rollback()
+        raise
+
+    if changed:
+        shared_cache.bump("admin_stats")
+        titles = [row.title for row in rows if row.title]
         # Send payment email
         payment_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         send_payment_email(
             order_id=order_id,
             user_email=user.email,
-            book_title=book.title if book else "Unknown",
-            amount=float(order.total),
+            book_title=", ".join(titles) if titles else "Unknown",
+            amount=float(rows[0].total),
             status="success",
             payment_time=payment_time
         )
-        
-        return {
-            "message": "Payment successful",
-            "order_id": order_id,
-            "status": "paid"
-        }
-    else:
-        order.status = "failed"
+
+    return {
+        "message": "Payment successful",
+        "order_id": order_id,
+        "status": "paid"
+    }
+
+
+def fail_payment(db: Session, user_id: int, order_id: int) -> dict:
+    """Mark an order failed, taking back its books if it had been paid"""
+    refunded = False
+    try:
+        if not transition_order(db, order_id, user_id, ("pending",), "failed"):
+            if transition_order(db, order_id, user_id, ("paid",), "failed"):
+                revoke_entitlements(db, user_id, order_id)
+                refunded = True
+            elif not db.query(Order.id).filter(Order.id == order_id, Order.user_id == user_id).first():
+                raise HTTPException(status_code=404, detail="Order not found")
         db.commit()
-        return {
-            "message": "Payment failed",
-            "order_id": order_id,
-            "status": "failed"
-        }
+    except Exception:
+        db.rollback()
+        raise
+    if refunded:
+        shared_cache.bump("admin_stats")
+    return {
+        "message": "Payment failed",
+        "order_id": order_id,
+        "status": "failed"
+    }
+
+
+@app.post("/payment/verify")
+def verify_payment(
+    order_id: int,
+    status: str = "success",
+    idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+    user: AuthenticatedUser = Depends(get_current_user),
+    db: Session = Depends(get_db),
+):
+    """Verify payment and update order status.
+
+    Safe to retry: repeated or concurrent calls leave the order as the first
+    one did and send no further email. With an Idempotency-Key header a retry
+    gets the stored response back without touching the database.
+    """
+    succeeded = status.lower() == "success"
+    key, fingerprint = (user.id, idempotency_key), (order_id, succeeded)
+    if idempotency_key:
+        try:
+            replay = idempotency_store.lookup(key, fingerprint)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        if replay is not None:
+            return TimedJSONResponse(replay, headers={"Idempotent-Replayed": "true"})
+
+    response = complete_payment(db, user, order_id) if succeeded else fail_payment(db, user.id, order_id)
+    if idempotency_key:
+        idempotency_store.put(key, fingerprint, response)
+    return response
+
+
+def grant_entitlements(db: Session, user_id: int, book_ids: list) -> None:
+    """Add books to the user's library, skipping ones already there (caller commits)"""
+    if not book_ids:
+        return
+    granted_at = datetime.utcnow()
+    # INSERT IGNORE: two paid orders for the same book must not collide on the primary key
+    db.execute(
+        insert(Entitlement).prefix_with("IGNORE", dialect="mysql").prefix_with("OR IGNORE", dialect="sqlite"),
+        [{"user_id": user_id, "book_id": book_id, "granted_at": granted_at} for book_id in book_ids],
+    )
+
+
+def revoke_entitlements(db: Session, user_id: int, order_id: int) -> None:
+    """Remove the order's books from the library unless another paid order covers them"""
+    for (book_id,) in db.query(OrderItem.book_id).filter(OrderItem.order_id == order_id).all():
+        still_paid = (
+            db.query(OrderItem.id)
+            .join(Order, OrderItem.order_id == Order.id)
+            .filter(
+                Order.user_id == user_id,
+                Order.id != order_id,
+                Order.status == "paid",
+                OrderItem.book_id == book_id,
+            )
+            .first()
+        )
+        if not still_paid:
+            db.query(Entitlement).filter(
+                Entitlement.user_id == user_id, Entitlement.book_id == book_id
+            ).delete(synchronize_session=False)
+            entitlement_cache.invalidate(user_id, book_id)
 
 
 def user_has_book(db: Session, user_id: int, book_id: int) -> bool:
-    q = (
-        db.query(OrderItem)
-        .join(Order, OrderItem.order_id == Order.id)
-        .filter(Order.user_id == user_id, OrderItem.book_id == book_id, Order.status == "paid")
+    return db.query(Entitlement.book_id).filter(
+        Entitlement.user_id == user_id, Entitlement.book_id == book_id
+    ).first() is not None
+
+
+def owned_book_ids(db: Session, user_id: int) -> set:
+    """Return the ids of all books the user owns, in a single query"""
+    rows = db.query(Entitlement.book_id).filter(Entitlement.user_id == user_id).all()
+    return {book_id for (book_id,) in rows}
+
+
+def resolve_download_url(db: Session, user_id: int, book_id: int) -> str:
+    """Return the PDF URL for a book the user owns, or raise 404/403"""
+    # The book and the ownership check in one query
+    row = (
+        db.query(Book.pdf_path, Entitlement.book_id)
+        .outerjoin(Entitlement, and_(Entitlement.book_id == Book.id, Entitlement.user_id == user_id))
+        .filter(Book.id == book_id)
+        .first()
     )
-    return db.query(q.exists()).scalar()
+    if not row:
+        raise HTTPException(status_code=404, detail="Book not found")
+
+    if row.book_id is None:
+        raise HTTPException(
+            status_code=403,
+            detail="You must buy this book to download it",
+        )
+
+    # pdf_path now contains the URL
+    entitlement_cache.put(user_id, book_id, row.pdf_path)
+    return row.pdf_path
+
+
+async def entitled_download_url(user_id: int, book_id: int) -> str:
+    """resolve_download_url, answered from the entitlement cache when possible"""
+    return entitlement_cache.get(user_id, book_id) or await run_db(resolve_download_url, user_id, book_id)
 
 
 @app.get("/books/{book_id}/download")
-def download_book(
+async def download_book(
     book_id: int,
-    user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    user: AuthenticatedUser = Depends(get_current_user),
 ):
     """Redirect to PDF URL if user has purchased the book"""
-    book = db.query(Book).filter(Book.id == book_id).first()
-    if not book:
+    return RedirectResponse(url=await entitled_download_url(user.id, book_id))
+
+
+@app.get("/books/{book_id}/download-link")
+async def get_download_link(
+    book_id: int,
+    user: AuthenticatedUser = Depends(get_current_user),
+):
+    """Issue a signed, expiring link that redirects to the PDF without credentials"""
+    pdf_url = await entitled_download_url(user.id, book_id)
+    token, expires_at = download_signer.sign(user.id, book_id, pdf_url)
+    return {
+        "url": f"/downloads/{token}",
+        "expires_at": datetime.utcfromtimestamp(expires_at).isoformat() + "Z",
+        "expires_in": download_signer.ttl,
+    }
+
+
+@app.get("/downloads/{token}")
+async def follow_download_link(token: str):
+    """Redirect a signed download link to the PDF; checked from the signature alone"""
+    grant = download_signer.verify(token)
+    if grant is None:
+        raise HTTPException(status_code=403, detail="Download link is invalid or has expired")
+    return RedirectResponse(url=grant.url)
+
+
+def load_cover_url(db: Session, book_id: int) -> Optional[str]:
+    row = db.query(Book.cover_url).filter(Book.id == book_id).first()
+    if not row:
         raise HTTPException(status_code=404, detail="Book not found")
+    return row.cover_url
 
-    if not user_has_book(db, user.id, book_id):
-        raise HTTPException(
-            status_code=403,
-            detail="You must buy this book to download it",
+
+@app.get("/books/{book_id}/cover")
+async def get_book_cover(
+    book_id: int,
+    w: int = Query(320, ge=1, le=4096, description="Wanted width in pixels, rounded up to a configured size"),
+    accept: Optional[str] = Header(None),
+    if_none_match: Optional[str] = Header(None),
+):
+    """Serve a resized copy of the book's cover from the on-disk thumbnail cache"""
+    cover_url = await run_db(load_cover_url, book_id)
+    if not cover_url:
+        raise HTTPException(status_code=404, detail="Book has no cover")
+    format = "webp" if accept and "image/webp" in accept else "jpeg"
+    try:
+        image, etag = await run_in_threadpool(cover_cache.thumbnail, cover_url, w, format)
+    except ImportError:
+        # Pillow is not installed: let the browser load the original
+        return RedirectResponse(url=cover_url)
+    except CoverError as e:
+        # The reason stays in the log: it would tell a caller about hosts it cannot reach
+        print(f"Cover for book {book_id} failed: {str(e)}")
+        raise HTTPException(status_code=502, detail="Could not load the cover image")
+    headers = {
+        "Cache-Control": f"public, max-age={COVER_MAX_AGE}",
+        "ETag": f'"{etag}"',
+        "Vary": "Accept",
+    }
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=image, media_type=COVER_FORMATS[format][1], headers=headers)
+
+
+def load_library(db: Session, user_id: int) -> list:
+    """Owned books, most recently granted first"""
+    rows = (
+        db.query(*BOOK_COLUMNS, Entitlement.granted_at)
+        .join(Entitlement, Entitlement.book_id == Book.id)
+        .filter(Entitlement.user_id == user_id)
+        .order_by(Entitlement.granted_at.desc(), Book.id.desc())
+    )
+    return [
+        LibraryBookDTO(
+            row.id, row.title, row.author, float(row.price), row.description, row.pdf_path, row.cover_url, True,
+            row.granted_at,
         )
+        for row in rows
+    ]
+
+
+@app.get("/me/library")
+async def get_library(user: AuthenticatedUser = Depends(get_current_user)):
+    """List the books the current user owns"""
+    return TimedJSONResponse(await run_db(load_library, user.id))
+
+
+def encode_order_cursor(order) -> str:
+    """Build the keyset cursor pointing just after the given order"""
+    return f"{order.created_at.isoformat()},{order.id}"
 
-    # pdf_path now contains the URL
-    return RedirectResponse(url=book.pdf_path)
+
+def decode_order_cursor(cursor: str):
+    """Parse a cursor produced by encode_order_cursor into (created_at, id)"""
+    try:
+        created_at, order_id = cursor.rsplit(",", 1)
+        return datetime.fromisoformat(created_at), int(order_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 
 @app.get("/admin/orders")
 def get_all_orders(
-    admin_user: User = Depends(require_admin),
+    limit: int = Query(100, ge=1, le=500, description="Maximum number of orders to return"),
+    cursor: Optional[str] = Query(None, description="Value of X-Next-Cursor from the previous page"),
+    admin_user: AuthenticatedUser = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
-    """Get all orders with user and book details"""
-    orders = db.query(Order).order_by(Order.created_at.desc()).all()
-    result = []
-    for order in orders:
-        user = db.query(User).filter(User.id == order.user_id).first()
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        books = []
-        for item in order_items:
-            book = db.query(Book).filter(Book.id == item.book_id).first()
-            if book:
-                books.append({
-                    "id": book.id,
-                    "title": book.title,
-                    "author": book.author,
-                    "price": float(item.price_each),
-                })
-        result.append({
-            "order_id": order.id,
-            "user_email": user.email if user else "Unknown",
-            "user_id": user.id if user else None,
-            "total": float(order.total),
-            "status": order.status,
-            "created_at": order.created_at.isoformat() if order.created_at else None,
-            "books": books,
-        })
-    return result
+    """Get orders with user and book details, newest first.
+
+    Results are keyset-paginated on (created_at, id). When more orders are
+    available the X-Next-Cursor response header holds the cursor for the next page.
+    """
+    query = (
+        db.query(Order.id, Order.total, Order.status, Order.created_at, User.id.label("user_id"), User.email)
+        .outerjoin(User, User.id == Order.user_id)
+        .order_by(Order.created_at.desc(), Order.id.desc())
+    )
+    if cursor:
+        cursor_created_at, cursor_id = decode_order_cursor(cursor)
+        query = query.filter(
+            or_(
+                Order.created_at < cursor_created_at,
+                and_(Order.created_at == cursor_created_at, Order.id < cursor_id),
+            )
+        )
+    # Fetch one extra row to know whether another page exists
+    orders = query.limit(limit + 1).all()
+    headers = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        headers = {"X-Next-Cursor": encode_order_cursor(orders[-1])}
+
+    result = {
+        order.id: AdminOrderDTO(
+            order.id,
+            order.email or "Unknown",
+            order.user_id,
+            float(order.total),
+            order.status,
+            order.created_at,
+            [],
+        )
+        for order in orders
+    }
+    if result:
+        items = (
+            db.query(OrderItem.order_id, Book.id, Book.title, Book.author, OrderItem.price_each)
+            .join(Book, Book.id == OrderItem.book_id)
+            .filter(OrderItem.order_id.in_(list(result)))
+            .order_by(OrderItem.order_id, OrderItem.id)
+        )
+        for order_id, book_id, title, author, price_each in items:
+            result[order_id].books.append(OrderBookDTO(book_id, title, author, float(price_each)))
+    return TimedJSONResponse(list(result.values()), headers=headers)
+
+
+@app.get("/admin/orders/export")
+def export_orders(
+    format: str = Query("ndjson", description="ndjson (one order per line) or csv (one line per order item)"),
+    start: Optional[datetime] = Query(None, description="Only orders created at or after this time (ISO 8601)"),
+    end: Optional[datetime] = Query(None, description="Only orders created before this time (ISO 8601)"),
+    admin_user: AuthenticatedUser = Depends(require_admin),
+):
+    """Stream the full order history, oldest first, as a download.
+
+    Rows are read through a server-side cursor and written out in chunks, so
+    memory use does not grow with the number of orders exported.
+    """
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    start, end = naive_utc(start), naive_utc(end)
+    if start and end and start >= end:
+        raise HTTPException(status_code=400, detail="start must be before end")
+
+    media_type, stream = EXPORT_FORMATS[format]
+    # The stream opens its own session: it is still running after this handler returns
+    filename = f"orders-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}"
+    return StreamingResponse(
+        stream(SessionLocal, start, end),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
 
 
 @app.get("/admin/books")
 def get_all_books_admin(
-    admin_user: User = Depends(require_admin),
+    admin_user: AuthenticatedUser = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     """Get all books with purchase statistics"""
-    books = db.query(Book).all()
-    result = []
-    for book in books:
-        # Count purchases
-        purchase_count = (
-            db.query(OrderItem)
-            .join(Order, OrderItem.order_id == Order.id)
-            .filter(OrderItem.book_id == book.id, Order.status == "paid")
-            .count()
+    # Count paid purchases for every book in one grouped query
+    purchase_counts = (
+        db.query(OrderItem.book_id, func.count(OrderItem.id).label("purchase_count"))
+        .join(Order, OrderItem.order_id == Order.id)
+        .filter(Order.status == "paid")
+        .group_by(OrderItem.book_id)
+        .subquery()
+    )
+    rows = (
+        db.query(
+            Book.id, Book.title, Book.author, Book.price, Book.description, Book.cover_url,
+            func.coalesce(purchase_counts.c.purchase_count, 0), Book.created_at,
         )
-        result.append({
-            "id": book.id,
-            "title": book.title,
-            "author": book.author,
-            "price": float(book.price),
-            "description": book.description,
-            "cover_url": book.cover_url,
-            "purchase_count": purchase_count,
-            "created_at": book.created_at.isoformat() if book.created_at else None,
-        })
-    return result
+        .outerjoin(purchase_counts, purchase_counts.c.book_id == Book.id)
+    )
+    return TimedJSONResponse([
+        AdminBookDTO(book_id, title, author, float(price), description, cover_url, purchase_count, created_at)
+        for book_id, title, author, price, description, cover_url, purchase_count, created_at in rows
+    ])
 
 
 @app.delete("/admin/books/{book_id}")
 def delete_book(
     book_id: int,
-    admin_user: User = Depends(require_admin),
+    admin_user: AuthenticatedUser = Depends(require_admin),
     db: Session = Depends(get_db),
 ):
     """Delete a book (admin only)
@@ -509,12 +1052,16 @@ def delete_book(
         # This is safe because users have already downloaded the book
         # Use bulk delete for better performance
         try:
+            db.query(Entitlement).filter(Entitlement.book_id == book_id).delete(synchronize_session=False)
             deleted_items = db.query(OrderItem).filter(OrderItem.book_id == book_id).delete(synchronize_session=False)
             # Flush to ensure deletions are processed before deleting the book
             db.flush()
         except Exception as delete_items_error:
             # If bulk delete fails, try individual deletion
             print(f"Bulk delete failed, trying individual deletion: {delete_items_error}")
+            # Entitlements reference the book too; the book delete fails while any remain
+            for entitlement in db.query(Entitlement).filter(Entitlement.book_id == book_id).all():
+                db.delete(entitlement)
             order_items = db.query(OrderItem).filter(OrderItem.book_id == book_id).all()
             deleted_items = 0
             for item in order_items:
@@ -528,6 +1075,9 @@ def delete_book(
         # Now delete the book
         db.delete(book)
         db.commit()
+        books_changed()
+        search_index.remove(book_id)
+        entitlement_cache.invalidate_book(book_id)
         
         message = "Book deleted successfully"
         if purchase_count > 0:
@@ -556,9 +1106,13 @@ def delete_book(
             # Try alternative approach: delete using raw SQL with parameterized queries
             try:
                 # Use parameterized SQL to safely delete order items and book
+                db.execute(text("DELETE FROM entitlements WHERE book_id = :book_id"), {"book_id": book_id})
                 db.execute(text("DELETE FROM order_items WHERE book_id = :book_id"), {"book_id": book_id})
                 db.execute(text("DELETE FROM books WHERE id = :book_id"), {"book_id": book_id})
                 db.commit()
+                books_changed()
+                search_index.remove(book_id)
+                entitlement_cache.invalidate_book(book_id)
                 return {
                     "message": "Book deleted successfully (using alternative method)",
                     "book_id": book_id,
@@ -578,24 +1132,80 @@ def delete_book(
         )
 
 
-@app.get("/admin/stats")
-def get_admin_stats(
-    admin_user: User = Depends(require_admin),
-    db: Session = Depends(get_db),
-):
-    """Get admin dashboard statistics"""
+def load_admin_stats(db: Session) -> dict:
     total_books = db.query(Book).count()
     total_users = db.query(User).filter(User.role == "user").count()
-    total_orders = db.query(Order).filter(Order.status == "paid").count()
-    total_revenue = db.query(Order).filter(Order.status == "paid").all()
-    revenue = sum(float(order.total) for order in total_revenue)
+    total_orders, total_revenue = (
+        db.query(func.count(Order.id), func.coalesce(func.sum(Order.total), 0))
+        .filter(Order.status == "paid")
+        .one()
+    )
     
     return {
         "total_books": total_books,
         "total_users": total_users,
         "total_orders": total_orders,
-        "total_revenue": revenue,
+        "total_revenue": float(total_revenue),
+    }
+
+
+@app.get("/admin/stats")
+def get_admin_stats(
+    admin_user: AuthenticatedUser = Depends(require_admin),
+    db: Session = Depends(get_db),
+):
+    """Get admin dashboard statistics (cached for every worker, one loader at a time)"""
+    return shared_cache.get_or_set("admin_stats", "totals", lambda: load_admin_stats(db), ADMIN_STATS_TTL)
+
+
+@app.get("/admin/metrics")
+def get_admin_metrics(
+    admin_user: AuthenticatedUser = Depends(require_admin),
+):
+    """Get runtime metrics for the database pool, caches and background workers"""
+    metrics = {
+        "db_pool": pool_metrics.snapshot(engine.pool),
+        "auth_cache": auth_cache.stats(),
+        "sessions": {"active": session_store.count(), "ttl_seconds": SESSION_TTL},
+        "mail_queue": mail_queue.stats(),
+        "rate_limit": rate_limiter.stats(),
+        "entitlement_cache": entitlement_cache.stats(),
+        "download_links": download_signer.stats(),
+        "idempotency": idempotency_store.stats(),
+        "covers": cover_cache.stats(),
+        "shared_cache": shared_cache.stats(),
     }
+    if async_engine is not None:
+        metrics["async_db_pool"] = pool_metrics.pool_state(async_engine.pool)
+    return metrics
+
+
+@app.get("/metrics", include_in_schema=False)
+def get_prometheus_metrics(authorization: Optional[str] = Header(default=None)):
+    """Per-route request histograms in the Prometheus text format (PROFILING_ENABLED only)"""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    response = metrics_response(authorization)
+    if response is None:
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return response
+
+
+async def can_profile(scope) -> bool:
+    """Only admins may swap a response for a profiler report"""
+    headers = Headers(scope=scope)
+    try:
+        user = await resolve_user(
+            headers.get("authorization"), headers.get("email"), headers.get("password"), client_ip(scope)
+        )
+    except HTTPException:
+        return False
+    return user is not None and user.role == "admin"
+
+
+if PROFILING_ENABLED:
+    # Added last so it wraps everything, CORS included
+    app.add_middleware(ProfilingMiddleware, authorize_profile=can_profile)
 
 
 @app.get("/")
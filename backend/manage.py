@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""Operational commands for the backend. Run from the backend directory:
+
+    python manage.py migrate                 # alembic upgrade head
+    python manage.py create-schema           # create missing tables from the models
+    python manage.py check-plans             # EXPLAIN the hot queries (see query_plans.py)
+    python manage.py seed --books 10000 --users 1000 --orders 10000
+    python manage.py import-books feed.ndjson     # or feed.csv, or - for stdin
+    python manage.py import-time --budget-ms 1500
+"""
+import argparse
+import os
+import random
+import re
+import subprocess
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cold-start budget for `import main`, checked by the import-time command
+IMPORT_TIME_BUDGET_MS = float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500"))
+
+_IMPORTTIME_RE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def run_migrations(revision: str = "head") -> None:
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(os.path.join(BACKEND_DIR, "alembic.ini")), revision)
+
+
+def migrate(args) -> int:
+    run_migrations(args.revision)
+    return 0
+
+
+def create_schema(args) -> int:
+    from db import engine
+    from models import Base
+
+    Base.metadata.create_all(bind=engine)
+    print("Schema created")
+    return 0
+
+
+def check_plans(args) -> int:
+    import query_plans
+
+    return 1 if query_plans.check() else 0
+
+
+SEED_PASSWORD = "password123"
+SEED_ADMIN_EMAIL = "admin@example.com"
+_SEED_WORDS = (
+    "silent river shadow garden winter empire glass north letters machine paper city ocean "
+    "stone memory light forest night history code market kingdom journey atlas"
+).split()
+
+
+def _seed_rows(table, rows, conn, batch_size):
+    """Insert rows (an iterable of dicts) with one executemany per batch"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            conn.execute(table.insert(), batch)
+            batch = []
+    if batch:
+        conn.execute(table.insert(), batch)
+
+
+def seed_database(engine, books: int, users: int, orders: int, batch_size: int = 5000, seed: int = 42) -> dict:
+    """Append a synthetic catalog, users and orders (with entitlements for paid orders).
+
+    Users are user<N>@example.com with password SEED_PASSWORD; an admin
+    (SEED_ADMIN_EMAIL) is added if missing. Returns the counts inserted.
+    """
+    from sqlalchemy import func, select
+
+    from models import Book, Entitlement, Order, OrderItem, User
+
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    span = timedelta(days=730).total_seconds()
+
+    def moment():
+        return now - timedelta(seconds=rng.random() * span)
+
+    with engine.begin() as conn:
+        def next_id(model):
+            return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+        first_user, first_book, first_order, first_item = next_id(User), next_id(Book), next_id(Order), next_id(OrderItem)
+        if conn.execute(select(User.id).where(User.email == SEED_ADMIN_EMAIL)).first() is None:
+            conn.execute(User.__table__.insert(), [
+                {"email": SEED_ADMIN_EMAIL, "password_hash": SEED_PASSWORD, "role": "admin", "created_at": now},
+            ])
+            first_user += 1
+
+    user_ids = range(first_user, first_user + users)
+    book_ids = range(first_book, first_book + books)
+    authors = [f"Author {i}" for i in range(max(books // 20, 1))]
+    prices = {}
+
+    def book_rows():
+        for book_id in book_ids:
+            prices[book_id] = Decimal(rng.randrange(4900, 99900)) / 100
+            title = " ".join(rng.choice(_SEED_WORDS) for _ in range(3)).title()
+            yield {
+                "id": book_id,
+                "title": f"{title} {book_id}",
+                "author": rng.choice(authors),
+                "price": prices[book_id],
+                "description": " ".join(rng.choice(_SEED_WORDS) for _ in range(30)),
+                "pdf_path": f"https://example.com/books/{book_id}.pdf",
+                "cover_url": None,
+                "created_at": moment(),
+            }
+
+    def user_rows():
+        for user_id in user_ids:
+            yield {
+                "id": user_id,
+                "email": f"user{user_id}@example.com",
+                "password_hash": SEED_PASSWORD,
+                "role": "user",
+                "created_at": moment(),
+            }
+
+    items, entitlements = [], set()
+
+    def order_rows():
+        item_id = first_item
+        for order_id in range(first_order, first_order + orders):
+            user_id = rng.choice(user_ids)
+            order_books = rng.sample(book_ids, min(rng.choice((1, 1, 1, 2, 3)), len(book_ids)))
+            status = rng.choices(("paid", "pending", "failed"), weights=(70, 20, 10))[0]
+            for book_id in order_books:
+                items.append({
+                    "id": item_id, "order_id": order_id, "book_id": book_id, "quantity": 1, "price_each": prices[book_id],
+                })
+                item_id += 1
+                if status == "paid":
+                    entitlements.add((user_id, book_id))
+            yield {
+                "id": order_id,
+                "user_id": user_id,
+                "total": sum(prices[book_id] for book_id in order_books),
+                "status": status,
+                "created_at": moment(),
+            }
+
+    granted_at = now
+    with engine.begin() as conn:
+        _seed_rows(Book.__table__, book_rows(), conn, batch_size)
+        _seed_rows(User.__table__, user_rows(), conn, batch_size)
+        if books and users:
+            _seed_rows(Order.__table__, order_rows(), conn, batch_size)
+            _seed_rows(OrderItem.__table__, items, conn, batch_size)
+            existing = set(conn.execute(select(Entitlement.user_id, Entitlement.book_id)).all()) if first_order > 1 else set()
+            _seed_rows(
+                Entitlement.__table__,
+                ({"user_id": u, "book_id": b, "granted_at": granted_at} for u, b in entitlements - existing),
+                conn,
+                batch_size,
+            )
+    return {"books": books, "users": users, "orders": orders if books and users else 0, "order_items": len(items)}
+
+
+def seed(args) -> int:
+    from db import engine
+
+    counts = seed_database(engine, args.books, args.users, args.orders, args.batch_size, args.seed)
+    print("Seeded " + ", ".join(f"{count} {name}" for name, count in counts.items()))
+    return 0
+
+
+def import_books(args) -> int:
+    import time
+
+    from book_import import BOOK_IMPORT_BATCH_SIZE, decode_lines
+    from book_import import import_books as run_import
+    from db import SessionLocal
+
+    format = args.format or ("csv" if args.file.lower().endswith(".csv") else "ndjson")
+    file = sys.stdin.buffer if args.file == "-" else open(args.file, "rb")
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        report = run_import(db, decode_lines(file), format, args.batch_size or BOOK_IMPORT_BATCH_SIZE)
+    except ValueError as e:
+        print(f"Import failed: {str(e)}")
+        return 1
+    finally:
+        db.close()
+        if file is not sys.stdin.buffer:
+            file.close()
+    elapsed = time.perf_counter() - start
+    print(
+        f"Imported {report['rows']} rows in {elapsed:.2f}s ({report['rows'] / max(elapsed, 1e-9):.0f} rows/s): "
+        f"{report['inserted']} inserted, {report['updated']} updated, {report['failed']} failed"
+    )
+    for error in report["errors"]:
+        print(f"  line {error['line']}: {error['error']}")
+    if report["failed"] > len(report["errors"]):
+        print(f"  ... {report['failed'] - len(report['errors'])} more errors")
+    if report["inserted"] or report["updated"]:
+        from cache import shared_cache
+
+        # With a file or Redis CACHE_BACKEND running servers refresh at once,
+        # otherwise within CATALOG_TTL; restart them to re-index search
+        shared_cache.bump("catalog")
+        shared_cache.bump("admin_stats")
+    return 1 if report["failed"] else 0
+
+
+def measure_import_time(module: str):
+    """Import module in a fresh interpreter; return (total µs, [(cumulative µs, name)] of its direct imports)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    entries = []  # (cumulative µs, nesting depth, name); children are printed before their parent
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_RE.match(line)
+        if match:
+            entries.append((int(match.group(2)), len(match.group(3)) // 2, match.group(4)))
+    for index in range(len(entries) - 1, -1, -1):
+        total, depth, name = entries[index]
+        if name == module:
+            break
+    else:
+        raise SystemExit(f"{module} not found in -X importtime output")
+    children = []
+    for cumulative, child_depth, name in reversed(entries[:index]):
+        if child_depth <= depth:
+            break
+        if child_depth == depth + 1:
+            children.append((cumulative, name))
+    return total, children
+
+
+def import_time(args) -> int:
+    total, children = measure_import_time(args.module)
+    print(f"import {args.module}: {total / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    for cumulative, name in sorted(children, reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+    if total / 1000 > args.budget_ms:
+        print("Import time is over budget")
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="NoPaper backend management commands")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    cmd = commands.add_parser("migrate", help="Apply Alembic migrations")
+    cmd.add_argument("revision", nargs="?", default="head")
+    cmd.set_defaults(func=migrate)
+
+    cmd = commands.add_parser("create-schema", help="Create missing tables without Alembic (local development)")
+    cmd.set_defaults(func=create_schema)
+
+    cmd = commands.add_parser("check-plans", help="Fail if a hot query falls back to a full table scan")
+    cmd.set_defaults(func=check_plans)
+
+    cmd = commands.add_parser("seed", help="Insert a synthetic catalog, users and orders")
+    cmd.add_argument("--books", type=int, default=10000)
+    cmd.add_argument("--users", type=int, default=1000)
+    cmd.add_argument("--orders", type=int, default=10000)
+    cmd.add_argument("--batch-size", type=int, default=5000)
+    cmd.add_argument("--seed", type=int, default=42, help="Random seed, for reproducible data")
+    cmd.set_defaults(func=seed)
+
+    cmd = commands.add_parser("import-books", help="Create or update books from a CSV or NDJSON file")
+    cmd.add_argument("file", help="Path to the file, or - for stdin")
+    cmd.add_argument("--format", choices=("ndjson", "csv"), help="Defaults to csv for .csv files, else ndjson")
+    cmd.add_argument("--batch-size", type=int, help="Rows per executemany (default BOOK_IMPORT_BATCH_SIZE)")
+    cmd.set_defaults(func=import_books)
+
+    cmd = commands.add_parser("import-time", help="Measure cold import time against a budget")
+    cmd.add_argument("--module", default="main")
+    cmd.add_argument("--budget-ms", type=float, default=IMPORT_TIME_BUDGET_MS)
+    cmd.add_argument("--top", type=int, default=10, help="Number of slowest imports to list")
+    cmd.set_defaults(func=import_time)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""Initial schema: users, books, orders, order_items
+
+Databases created earlier by Base.metadata.create_all already have these
+tables, so each one is only created when missing.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _has_table(name):
+    return sa.inspect(op.get_bind()).has_table(name)
+
+
+def upgrade():
+    if not _has_table("users"):
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("email", sa.String(255), nullable=False, unique=True, index=True),
+            sa.Column("password_hash", sa.String(255), nullable=False),
+            sa.Column("role", sa.String(20), nullable=False),
+            sa.Column("created_at", sa.DateTime),
+        )
+    if not _has_table("books"):
+        op.create_table(
+            "books",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("title", sa.String(255), nullable=False),
+            sa.Column("author", sa.String(255), nullable=False),
+            sa.Column("price", sa.Numeric(10, 2), nullable=False),
+            sa.Column("description", sa.Text),
+            sa.Column("cover_url", sa.Text),
+            sa.Column("pdf_path", sa.String(500), nullable=False),
+            sa.Column("created_at", sa.DateTime),
+        )
+    if not _has_table("orders"):
+        op.create_table(
+            "orders",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("total", sa.Numeric(10, 2), nullable=False),
+            sa.Column("status", sa.String(20)),
+            sa.Column("created_at", sa.DateTime),
+        )
+    if not _has_table("order_items"):
+        op.create_table(
+            "order_items",
+            sa.Column("id", sa.Integer, primary_key=True, index=True),
+            sa.Column("order_id", sa.Integer, sa.ForeignKey("orders.id"), nullable=False),
+            sa.Column("book_id", sa.Integer, sa.ForeignKey("books.id"), nullable=False),
+            sa.Column("quantity", sa.Integer, nullable=False),
+            sa.Column("price_each", sa.Numeric(10, 2), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table("order_items")
+    op.drop_table("orders")
+    op.drop_table("books")
+    op.drop_table("users")
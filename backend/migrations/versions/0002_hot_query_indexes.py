@@ -0,0 +1,60 @@
+"""Indexes for the catalog, ownership, purchase-count and admin order queries
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+# (index name, table, columns)
+INDEXES = [
+    # User counts by role for /admin/stats
+    ("ix_users_role", "users", ["role"]),
+    # Ownership checks and order history per user
+    ("ix_orders_user_id_status", "orders", ["user_id", "status"]),
+    # Paid-order aggregates for /admin/stats
+    ("ix_orders_status_created_at", "orders", ["status", "created_at"]),
+    # Keyset pagination of /admin/orders
+    ("ix_orders_created_at_id", "orders", ["created_at", "id"]),
+    # Purchase counts and ownership lookups by book
+    ("ix_order_items_book_id_order_id", "order_items", ["book_id", "order_id"]),
+    # Loading the items of a page of orders
+    ("ix_order_items_order_id", "order_items", ["order_id"]),
+    # GET /books sort keys and author filter
+    ("ix_books_price_id", "books", ["price", "id"]),
+    ("ix_books_created_at_id", "books", ["created_at", "id"]),
+    ("ix_books_title_id", "books", ["title", "id"]),
+    ("ix_books_author_price_id", "books", ["author", "price", "id"]),
+]
+
+
+def _existing_indexes(table):
+    return {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        if name not in _existing_indexes(table):
+            op.create_index(name, table, columns)
+    # FULLTEXT fallback for /books/search only exists on MySQL
+    if op.get_bind().dialect.name == "mysql" and "ix_books_fulltext" not in _existing_indexes("books"):
+        op.create_index(
+            "ix_books_fulltext", "books", ["title", "author", "description"], mysql_prefix="FULLTEXT"
+        )
+
+
+def downgrade():
+    if op.get_bind().dialect.name == "mysql":
+        op.drop_index("ix_books_fulltext", table_name="books")
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
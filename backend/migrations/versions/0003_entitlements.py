@@ -0,0 +1,47 @@
+"""Entitlements table for O(1) ownership checks, backfilled from paid orders
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not sa.inspect(op.get_bind()).has_table("entitlements"):
+        op.create_table(
+            "entitlements",
+            sa.Column("user_id", sa.Integer, sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("book_id", sa.Integer, sa.ForeignKey("books.id"), nullable=False),
+            sa.Column("granted_at", sa.DateTime, nullable=False),
+            sa.PrimaryKeyConstraint("user_id", "book_id"),
+        )
+        op.create_index("ix_entitlements_book_id", "entitlements", ["book_id"])
+    # One-time backfill: every book in a paid order, granted at its earliest purchase
+    op.execute(
+        """
+        INSERT INTO entitlements (user_id, book_id, granted_at)
+        SELECT o.user_id, oi.book_id, MIN(COALESCE(o.created_at, CURRENT_TIMESTAMP))
+        FROM order_items oi
+        JOIN orders o ON oi.order_id = o.id
+        WHERE o.status = 'paid'
+          AND NOT EXISTS (
+              SELECT 1 FROM entitlements e WHERE e.user_id = o.user_id AND e.book_id = oi.book_id
+          )
+        GROUP BY o.user_id, oi.book_id
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_entitlements_book_id", table_name="entitlements")
+    op.drop_table("entitlements")
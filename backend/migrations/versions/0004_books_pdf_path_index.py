@@ -0,0 +1,25 @@
+"""Index books.pdf_path for matching rows of the bulk book import
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if "ix_books_pdf_path" not in {index["name"] for index in sa.inspect(op.get_bind()).get_indexes("books")}:
+        op.create_index("ix_books_pdf_path", "books", ["pdf_path"])
+
+
+def downgrade():
+    op.drop_index("ix_books_pdf_path", table_name="books")
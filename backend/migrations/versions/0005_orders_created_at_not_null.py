@@ -0,0 +1,45 @@
+"""Backfill orders.created_at and make it NOT NULL
+
+Keyset pagination of /admin/orders on (created_at, id) cannot reach rows
+with a NULL date. Undated orders are given the oldest known order date, so
+they are listed last.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    oldest = bind.execute(sa.text("SELECT MIN(created_at) FROM orders")).scalar()
+    if isinstance(oldest, str):  # SQLite returns the stored text
+        oldest = datetime.fromisoformat(oldest)
+    bind.execute(
+        sa.text("UPDATE orders SET created_at = :created_at WHERE created_at IS NULL"),
+        {"created_at": oldest or datetime.utcnow()},
+    )
+    with op.batch_alter_table("orders") as batch:
+        batch.alter_column(
+            "created_at",
+            existing_type=sa.DateTime(),
+            nullable=False,
+            server_default=sa.func.current_timestamp(),
+        )
+
+
+def downgrade():
+    with op.batch_alter_table("orders") as batch:
+        batch.alter_column("created_at", existing_type=sa.DateTime(), nullable=True, server_default=None)
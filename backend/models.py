@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Numeric, Text, DateTime, ForeignKey, Index, PrimaryKeyConstraint, func
 from sqlalchemy.orm import declarative_base
 from datetime import datetime
 
@@ -11,7 +11,7 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String(255), unique=True, index=True, nullable=False)
     password_hash = Column(String(255), nullable=False)
-    role = Column(String(20), nullable=False)  # 'user' or 'admin'
+    role = Column(String(20), nullable=False, index=True)  # 'user' or 'admin'
     created_at = Column(DateTime, default=datetime.utcnow)
 
 
@@ -27,15 +27,44 @@ class Book(Base):
     pdf_path = Column(String(500), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Index changes also need an Alembic migration in migrations/versions/
+    # Keyset pagination indexes for the GET /books sort keys and author filter
+    __table_args__ = (
+        Index("ix_books_price_id", "price", "id"),
+        Index("ix_books_created_at_id", "created_at", "id"),
+        Index("ix_books_title_id", "title", "id"),
+        Index("ix_books_author_price_id", "author", "price", "id"),
+        # Bulk import matches existing books by URL
+        Index("ix_books_pdf_path", "pdf_path"),
+        # Used by /books/search when the in-memory index is unavailable
+        Index("ix_books_fulltext", "title", "author", "description", mysql_prefix="FULLTEXT"),
+    )
+
 
 class Order(Base):
+    """A purchase of one or more books (order_items).
+
+    Orders and their items are read through column queries and explicit
+    joins; the models deliberately have no relationship() attributes that
+    could lazy-load one row at a time.
+    """
     __tablename__ = "orders"
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     total = Column(Numeric(10, 2), nullable=False)
     status = Column(String(20), default="paid")
-    created_at = Column(DateTime, default=datetime.utcnow)
+    # NOT NULL: /admin/orders pages by (created_at, id)
+    created_at = Column(DateTime, default=datetime.utcnow, server_default=func.current_timestamp(), nullable=False)
+
+    __table_args__ = (
+        # Ownership checks filter a user's orders by status
+        Index("ix_orders_user_id_status", "user_id", "status"),
+        # Paid-order aggregates for /admin/stats
+        Index("ix_orders_status_created_at", "status", "created_at"),
+        # Supports keyset pagination over (created_at, id) in /admin/orders
+        Index("ix_orders_created_at_id", "created_at", "id"),
+    )
 
 
 class OrderItem(Base):
@@ -47,4 +76,27 @@ class OrderItem(Base):
     quantity = Column(Integer, nullable=False)
     price_each = Column(Numeric(10, 2), nullable=False)
 
+    __table_args__ = (
+        # Purchase counts and ownership lookups by book, joined to orders
+        Index("ix_order_items_book_id_order_id", "book_id", "order_id"),
+        Index("ix_order_items_order_id", "order_id"),
+    )
+
+
+class Entitlement(Base):
+    """A book the user owns, written when an order is paid.
+
+    Keyed on (user_id, book_id) so ownership checks are primary-key lookups
+    instead of joins over the whole order history.
+    """
+    __tablename__ = "entitlements"
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    book_id = Column(Integer, ForeignKey("books.id"), nullable=False)
+    granted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
 
+    __table_args__ = (
+        PrimaryKeyConstraint("user_id", "book_id"),
+        # Removing a book deletes its entitlements
+        Index("ix_entitlements_book_id", "book_id"),
+    )
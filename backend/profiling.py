@@ -0,0 +1,281 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from bisect import bisect_left
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi.responses import HTMLResponse, JSONResponse, PlainTextResponse
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from starlette.datastructures import Headers, MutableHeaders
+
+from serialization import FastJSONResponse
+
+
+# Opt-in: per-route timing histograms, Server-Timing headers and /metrics
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+# When set, /metrics requires "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+# Sampling interval of the per-request profiler (seconds)
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", "0.001"))
+
+# Admins send this header ("html" or "text") to get a profile instead of the response
+PROFILE_HEADER = "x-profile"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class RequestStats:
+    """Timings collected while one request is handled"""
+
+    __slots__ = ("statements", "db_time", "serialize_time", "profile", "thread_session")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.profile = False
+        self.thread_session = None  # pyinstrument session of a sync endpoint
+
+    def server_timing(self, total: float) -> str:
+        return (
+            f'total;dur={total * 1000:.2f}, '
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} queries", '
+            f'ser;dur={self.serialize_time * 1000:.2f}'
+        )
+
+
+# Set by the middleware; sync handlers see it too because the threadpool copies the context
+_current_request: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar("request_stats", default=None)
+
+
+class Histogram:
+    """Prometheus-style cumulative histogram keyed by label values"""
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...], buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * len(self.buckets) + [0.0, 0]
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(labels, list(series)) for labels, series in sorted(self._series.items())]
+        for labels, series in items:
+            label_text = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{label_text}}} {series[-1]}")
+        return lines
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class RequestMetrics:
+    """Per-route histograms of wall time, SQL statements, DB time and serialization time"""
+
+    def __init__(self):
+        labels = ("method", "route")
+        self.duration = Histogram("nopaper_http_request_duration_seconds", "Request wall time", labels, LATENCY_BUCKETS)
+        self.statements = Histogram("nopaper_db_statements_per_request", "SQL statements per request", labels, STATEMENT_BUCKETS)
+        self.db_time = Histogram("nopaper_db_time_seconds", "Time spent in SQL statements per request", labels, LATENCY_BUCKETS)
+        self.serialize_time = Histogram("nopaper_serialization_seconds", "Time spent rendering response bodies", labels, LATENCY_BUCKETS)
+        self.responses: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+
+    def record(self, method: str, route: str, status_code: int, duration: float, stats: RequestStats) -> None:
+        labels = (method, route)
+        self.duration.observe(labels, duration)
+        self.statements.observe(labels, stats.statements)
+        self.db_time.observe(labels, stats.db_time)
+        self.serialize_time.observe(labels, stats.serialize_time)
+        with self._lock:
+            key = (method, route, status_code)
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self) -> str:
+        lines = ["# HELP nopaper_http_requests_total Responses by route and status", "# TYPE nopaper_http_requests_total counter"]
+        with self._lock:
+            responses = sorted(self.responses.items())
+        for (method, route, status_code), count in responses:
+            lines.append(f'nopaper_http_requests_total{{method="{method}",route="{_escape(route)}",status="{status_code}"}} {count}')
+        for histogram in (self.duration, self.statements, self.db_time, self.serialize_time):
+            lines.extend(histogram.render())
+        return "\n".join(lines) + "\n"
+
+
+request_metrics = RequestMetrics()
+
+
+def track_queries(engine) -> None:
+    """Count statements and DB time against the request being handled"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start(conn, cursor, statement, parameters, context, executemany):
+        if _current_request.get() is not None:
+            conn.info.setdefault("request_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _stop(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_request.get()
+        starts = conn.info.get("request_query_start")
+        if stats is not None and starts:
+            stats.statements += 1
+            stats.db_time += time.perf_counter() - starts.pop()
+
+    @event.listens_for(engine, "handle_error")
+    def _stop_on_error(exception_context):
+        # Failed statements never reach after_cursor_execute
+        conn = exception_context.connection
+        if conn is None or exception_context.execution_context is None:
+            return
+        stats = _current_request.get()
+        starts = conn.info.get("request_query_start")
+        if stats is not None and starts:
+            stats.statements += 1
+            stats.db_time += time.perf_counter() - starts.pop()
+
+
+class TimedJSONResponse(FastJSONResponse):
+    """FastJSONResponse that records how long rendering the body took"""
+
+    def render(self, content) -> bytes:
+        stats = _current_request.get()
+        if stats is None:
+            return super().render(content)
+        start = time.perf_counter()
+        body = super().render(content)
+        stats.serialize_time += time.perf_counter() - start
+        return body
+
+
+def _profile_sync_endpoint(endpoint):
+    """Run a sync endpoint under its own profiler when its request is being profiled.
+
+    pyinstrument samples only the thread it was started in, and sync endpoints
+    run in the threadpool rather than on the event loop.
+    """
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        stats = _current_request.get()
+        if stats is None or not stats.profile:
+            return endpoint(*args, **kwargs)
+        from pyinstrument import Profiler
+
+        # The copied request context already holds the event loop profiler
+        profiler = Profiler(interval=PROFILER_INTERVAL, async_mode="disabled")
+        profiler.start()
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            stats.thread_session = profiler.stop()
+
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose sync endpoints can be profiled (set as app.router.route_class)"""
+
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        if not asyncio.iscoroutinefunction(endpoint):
+            endpoint = _profile_sync_endpoint(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+class ProfilingMiddleware:
+    """Records per-route timings, adds a Server-Timing header and serves admin profiles.
+
+    authorize_profile(scope) decides whether a request carrying the X-Profile
+    header may be profiled; other requests ignore the header.
+    """
+
+    def __init__(self, app, authorize_profile: Optional[Callable[[dict], Awaitable[bool]]] = None):
+        self.app = app
+        self.authorize_profile = authorize_profile
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        try:
+            profile_format = Headers(scope=scope).get(PROFILE_HEADER)
+            if profile_format and self.authorize_profile and await self.authorize_profile(scope):
+                response = await self._profile(scope, receive, stats, profile_format)
+                status_code = response.status_code
+                await response(scope, receive, send)
+                return
+
+            async def send_with_timing(message):
+                nonlocal status_code
+                if message["type"] == "http.response.start":
+                    status_code = message["status"]
+                    MutableHeaders(scope=message).append("Server-Timing", stats.server_timing(time.perf_counter() - start))
+                await send(message)
+
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_request.reset(token)
+            route = scope.get("route")
+            request_metrics.record(
+                scope["method"], getattr(route, "path", "unmatched"), status_code, time.perf_counter() - start, stats
+            )
+
+    async def _profile(self, scope, receive, stats: RequestStats, profile_format: str):
+        """Handle the request under pyinstrument and return the report instead of its response"""
+        try:
+            from pyinstrument import Profiler
+            from pyinstrument.renderers import ConsoleRenderer, HTMLRenderer
+        except ImportError:
+            return JSONResponse({"detail": "pyinstrument is not installed"}, status_code=501)
+
+        async def discard(message):
+            pass
+
+        stats.profile = True
+        profiler = Profiler(interval=PROFILER_INTERVAL, async_mode="enabled")
+        profiler.start()
+        try:
+            await self.app(scope, receive, discard)
+        finally:
+            session = profiler.stop()
+        # For sync endpoints the interesting work happened in the threadpool
+        session = stats.thread_session or session
+        if profile_format == "text":
+            return PlainTextResponse(ConsoleRenderer(unicode=True, color=False).render(session))
+        return HTMLResponse(HTMLRenderer().render(session))
+
+
+def metrics_response(authorization: Optional[str]):
+    """Prometheus text exposition of the request metrics (None if the token is wrong)"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        return None
+    return PlainTextResponse(request_metrics.render(), media_type="text/plain; version=0.0.4")
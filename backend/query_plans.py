@@ -0,0 +1,99 @@
+"""EXPLAIN the hot queries and fail if any of them falls back to a full table scan.
+
+Run from the backend directory against a database holding realistic data
+(MySQL picks full scans on near-empty tables regardless of indexes):
+
+    python query_plans.py
+
+Exits with status 1 when a query scans a table it is not allowed to scan.
+"""
+import sys
+from contextlib import contextmanager
+from datetime import datetime
+
+from sqlalchemy import event
+
+from db import SessionLocal, engine
+import book_import
+import exports
+import main
+
+
+# (name, call, tables the query may legitimately scan in full)
+HOT_QUERIES = [
+    ("owned_book_ids", lambda db: main.owned_book_ids(db, 1), set()),
+    ("user_has_book", lambda db: main.user_has_book(db, 1, 1), set()),
+    ("library", lambda db: main.load_library(db, 1), set()),
+    ("download", lambda db: _ignore_http_errors(main.resolve_download_url, db, 1, 1), set()),
+    ("admin_orders_page", lambda db: main.get_all_orders(limit=50, cursor=None, admin_user=None, db=db), set()),
+    ("orders_export", lambda db: list(exports.order_rows(db, datetime(2020, 1, 1), datetime(2020, 2, 1))), set()),
+    ("book_import_lookup", lambda db: book_import.existing_books(db, ["https://example.com/a.pdf", "https://example.com/b.pdf"]), set()),
+    ("admin_stats", lambda db: main.load_admin_stats(db), {"books"}),
+    # Lists every book, so only books may be scanned; the purchase counts must use indexes
+    ("admin_books", lambda db: main.get_all_books_admin(admin_user=None, db=db), {"books"}),
+    ("books_page_price", lambda db: main.query_books_page(db, 50, sort="price"), set()),
+    ("books_page_created_at", lambda db: main.query_books_page(db, 50, sort="created_at"), set()),
+    ("books_page_title", lambda db: main.query_books_page(db, 50, sort="title"), set()),
+    ("books_page_author", lambda db: main.query_books_page(db, 50, author="x", sort="price"), set()),
+]
+
+
+def _ignore_http_errors(fn, *args):
+    try:
+        return fn(*args)
+    except main.HTTPException:
+        return None
+
+
+@contextmanager
+def captured_statements():
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", _capture)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", _capture)
+
+
+def full_scans(conn, statement, parameters):
+    """Return the tables the database plans to read in full for a statement"""
+    if engine.dialect.name == "mysql":
+        rows = conn.exec_driver_sql("EXPLAIN " + statement, parameters).mappings().all()
+        return {row["table"] for row in rows if row["type"] == "ALL" and row["table"]}
+    if engine.dialect.name == "sqlite":
+        rows = conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters).all()
+        scans = set()
+        for row in rows:
+            detail = row[-1]
+            if detail.startswith("SCAN ") and "USING" not in detail and detail != "SCAN CONSTANT ROW":
+                scans.add(detail.split()[1])
+        return scans
+    raise SystemExit(f"EXPLAIN check not supported for {engine.dialect.name}")
+
+
+def check() -> int:
+    failures = 0
+    for name, call, allowed in HOT_QUERIES:
+        db = SessionLocal()
+        try:
+            with captured_statements() as statements:
+                call(db)
+            with engine.connect() as conn:
+                for statement, parameters in statements:
+                    scanned = full_scans(conn, statement, parameters) - allowed
+                    if scanned:
+                        failures += 1
+                        print(f"FULL SCAN  {name}: {', '.join(sorted(scanned))}\n  {' '.join(statement.split())}")
+                    else:
+                        print(f"ok         {name}")
+        finally:
+            db.close()
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if check() else 0)
@@ -0,0 +1,185 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+# Set to false to turn every limit off (e.g. for load tests)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+# Shared bucket store for multi-worker deployments, e.g. redis://localhost:6379/0
+RATE_LIMIT_REDIS_URL = os.getenv("RATE_LIMIT_REDIS_URL", "")
+# Buckets kept by the in-memory store before the least recently used are dropped
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Behind Render/Railway the client address is the last X-Forwarded-For entry;
+# without it every caller shares the proxy's address and the per-IP rules turn
+# into site-wide limits. On by default when running on either platform
+_BEHIND_PROXY = bool(os.getenv("RENDER") or os.getenv("RAILWAY_ENVIRONMENT_ID") or os.getenv("RAILWAY_ENVIRONMENT"))
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", str(_BEHIND_PROXY)).lower() == "true"
+
+
+def _parse_rule(value: str) -> Tuple[float, float]:
+    """"N/S" (N attempts per S seconds) -> (burst capacity, tokens per second)"""
+    count, _, seconds = value.partition("/")
+    return float(count), float(count) / float(seconds or 60)
+
+
+# rule -> "N/S": a burst of N attempts, refilled evenly over S seconds
+RATE_LIMIT_RULES = {
+    "login_ip": os.getenv("RATE_LIMIT_LOGIN_IP", "20/60"),
+    "login_email": os.getenv("RATE_LIMIT_LOGIN_EMAIL", "5/60"),
+    "register_ip": os.getenv("RATE_LIMIT_REGISTER_IP", "10/3600"),
+    # email/password header auth, counted only when the auth cache misses
+    "auth_ip": os.getenv("RATE_LIMIT_AUTH_IP", "60/60"),
+    "auth_email": os.getenv("RATE_LIMIT_AUTH_EMAIL", "10/60"),
+}
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process (each worker limits on its own)"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> (tokens, updated_at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float) -> Tuple[bool, float]:
+        """Consume one token; return (allowed, seconds until a token is available)"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * rate)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                # A dropped bucket comes back full, which only errs towards allowing
+                self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+# Token bucket update done atomically inside Redis, using the server clock so
+# every worker agrees on the time
+_TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBucketStore:
+    """Token buckets shared by all workers through Redis (needs the redis package).
+
+    Pass client to use an existing connection (e.g. fakeredis.FakeRedis()).
+    """
+
+    def __init__(self, url: str = "", prefix: str = "nopaper:ratelimit:", client=None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(url, socket_timeout=0.5, socket_connect_timeout=0.5)
+        self.prefix = prefix
+        self._client = client
+        self._take = self._client.register_script(_TAKE_SCRIPT)
+
+    def take(self, key: str, capacity: float, rate: float) -> Tuple[bool, float]:
+        allowed, tokens = self._take(keys=[self.prefix + key], args=[capacity, rate])
+        tokens = float(tokens)
+        return bool(allowed), 0.0 if allowed else (1 - tokens) / rate
+
+    def __len__(self) -> int:
+        return -1  # Not tracked; the keys live in Redis
+
+
+class RateLimiter:
+    """Named token-bucket rules checked against a pluggable bucket store.
+
+    A store error lets the request through: an unavailable Redis must not
+    lock every user out.
+    """
+
+    def __init__(self, store, rules: Dict[str, str], enabled: bool = RATE_LIMIT_ENABLED):
+        self.store = store
+        self.enabled = enabled
+        self.rules = {name: _parse_rule(value) for name, value in rules.items()}
+        self.allowed: Dict[str, int] = {name: 0 for name in rules}
+        self.throttled: Dict[str, int] = {name: 0 for name in rules}
+        self.store_errors = 0
+        self._lock = threading.Lock()
+
+    def hit(self, rule: str, key: str) -> Optional[float]:
+        """Count one attempt; return None if allowed, else seconds to wait"""
+        if not self.enabled or not key:
+            return None
+        capacity, rate = self.rules[rule]
+        try:
+            allowed, retry_after = self.store.take(f"{rule}:{key}", capacity, rate)
+        except Exception as e:
+            with self._lock:
+                self.store_errors += 1
+            print(f"Rate limit store error: {str(e)}")
+            return None
+        with self._lock:
+            if allowed:
+                self.allowed[rule] += 1
+            else:
+                self.throttled[rule] += 1
+        return None if allowed else max(retry_after, 0.001)
+
+    def check(self, *hits: Tuple[str, Optional[str]]) -> Optional[int]:
+        """Apply several (rule, key) hits; return whole seconds to wait if any is throttled"""
+        retry_after = None
+        for rule, key in hits:
+            wait = self.hit(rule, key)
+            if wait is not None:
+                retry_after = max(retry_after or 0, wait)
+        return None if retry_after is None else math.ceil(retry_after)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "backend": "redis" if isinstance(self.store, RedisBucketStore) else "memory",
+                "buckets": len(self.store),
+                "allowed": dict(self.allowed),
+                "throttled": dict(self.throttled),
+                "store_errors": self.store_errors,
+            }
+
+
+def client_ip(scope) -> Optional[str]:
+    """Address of the caller from an ASGI scope (the Request.scope of a handler)"""
+    if RATE_LIMIT_TRUST_FORWARDED:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[-1].strip()
+    client = scope.get("client")
+    return client[0] if client else None
+
+
+def normalize_email(email: Optional[str]) -> Optional[str]:
+    return email.strip().lower() if email else None
+
+
+rate_limiter = RateLimiter(
+    RedisBucketStore(RATE_LIMIT_REDIS_URL) if RATE_LIMIT_REDIS_URL else MemoryBucketStore(),
+    RATE_LIMIT_RULES,
+)
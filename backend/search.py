@@ -0,0 +1,308 @@
+import bisect
+import heapq
+import math
+import os
+import re
+import threading
+from collections import defaultdict
+from itertools import repeat
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import desc, or_, text
+from sqlalchemy.orm import Session
+
+from models import Book
+
+
+# "memory" serves /books/search from the in-process index; "database" always
+# uses MySQL FULLTEXT (or LIKE on other databases)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "memory")
+# A short prefix such as "a" can match a huge number of terms; cap the expansion
+SEARCH_MAX_PREFIX_TERMS = int(os.getenv("SEARCH_MAX_PREFIX_TERMS", "200"))
+
+FIELD_WEIGHTS = {"title": 3.0, "author": 2.0, "description": 1.0}
+PREFIX_MATCH_FACTOR = 0.5
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    return _TOKEN_RE.findall(value.lower()) if value else []
+
+
+class SearchIndex:
+    """In-process inverted index over book title, author and description.
+
+    Every query token matches terms equal to it or starting with it (exact
+    matches rank higher). A book must match all tokens; results are ordered by
+    the summed field weights of the matched terms.
+
+    Besides term -> {book id: weight}, each term keeps its book ids grouped by
+    weight and sorted, so a query reads books best-first and stops once no
+    unread book can enter the requested page (Fagin's threshold algorithm)
+    instead of scoring every matching book.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        self._levels: Dict[str, Dict[float, List[int]]] = defaultdict(dict)
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}
+        self._sorted_terms: List[str] = []
+        self._terms_dirty = False
+        # Changes made while build() scans the table, replayed onto the new index
+        self._pending: Optional[List[tuple]] = None
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._doc_terms)
+
+    def build(self, db: Session, batch_size: int = 5000) -> None:
+        """(Re)build the whole index from the books table.
+
+        Calls must not overlap. Books added or removed during the scan may be
+        missing from (or stale in) what it read, so those changes are replayed
+        after the swap.
+        """
+        with self._lock:
+            self._pending = []
+        try:
+            fresh = SearchIndex()
+            # In id order, so the sorted id lists are only ever appended to
+            query = (
+                db.query(Book.id, Book.title, Book.author, Book.description)
+                .order_by(Book.id)
+                .yield_per(batch_size)
+            )
+            for book_id, title, author, description in query:
+                fresh._add(book_id, title, author, description)
+            fresh._sorted_terms = sorted(fresh._postings)
+            fresh._terms_dirty = False
+        except BaseException:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            for change in self._pending:
+                fresh._remove(change[0])
+                if len(change) > 1:
+                    fresh._add(*change)
+            self._pending = None
+            self._postings = fresh._postings
+            self._levels = fresh._levels
+            self._doc_terms = fresh._doc_terms
+            self._sorted_terms = fresh._sorted_terms
+            self._terms_dirty = fresh._terms_dirty
+            self.ready = True
+
+    def add(self, book: Book) -> None:
+        """Index a newly created book (or re-index an updated one)"""
+        with self._lock:
+            self._remove(book.id)
+            self._add(book.id, book.title, book.author, book.description)
+            if self._pending is not None:
+                self._pending.append((book.id, book.title, book.author, book.description))
+
+    def remove(self, book_id: int) -> None:
+        with self._lock:
+            self._remove(book_id)
+            if self._pending is not None:
+                self._pending.append((book_id,))
+
+    def _add(self, book_id, title, author, description) -> None:
+        weights: Dict[str, float] = {}
+        for field, value in (("title", title), ("author", author), ("description", description)):
+            for term in tokenize(value):
+                weights[term] = weights.get(term, 0.0) + FIELD_WEIGHTS[field]
+        for term, weight in weights.items():
+            if term not in self._postings:
+                self._terms_dirty = True
+            self._postings[term][book_id] = weight
+            bisect.insort(self._levels[term].setdefault(weight, []), book_id)
+        self._doc_terms[book_id] = tuple(weights)
+
+    def _remove(self, book_id: int) -> None:
+        for term in self._doc_terms.pop(book_id, ()):
+            postings = self._postings.get(term)
+            if postings is None or book_id not in postings:
+                continue
+            weight = postings.pop(book_id)
+            levels = self._levels[term]
+            ids = levels[weight]
+            del ids[bisect.bisect_left(ids, book_id)]
+            if not ids:
+                del levels[weight]
+            if not postings:
+                del self._postings[term]
+                del self._levels[term]
+                self._terms_dirty = True
+
+    def _expand(self, token: str) -> List[str]:
+        """Indexed terms equal to or starting with token"""
+        if self._terms_dirty:
+            self._sorted_terms = sorted(self._postings)
+            self._terms_dirty = False
+        start = bisect.bisect_left(self._sorted_terms, token)
+        terms = []
+        for term in self._sorted_terms[start:start + SEARCH_MAX_PREFIX_TERMS]:
+            if not term.startswith(token):
+                break
+            terms.append(term)
+        return terms
+
+    def search(self, query: str, limit: int = 20, offset: int = 0) -> List[int]:
+        """Return ranked book ids matching every token of the query"""
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit <= 0:
+            return []
+        with self._lock:
+            expanded = []
+            for token in tokens:
+                terms = [(term, 1.0 if term == token else PREFIX_MATCH_FACTOR) for term in self._expand(token)]
+                if not terms:
+                    return []
+                expanded.append(terms)
+            ranked = self._top(expanded, offset + limit)
+        return ranked[offset:]
+
+    def _top(self, expanded: List[List[Tuple[str, float]]], count: int) -> List[int]:
+        """Ids of the count best books matching every token, each token given as its (term, factor) list"""
+        streams = [self._ranked(terms) for terms in expanded]
+        # Score and last id of the chunk each stream read last: no unread book
+        # scores more than sum(levels)
+        levels = [math.inf] * len(streams)
+        last_ids = [-1] * len(streams)
+        seen = set()
+        best: List[Tuple[float, int]] = []  # min-heap of (score, -id): the worst kept book on top
+        while True:
+            for i, stream in enumerate(streams):
+                item = next(stream, None)
+                if item is None:
+                    # Every book matching all tokens is in this stream, so all were seen
+                    return [-neg_id for _, neg_id in sorted(best, reverse=True)]
+                score, ids = item
+                levels[i], last_ids[i] = score, ids[-1]
+                ids = [book_id for book_id in ids if book_id not in seen]
+                seen.update(ids)
+                totals = [score] * len(ids)
+                for j, terms in enumerate(expanded):
+                    if j != i:
+                        totals = [t + s if t and s else 0.0 for t, s in zip(totals, self._scores(terms, ids))]
+                for book_id, total in zip(ids, totals):
+                    if not total:
+                        continue
+                    entry = (total, -book_id)
+                    if len(best) < count:
+                        heapq.heappush(best, entry)
+                    elif entry > best[0]:
+                        heapq.heapreplace(best, entry)
+            if len(best) == count:
+                worst_score, worst_neg_id = best[0]
+                threshold = sum(levels)
+                # An unread book scoring exactly the threshold is at every stream's
+                # current level, after its last id there, so it ranks after a
+                # kept book with an id no greater than those
+                if worst_score > threshold or (worst_score == threshold and -worst_neg_id <= max(last_ids)):
+                    return [-neg_id for _, neg_id in sorted(best, reverse=True)]
+
+    def _scores(self, terms: List[Tuple[str, float]], ids: List[int]) -> List[float]:
+        """Each book's score for one token: its best weighted term (0 if none)"""
+        if len(terms) == 1:
+            term, factor = terms[0]
+            scores = map(self._postings[term].get, ids, repeat(0.0))
+            return list(scores) if factor == 1.0 else [score * factor for score in scores]
+        # A prefix can expand to hundreds of terms; a book has only a few
+        factors = dict(terms)
+        scores = []
+        for book_id in ids:
+            best = 0.0
+            for term in self._doc_terms[book_id]:
+                factor = factors.get(term)
+                if factor is not None:
+                    score = self._postings[term][book_id] * factor
+                    if score > best:
+                        best = score
+            scores.append(best)
+        return scores
+
+    def _ranked(self, terms: List[Tuple[str, float]]):
+        """Yield (score, ids) chunks of the books matching any of the terms: best score first, ids ascending"""
+        by_score: Dict[float, List[List[int]]] = defaultdict(list)
+        for term, factor in terms:
+            for weight, ids in self._levels[term].items():
+                by_score[weight * factor].append(ids)
+        # A book matching several terms counts at its best score only (a single
+        # term holds each book once)
+        emitted = set() if len(terms) > 1 else None
+        for score in sorted(by_score, reverse=True):
+            for chunk in _merge_chunks(by_score[score]):
+                if emitted is not None:
+                    chunk = [book_id for book_id in dict.fromkeys(chunk) if book_id not in emitted]
+                    emitted.update(chunk)
+                if chunk:
+                    yield score, chunk
+
+
+def _merge_chunks(lists: List[List[int]], size: int = 256):
+    """Yield the union of sorted id lists in ascending chunks of about size ids (duplicates kept)"""
+    if len(lists) == 1:
+        ids = lists[0]
+        for start in range(0, len(ids), size):
+            yield ids[start:start + size]
+        return
+    positions = [0] * len(lists)
+    while True:
+        # Everything up to the size-th next id of some list: at least size ids,
+        # and nothing a later chunk could still place before them
+        cutoff = min(
+            (ids[position + size - 1] for ids, position in zip(lists, positions) if len(ids) - position >= size),
+            default=None,
+        )
+        chunk = []
+        for i, ids in enumerate(lists):
+            end = len(ids) if cutoff is None else bisect.bisect_right(ids, cutoff, positions[i])
+            chunk += ids[positions[i]:end]
+            positions[i] = end
+        if chunk:
+            chunk.sort()
+            yield chunk
+        if cutoff is None:
+            return
+
+
+def _escape_like(value: str) -> str:
+    """Match value literally in a LIKE pattern escaped with a backslash"""
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def database_search(db: Session, query: str, limit: int = 20, offset: int = 0) -> List[int]:
+    """Fallback search in the database: FULLTEXT on MySQL, LIKE elsewhere"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    if db.bind.dialect.name == "mysql":
+        boolean_query = " ".join(f"+{token}*" for token in tokens)
+        match = text("MATCH (title, author, description) AGAINST (:q IN BOOLEAN MODE)").bindparams(q=boolean_query)
+        rows = (
+            db.query(Book.id)
+            .filter(match)
+            .order_by(desc(match), Book.id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+    else:
+        filters = []
+        for token in tokens:
+            # \w+ tokens keep "_", which LIKE would read as "any character"
+            pattern = "%" + _escape_like(token) + "%"
+            filters.append(or_(
+                Book.title.ilike(pattern, escape="\\"),
+                Book.author.ilike(pattern, escape="\\"),
+                Book.description.ilike(pattern, escape="\\"),
+            ))
+        rows = db.query(Book.id).filter(*filters).order_by(Book.id).offset(offset).limit(limit).all()
+    return [book_id for (book_id,) in rows]
+
+
+search_index = SearchIndex()
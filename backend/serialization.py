@@ -0,0 +1,42 @@
+import dataclasses
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the standard library encoder
+    orjson = None
+
+
+def _default(value: Any):
+    """Encode the types the DTOs and ORM rows contain that JSON has no type for"""
+    if isinstance(value, Decimal):
+        return float(value)
+    if orjson is None:
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if dataclasses.is_dataclass(value):
+            return {field.name: getattr(value, field.name) for field in dataclasses.fields(value)}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact UTF-8 JSON; orjson encodes dataclass DTOs and datetimes natively in C"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with dumps().
+
+    Returning one of these from an endpoint also skips FastAPI's
+    jsonable_encoder pass over the content.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -0,0 +1,63 @@
+import os
+import secrets
+from typing import Optional
+
+from auth_cache import AuthenticatedUser
+from cache import Cache, MemoryBackend, shared_cache
+
+
+# Seconds a session token stays valid after login
+SESSION_TTL = int(os.getenv("SESSION_TTL", "86400"))
+# Upper bound on live sessions held in memory with the memory cache backend
+SESSION_MAX = int(os.getenv("SESSION_MAX", "100000"))
+
+
+class SessionStore:
+    """Opaque session tokens issued by /login, kept in the shared cache.
+
+    Tokens are random and carry no data. With a file or Redis CACHE_BACKEND
+    every worker accepts a token issued by any of them, and tokens survive a
+    restart. The memory backend keeps them in a cache of their own, so other
+    entries never push sessions out; they are then per process as before.
+    """
+
+    def __init__(self, cache: Optional[Cache] = None, ttl: int = SESSION_TTL, max_sessions: int = SESSION_MAX):
+        if cache is None:
+            cache = shared_cache if shared_cache.backend.shared else Cache(MemoryBackend(max_sessions))
+        self.cache = cache
+        self.ttl = ttl
+
+    def _generation(self, email: str) -> int:
+        # revoke_user() bumps it; tokens issued under an older one are dead
+        return self.cache.version(f"user_sessions:{email.strip().lower()}")
+
+    def create(self, user: AuthenticatedUser) -> str:
+        """Issue a new token for a user whose credentials were just verified"""
+        token = secrets.token_urlsafe(32)
+        self.cache.set("sessions", token, (user, self._generation(user.email)), self.ttl)
+        return token
+
+    def get(self, token: str) -> Optional[AuthenticatedUser]:
+        """Return the user for a live token, or None if unknown, expired or revoked"""
+        entry = self.cache.get("sessions", token)
+        if entry is None:
+            return None
+        user, generation = entry
+        if generation != self._generation(user.email):
+            self.revoke(token)
+            return None
+        return user
+
+    def revoke(self, token: str) -> None:
+        self.cache.delete("sessions", token)
+
+    def revoke_user(self, email: str) -> None:
+        """Drop every session of a user, e.g. after a password or role change"""
+        self.cache.bump(f"user_sessions:{email.strip().lower()}")
+
+    def count(self) -> int:
+        """Sessions held in memory, or -1 when they live in the shared cache and are not counted"""
+        return -1 if self.cache.backend.shared else len(self.cache.backend)
+
+
+session_store = SessionStore()
@@ -0,0 +1,181 @@
+"""Shared fixtures: the backend runs against a throwaway, migrated SQLite file.
+
+The backend reads its configuration when imported, so the environment is set
+here before anything imports it. TEST_DB_URL points the suite at another
+database; it is wiped between tests, so never use a real one.
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+
+_tmp = Path(tempfile.mkdtemp(prefix="nopaper-tests-"))
+os.environ["DB_URL"] = os.getenv("TEST_DB_URL", f"sqlite:///{_tmp / 'test.db'}")
+os.environ.setdefault("MAIL_ENABLED", "false")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("COVER_CACHE_DIR", str(_tmp / "covers"))
+os.environ.setdefault("MAIL_OUTBOX_DIR", str(_tmp / "outbox"))
+
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import manage
+
+manage.run_migrations()
+
+import main
+from db import SessionLocal, engine
+from models import Base, Book, Entitlement, Order, OrderItem, User
+
+PASSWORD = "password123"
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Not used as a context manager: startup hooks (mail workers, search
+    # index build) only run in the tests that start them
+    return TestClient(main.app)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@pytest.fixture(autouse=True)
+def clean_database():
+    """Start every test from empty tables and cold in-process caches"""
+    with engine.begin() as conn:
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(table.delete())
+    for cache in (main.auth_cache, main.entitlement_cache, main.idempotency_store):
+        cache._entries.clear()
+    main.catalog.bump()
+    main.shared_cache.bump("admin_stats")
+    rebuild_search_index()
+    yield
+
+
+def rebuild_search_index():
+    session = SessionLocal()
+    try:
+        main.search_index.build(session)
+    finally:
+        session.close()
+
+
+def create_user(email: str = "reader@example.com", role: str = "user", password: str = PASSWORD) -> dict:
+    """Insert a user and return email/password headers for it"""
+    session = SessionLocal()
+    try:
+        session.add(User(email=email, password_hash=password, role=role))
+        session.commit()
+    finally:
+        session.close()
+    return {"email": email, "password": password}
+
+
+@pytest.fixture
+def user():
+    return create_user()
+
+
+@pytest.fixture
+def admin():
+    return create_user("admin@example.com", role="admin")
+
+
+def create_books(count: int, **fields) -> list:
+    """Insert count books and return their ids"""
+    session = SessionLocal()
+    try:
+        first = (session.query(Book.id).order_by(Book.id.desc()).limit(1).scalar() or 0) + 1
+        books = [
+            Book(
+                title=fields.get("title", f"Book {first + i}"),
+                author=fields.get("author", f"Author {(first + i) % 7}"),
+                price=fields.get("price", 10 + (first + i) % 50),
+                description=fields.get("description", "A synthetic test book"),
+                pdf_path=f"https://example.com/books/{first + i}.pdf",
+                cover_url=fields.get("cover_url"),
+            )
+            for i in range(count)
+        ]
+        session.add_all(books)
+        session.commit()
+        return [book.id for book in books]
+    finally:
+        session.close()
+
+
+def grant_books(email: str, book_ids: list) -> int:
+    """Record a paid order for the books (with entitlements) and return its id"""
+    session = SessionLocal()
+    try:
+        user_id = session.query(User.id).filter(User.email == email).scalar()
+        books = session.query(Book).filter(Book.id.in_(book_ids)).all()
+        order = Order(user_id=user_id, total=sum(book.price for book in books), status="paid")
+        session.add(order)
+        session.flush()
+        owned = {book_id for (book_id,) in session.query(Entitlement.book_id).filter(Entitlement.user_id == user_id)}
+        for book in books:
+            session.add(OrderItem(order_id=order.id, book_id=book.id, quantity=1, price_each=book.price))
+            if book.id not in owned:
+                session.add(Entitlement(user_id=user_id, book_id=book.id))
+        session.commit()
+        return order.id
+    finally:
+        session.close()
+
+
+class StatementCounter:
+    """Counts SQL statements sent through the engine while active"""
+
+    def __init__(self, target=engine):
+        self.target = target
+        self.statements = []
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        self.statements = []
+        event.listen(self.target, "before_cursor_execute", self._record)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.target, "before_cursor_execute", self._record)
+
+    def __len__(self) -> int:
+        return len(self.statements)
+
+
+def run_backend(code: str, timeout: float = 120, check: bool = True, **env) -> subprocess.CompletedProcess:
+    """Run code in a fresh interpreter in the backend directory.
+
+    For settings read at import time (DB_ASYNC, CACHE_BACKEND...). DB_URL
+    defaults to a new SQLite file; the script is responsible for migrating it.
+    """
+    env.setdefault("DB_URL", f"sqlite:///{tempfile.mkdtemp(prefix='nopaper-tests-')}/test.db")
+    result = subprocess.run(
+        [sys.executable, "-c", textwrap.dedent(code)],
+        cwd=BACKEND_DIR,
+        env=dict(os.environ, **env),
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+    if check:
+        assert result.returncode == 0, result.stdout + result.stderr
+    return result
@@ -0,0 +1,161 @@
+import csv
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+from datetime import datetime
+from decimal import Decimal
+
+import pytest
+
+from conftest import BACKEND_DIR, create_books, grant_books
+from db import SessionLocal
+from models import Order
+
+
+def test_orders_pagination_visits_every_order_once(client, admin, user):
+    book_ids = create_books(3)
+    order_ids = [grant_books(user["email"], book_ids[i % 3:i % 3 + 1]) for i in range(7)]
+    # Several orders share a timestamp, so the id tie-breaker matters
+    session = SessionLocal()
+    try:
+        session.query(Order).filter(Order.id.in_(order_ids[:4])).update(
+            {Order.created_at: datetime(2026, 1, 1)}, synchronize_session=False
+        )
+        session.commit()
+    finally:
+        session.close()
+
+    seen, cursor = [], None
+    while True:
+        res = client.get("/admin/orders", params={"limit": 2, "cursor": cursor}, headers=admin)
+        assert res.status_code == 200
+        seen += [order["order_id"] for order in res.json()]
+        cursor = res.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert sorted(seen) == sorted(order_ids)
+    assert len(seen) == len(set(seen))
+
+
+def test_invalid_order_cursor_is_rejected(client, admin):
+    assert client.get("/admin/orders", params={"cursor": "nope"}, headers=admin).status_code == 400
+
+
+def test_migration_backfills_undated_orders(tmp_path):
+    path = tmp_path / "legacy.db"
+    env = dict(os.environ, DB_URL=f"sqlite:///{path}")
+
+    def migrate(revision):
+        subprocess.run([sys.executable, "manage.py", "migrate", revision], cwd=BACKEND_DIR, env=env, check=True)
+
+    migrate("0004")
+    conn = sqlite3.connect(path)
+    conn.execute("INSERT INTO users (id, email, password_hash, role) VALUES (1, 'a@example.com', 'x', 'user')")
+    conn.execute("INSERT INTO orders (id, user_id, total, status, created_at) VALUES (1, 1, 5, 'paid', '2025-03-01 10:00:00')")
+    conn.execute("INSERT INTO orders (id, user_id, total, status, created_at) VALUES (2, 1, 5, 'paid', NULL)")
+    # Rows referencing orders: SQLite rebuilds the table to add NOT NULL
+    conn.execute("INSERT INTO books (id, title, author, price, pdf_path) VALUES (1, 'T', 'A', 5, 'x')")
+    conn.execute("INSERT INTO order_items (id, order_id, book_id, quantity, price_each) VALUES (1, 2, 1, 1, 5)")
+    conn.commit()
+    conn.close()
+    migrate("head")
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = dict(conn.execute("SELECT id, created_at FROM orders"))
+        assert rows[2] is not None and rows[2].startswith("2025-03-01 10:00:00")
+        conn.execute("INSERT INTO orders (id, user_id, total, status) VALUES (3, 1, 5, 'paid')")
+        assert conn.execute("SELECT created_at FROM orders WHERE id = 3").fetchone()[0] is not None
+        assert conn.execute("SELECT order_id FROM order_items").fetchall() == [(2,)]
+        assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+    finally:
+        conn.close()
+
+
+def seed_dated_orders(email: str) -> dict:
+    """Orders of 1-3 books on 1..6 January 2026; returns {order_id: [book ids]}"""
+    book_ids = create_books(6)
+    orders = {}
+    for day in range(1, 7):
+        books = book_ids[day - 1:day - 1 + 1 + day % 3]
+        orders[grant_books(email, books)] = books
+    session = SessionLocal()
+    try:
+        for day, order_id in enumerate(orders, 1):
+            session.query(Order).filter(Order.id == order_id).update(
+                {Order.created_at: datetime(2026, 1, day, 12)}, synchronize_session=False
+            )
+        session.commit()
+    finally:
+        session.close()
+    return orders
+
+
+def export(client, admin, **params):
+    res = client.get("/admin/orders/export", params=params, headers=admin)
+    assert res.status_code == 200, res.text
+    return res
+
+
+def test_ndjson_export_groups_items_across_batches(client, admin, user, monkeypatch):
+    import exports
+
+    orders = seed_dated_orders(user["email"])
+    # Batches and chunks smaller than an order's items split orders between them
+    monkeypatch.setattr(exports, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(exports, "EXPORT_CHUNK_ROWS", 2)
+    res = export(client, admin)
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert res.headers["content-disposition"].startswith('attachment; filename="orders-')
+    exported = [json.loads(line) for line in res.text.splitlines()]
+    assert [order["order_id"] for order in exported] == list(orders)  # Oldest first
+    for order in exported:
+        assert [book["id"] for book in order["books"]] == orders[order["order_id"]]
+        assert order["user_email"] == user["email"]
+        assert order["total"] == sum(book["price"] for book in order["books"])
+
+
+def test_csv_export_has_one_line_per_item(client, admin, user):
+    orders = seed_dated_orders(user["email"])
+    res = export(client, admin, format="csv")
+    assert res.headers["content-type"].startswith("text/csv")
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert [(int(row["order_id"]), int(row["book_id"])) for row in rows] == [
+        (order_id, book_id) for order_id, books in orders.items() for book_id in books
+    ]
+    assert rows[0]["created_at"] == "2026-01-01T12:00:00"
+    # Amounts keep their exact decimal value; the items add up to the order total
+    totals = {}
+    for row in rows:
+        totals.setdefault(row["order_id"], [Decimal(row["total"]), Decimal(0)])[1] += Decimal(row["price"])
+    assert all(total == items for total, items in totals.values())
+
+
+def test_export_date_window(client, admin, user):
+    orders = list(seed_dated_orders(user["email"]))
+    exported = export(client, admin, start="2026-01-02T12:00:00", end="2026-01-05T12:00:00").text.splitlines()
+    # start is inclusive, end exclusive
+    assert [json.loads(line)["order_id"] for line in exported] == orders[1:4]
+    # An aware timestamp is compared in UTC
+    exported = export(client, admin, start="2026-01-06T13:00:00+01:00").text.splitlines()
+    assert [json.loads(line)["order_id"] for line in exported] == orders[5:]
+    assert export(client, admin, end="2026-01-01T00:00:00").text == ""
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"start": "2026-01-05T00:00:00", "end": "2026-01-05T00:00:00"},
+        {"start": "2026-01-06T00:00:00", "end": "2026-01-05T00:00:00"},
+        {"format": "xml"},
+    ],
+)
+def test_export_rejects_bad_parameters(client, admin, params):
+    assert client.get("/admin/orders/export", params=params, headers=admin).status_code == 400
+
+
+def test_export_requires_admin(client, user):
+    assert client.get("/admin/orders/export", headers=user).status_code == 403
@@ -0,0 +1,67 @@
+"""Purchase counts on /admin/books and the cached /admin/stats totals"""
+from conftest import StatementCounter, create_books, create_user
+
+
+def pay(client, headers, book_ids, status="success") -> int:
+    order_id = client.post("/cart/checkout", json={"book_ids": book_ids}, headers=headers).json()["order_id"]
+    res = client.post("/payment/verify", params={"order_id": order_id, "status": status}, headers=headers)
+    assert res.status_code == 200
+    return order_id
+
+
+def purchase_counts(client, admin) -> dict:
+    res = client.get("/admin/books", headers=admin)
+    assert res.status_code == 200
+    return {book["id"]: book["purchase_count"] for book in res.json()}
+
+
+def stats(client, admin) -> dict:
+    res = client.get("/admin/stats", headers=admin)
+    assert res.status_code == 200
+    return res.json()
+
+
+def seed(client):
+    """Books priced 11 to 14 and four orders, two of them paid (23 and 11)"""
+    book_ids = create_books(4)
+    first, second = create_user("first@example.com"), create_user("second@example.com")
+    pay(client, first, book_ids[:2])
+    pay(client, second, book_ids[:1])
+    client.post("/buy", json={"book_id": book_ids[2]}, headers=second)  # Stays pending
+    pay(client, first, book_ids[2:3], "failed")
+    return book_ids, first, second
+
+
+def test_purchase_counts_only_count_paid_orders(client, admin):
+    book_ids, _, _ = seed(client)
+    assert purchase_counts(client, admin) == {book_ids[0]: 2, book_ids[1]: 1, book_ids[2]: 0, book_ids[3]: 0}
+
+
+def test_stats_totals(client, admin):
+    seed(client)
+    assert stats(client, admin) == {"total_books": 4, "total_users": 2, "total_orders": 2, "total_revenue": 34.0}
+
+
+def test_stats_are_cached_until_a_purchase(client, admin):
+    book_ids, first, second = seed(client)
+    stats(client, admin)
+    with StatementCounter() as statements:
+        assert stats(client, admin)["total_orders"] == 2
+    assert len(statements) == 0
+
+    pay(client, second, book_ids[3:4])
+    after = stats(client, admin)
+    assert (after["total_orders"], after["total_revenue"]) == (3, 48.0)
+    assert purchase_counts(client, admin)[book_ids[3]] == 1
+
+    # A refund takes the order back out
+    refunded = pay(client, first, book_ids[3:4])
+    assert stats(client, admin)["total_orders"] == 4
+    client.post("/payment/verify", params={"order_id": refunded, "status": "failed"}, headers=first)
+    assert (stats(client, admin)["total_orders"], stats(client, admin)["total_revenue"]) == (3, 48.0)
+    assert purchase_counts(client, admin)[book_ids[3]] == 1
+
+    # So does a new book
+    book = {"title": "New", "author": "A", "price": 5, "pdf_url": "https://example.com/new.pdf"}
+    assert client.post("/admin/books", json=book, headers=admin).status_code == 200
+    assert stats(client, admin)["total_books"] == 5
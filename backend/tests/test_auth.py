@@ -0,0 +1,93 @@
+import time
+
+from auth_cache import AuthenticatedUser
+from cache import Cache, FileBackend, shared_cache
+from conftest import StatementCounter
+from sessions import SessionStore
+import main
+
+
+def test_header_auth_is_cached_whatever_the_email_case(client, user):
+    assert client.get("/me/library", headers=user).status_code == 200
+    shouted = {"email": user["email"].upper(), "password": user["password"]}
+    hits = main.auth_cache.hits
+    with StatementCounter() as counter:
+        assert client.get("/me/library", headers=shouted).status_code == 200
+    assert main.auth_cache.hits == hits + 1
+    # Only the library query itself; the credentials came from the cache
+    assert not any("FROM users" in statement for statement in counter.statements)
+
+
+def test_wrong_password_is_not_served_from_the_cache(client, user):
+    assert client.get("/me/library", headers=user).status_code == 200
+    bad = {"email": user["email"], "password": "not-the-password"}
+    assert client.get("/me/library", headers=bad).status_code == 401
+
+
+def test_credentials_changed_drops_the_cached_entry(client, user):
+    assert client.get("/me/library", headers=user).status_code == 200
+    main.credentials_changed(user["email"].title())
+    misses = main.auth_cache.misses
+    assert client.get("/me/library", headers=user).status_code == 200
+    assert main.auth_cache.misses == misses + 1
+
+
+def test_register_response_has_no_token_fields(client):
+    res = client.post("/register", json={"email": "new@example.com", "password": "secret123"})
+    assert res.status_code == 200
+    assert res.json() == {"message": "Registration successful", "role": "user"}
+
+
+def test_login_token_authenticates_until_logout(client, user):
+    res = client.post("/login", json=user)
+    assert res.status_code == 200
+    body = res.json()
+    assert body["token_type"] == "bearer" and body["expires_in"] > 0
+    bearer = {"Authorization": f"Bearer {body['access_token']}"}
+    assert client.get("/me/library", headers=bearer).status_code == 200
+    client.post("/logout", headers=bearer)
+    assert client.get("/me/library", headers=bearer).status_code == 401
+
+
+def test_credentials_changed_ends_the_users_sessions(client, user):
+    token = client.post("/login", json=user).json()["access_token"]
+    bearer = {"Authorization": f"Bearer {token}"}
+    assert client.get("/me/library", headers=bearer).status_code == 200
+    main.credentials_changed(user["email"].upper())
+    assert client.get("/me/library", headers=bearer).status_code == 401
+
+
+def test_sessions_in_a_shared_cache_work_on_every_worker(tmp_path):
+    # Two stores over one file cache stand in for two workers, or one restarted
+    path = str(tmp_path / "cache.sqlite3")
+    first, second = (SessionStore(Cache(FileBackend(path), version_check_interval=0)) for _ in range(2))
+    reader = AuthenticatedUser(1, "reader@example.com", "user")
+    token = first.create(reader)
+    assert second.get(token) == reader
+    assert second.count() == -1  # Not counted in a shared backend
+
+    other = first.create(reader)
+    second.revoke_user("Reader@Example.com")
+    assert first.get(token) is None and first.get(other) is None
+    # Logging in again still works
+    assert second.get(first.create(reader)) == reader
+
+
+def test_sessions_expire_and_are_revoked_one_by_one():
+    store = SessionStore(ttl=0.05)
+    reader = AuthenticatedUser(1, "reader@example.com", "user")
+    expiring, revoked = store.create(reader), store.create(reader)
+    store.revoke(revoked)
+    assert store.get(revoked) is None
+    assert store.get(expiring) == reader
+    time.sleep(0.1)
+    assert store.get(expiring) is None
+
+
+def test_memory_sessions_are_capped_and_kept_apart_from_the_shared_cache():
+    store = SessionStore(max_sessions=3)
+    assert store.cache is not shared_cache
+    tokens = [store.create(AuthenticatedUser(i, f"user{i}@example.com", "user")) for i in range(5)]
+    assert store.count() == 3
+    assert store.get(tokens[0]) is None
+    assert store.get(tokens[-1]).id == 4
@@ -0,0 +1,97 @@
+"""Bulk book import: the admin endpoint, the CLI and throughput"""
+import csv
+import json
+import time
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from book_import import import_books
+from conftest import run_backend
+from db import apply_sqlite_pragmas
+from models import Base, Book
+
+
+def ndjson(*records) -> bytes:
+    return "\n".join(record if isinstance(record, str) else json.dumps(record) for record in records).encode()
+
+
+def book(n: int, **fields) -> dict:
+    return dict({"title": f"Title {n}", "author": "Author", "price": "9.99", "pdf_url": f"https://example.com/{n}.pdf"}, **fields)
+
+
+def test_ndjson_import_upserts_and_reports_bad_rows(client, admin, db):
+    body = ndjson(
+        book(1),
+        "{not json",
+        book(2, title=""),
+        book(3, pdf_url="ftp://example.com/3.pdf"),
+        book(4, price="-1"),
+        book(5),
+    )
+    res = client.post("/admin/books/import", params={"format": "ndjson"}, content=body, headers=admin)
+    assert res.status_code == 200
+    report = res.json()
+    assert (report["rows"], report["inserted"], report["updated"], report["failed"]) == (6, 2, 0, 4)
+    assert [error["line"] for error in report["errors"]] == [2, 3, 4, 5]
+    assert report["errors"][2]["error"] == "PDF URL must be a valid HTTP/HTTPS URL"
+
+    res = client.post("/admin/books/import", content=ndjson(book(1, title="Renamed"), book(6)), headers=admin)
+    assert (res.json()["inserted"], res.json()["updated"]) == (1, 1)
+    titles = {title for (title,) in db.query(Book.title)}
+    assert titles == {"Renamed", "Title 5", "Title 6"}
+
+
+def test_malformed_csv_row_is_a_row_error(client, admin, db):
+    oversized = "x" * (csv.field_size_limit() + 1)
+    body = (
+        "title,author,price,pdf_url\n"
+        "First,A,1.50,https://example.com/1.pdf\n"
+        f'Second,A,2,"{oversized}"\n'
+        "Third,A,3,https://example.com/3.pdf\n"
+    ).encode()
+    res = client.post("/admin/books/import", params={"format": "csv"}, content=body, headers=admin)
+    assert res.status_code == 200
+    report = res.json()
+    assert (report["inserted"], report["failed"]) == (2, 1)
+    assert report["errors"][0]["line"] == 3
+    assert report["errors"][0]["error"].startswith("Invalid CSV")
+    assert {title for (title,) in db.query(Book.title)} == {"First", "Third"}
+
+
+def test_csv_without_required_columns_is_rejected(client, admin):
+    res = client.post("/admin/books/import", params={"format": "csv"}, content=b"title,author\nA,B\n", headers=admin)
+    assert res.status_code == 400
+    assert "pdf_url" in res.json()["detail"]
+
+
+def test_import_requires_admin(client, user):
+    assert client.post("/admin/books/import", content=ndjson(book(1)), headers=user).status_code == 403
+
+
+def test_cli_import_reports_throughput(tmp_path):
+    feed = tmp_path / "feed.ndjson"
+    feed.write_bytes(ndjson(*(book(n) for n in range(500)), "{bad"))
+    result = run_backend(f"""
+        import sys
+        import manage
+        manage.run_migrations()
+        sys.argv = ["manage.py", "import-books", {str(feed)!r}]
+        print("exit", manage.main())
+    """, check=False)
+    assert "500 inserted, 0 updated, 1 failed" in result.stdout
+    assert "line 501: Invalid JSON" in result.stdout
+    assert result.stdout.strip().endswith("exit 1")
+
+
+def test_import_throughput_is_at_least_10k_rows_per_second(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    apply_sqlite_pragmas(engine)
+    Base.metadata.create_all(engine)
+    lines = [json.dumps(book(n, description="A synthetic imported book")) for n in range(30_000)]
+    with Session(engine) as session:
+        start = time.perf_counter()
+        report = import_books(session, lines)
+        elapsed = time.perf_counter() - start
+    assert report["inserted"] == 30_000
+    assert report["rows"] / elapsed >= 10_000, f"{report['rows'] / elapsed:.0f} rows/s"
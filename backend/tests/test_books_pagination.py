@@ -0,0 +1,82 @@
+"""Keyset-paginated GET /books: cursors, filters and validation"""
+import base64
+import json
+
+import pytest
+
+from conftest import create_books, grant_books
+from models import Book
+
+
+def walk(client, headers=None, **params):
+    """Follow X-Next-Cursor to the end; return every page's books"""
+    pages, cursor = [], None
+    while True:
+        res = client.get("/books", params=dict(params, **({"cursor": cursor} if cursor else {})), headers=headers)
+        assert res.status_code == 200, res.text
+        pages.append(res.json())
+        cursor = res.headers.get("x-next-cursor")
+        if not cursor:
+            return pages
+        assert len(pages) < 100, "cursor does not advance"
+
+
+@pytest.mark.parametrize("sort", ["price", "created_at", "title"])
+@pytest.mark.parametrize("order", ["asc", "desc"])
+def test_pages_cover_every_book_once_in_order(client, db, sort, order):
+    # Prices repeat every 50 books, so with sort=price the id tie-breaker
+    # decides where pages split
+    book_ids = create_books(120)
+    pages = walk(client, limit=25, sort=sort, order=order)
+    assert [len(page) for page in pages] == [25, 25, 25, 25, 20]
+    books = [book for page in pages for book in page]
+    assert sorted(book["id"] for book in books) == book_ids
+    # created_at is not part of the response; read it back
+    created_at = dict(db.query(Book.id, Book.created_at))
+    keys = [(created_at[book["id"]] if sort == "created_at" else book[sort], book["id"]) for book in books]
+    assert keys == sorted(keys, reverse=order == "desc")
+
+
+def test_exact_multiple_of_the_page_size_has_no_empty_last_page(client):
+    create_books(40)
+    assert [len(page) for page in walk(client, limit=20, sort="price")] == [20, 20]
+
+
+def test_pages_mark_owned_books(client, user):
+    book_ids = create_books(30)
+    grant_books(user["email"], book_ids[::7])
+    books = [book for page in walk(client, headers=user, limit=8) for book in page]
+    assert {book["id"] for book in books if book["is_purchased"]} == set(book_ids[::7])
+
+
+def test_author_and_price_filters(client):
+    create_books(70)
+    books = [book for page in walk(client, limit=10, author="Author 3", sort="price", order="asc") for book in page]
+    assert books and {book["author"] for book in books} == {"Author 3"}
+    assert len(books) == 10  # Every 7th of the 70 books
+
+    books = [book for page in walk(client, limit=15, min_price=20, max_price=29.5) for book in page]
+    assert books and all(20 <= book["price"] <= 29.5 for book in books)
+    assert len(books) == 20  # Books 10-19 and 60-69
+    assert walk(client, limit=10, min_price=1000) == [[]]
+
+
+@pytest.mark.parametrize(
+    "params",
+    [
+        {"sort": "popularity"},
+        {"sort": "price", "order": "sideways"},
+        {"limit": 10, "cursor": "not a cursor"},
+        {"limit": 10, "cursor": base64.urlsafe_b64encode(b"[1]").decode()},
+        {"limit": 10, "sort": "price", "cursor": base64.urlsafe_b64encode(json.dumps(["cheap", 1]).encode()).decode()},
+        {"limit": 10, "sort": "created_at", "cursor": base64.urlsafe_b64encode(json.dumps(["yesterday", 1]).encode()).decode()},
+    ],
+)
+def test_invalid_sort_order_or_cursor_is_400(client, params):
+    create_books(3)
+    assert client.get("/books", params=params).status_code == 400
+
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 201}, {"min_price": -1}])
+def test_out_of_range_parameters_are_rejected(client, params):
+    assert client.get("/books", params=params).status_code == 422
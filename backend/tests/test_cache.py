@@ -0,0 +1,151 @@
+"""The shared cache: backends, namespace versions and single-flight loading"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cache import Cache, FileBackend, MemoryBackend, RedisBackend
+
+
+@pytest.fixture
+def redis_server():
+    fakeredis = pytest.importorskip("fakeredis")
+    return fakeredis.FakeServer()
+
+
+def redis_backend(server) -> RedisBackend:
+    import fakeredis
+
+    return RedisBackend(client=fakeredis.FakeRedis(server=server))
+
+
+class SlowLoader:
+    """Counts its calls and takes a while, so concurrent callers overlap"""
+
+    def __init__(self, value="loaded", delay: float = 0.2):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+
+def test_memory_versions_survive_eviction():
+    cache = Cache(MemoryBackend(max_entries=3))
+    cache.set("books", "page", "old")
+    cache.bump("books")
+    for i in range(10):
+        cache.set("other", str(i), i)
+    assert cache.version("books") == 1
+    cache.set("books", "page", "new")
+    cache.bump("books")
+    # Version 2 is not a reset to 0: neither earlier value comes back
+    assert cache.get("books", "page") is None
+
+
+def test_memory_add_is_atomic():
+    backend = MemoryBackend()
+    barrier = threading.Barrier(16)
+
+    def add(i):
+        barrier.wait()
+        return backend.add("lock", i, 10)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        assert sum(pool.map(add, range(16))) == 1
+    backend.delete("lock")
+    assert backend.add("lock", 1, 0.01)
+    time.sleep(0.02)
+    assert backend.add("lock", 2)  # The first one expired
+
+
+@pytest.mark.parametrize("backend", ["memory", "file", "redis"])
+def test_backend_operations(backend, tmp_path, request):
+    if backend == "memory":
+        store = MemoryBackend()
+    elif backend == "file":
+        store = FileBackend(str(tmp_path / "cache.sqlite3"))
+    else:
+        store = redis_backend(request.getfixturevalue("redis_server"))
+    store.set("a", {"n": 1})
+    assert store.get("a") == {"n": 1}
+    assert not store.add("a", 2)
+    assert store.add("b", 2, ttl=0.05)
+    time.sleep(0.1)
+    assert store.get("b") is None
+    store.delete("a")
+    assert store.get("a") is None
+    assert [store.incr("v") for _ in range(3)] == [1, 2, 3]
+
+
+def test_single_flight_within_a_worker():
+    cache = Cache(MemoryBackend())
+    loader = SlowLoader()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        values = list(pool.map(lambda _: cache.get_or_set("stats", "totals", loader), range(16)))
+    assert values == ["loaded"] * 16
+    assert loader.calls == 1
+    assert cache.get_or_set("stats", "totals", loader) == "loaded"
+    assert loader.calls == 1
+
+
+def test_single_flight_error_reaches_every_waiter():
+    cache = Cache(MemoryBackend())
+    calls = []
+
+    def failing():
+        calls.append(1)
+        time.sleep(0.1)
+        raise RuntimeError("database down")
+
+    def call(_):
+        try:
+            cache.get_or_set("stats", "totals", failing)
+        except RuntimeError as e:
+            return str(e)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        assert set(pool.map(call, range(8))) == {"database down"}
+    assert len(calls) == 1
+
+
+def test_redis_bump_invalidates_every_worker(redis_server):
+    first = Cache(redis_backend(redis_server), version_check_interval=0)
+    second = Cache(redis_backend(redis_server), version_check_interval=0)
+    first.set("catalog", "page", "old")
+    assert second.get("catalog", "page") == "old"
+    second.bump("catalog")
+    assert first.version("catalog") == 1
+    assert first.get("catalog", "page") is None
+
+
+def test_redis_single_flight_across_workers(redis_server):
+    workers = [Cache(redis_backend(redis_server), version_check_interval=0) for _ in range(4)]
+    loader = SlowLoader(delay=0.3)
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        values = list(pool.map(lambda i: workers[i % 4].get_or_set("stats", "totals", loader, ttl=60), range(16)))
+    assert values == ["loaded"] * 16
+    assert loader.calls == 1
+    # The lock key is released once the value is stored
+    assert redis_backend(redis_server).get("nopaper:stats:v0:totals:lock") is None
+
+
+def test_backend_errors_are_misses():
+    class BrokenBackend(MemoryBackend):
+        shared = True
+
+        def _fail(self, *args, **kwargs):
+            raise ConnectionError("cache down")
+
+        get = set = add = delete = incr = get_version = _fail
+
+    cache = Cache(BrokenBackend())
+    assert cache.get_or_set("stats", "totals", lambda: 42) == 42
+    assert cache.bump("stats") == 1
+    assert cache.stats()["errors"] >= 3
@@ -0,0 +1,37 @@
+"""GET /books must cost the same number of statements whatever the catalog size"""
+import pytest
+
+from conftest import StatementCounter, create_books, grant_books
+import main
+
+
+def count_statements(client, path: str, headers: dict) -> int:
+    # Warm the auth cache first so only the catalog work is counted
+    client.get("/books?limit=1", headers=headers)
+    main.catalog.bump()
+    with StatementCounter() as counter:
+        res = client.get(path, headers=headers)
+    assert res.status_code == 200
+    return len(counter)
+
+
+@pytest.mark.parametrize("path", ["/books", "/books?limit=200", "/books?sort=price&limit=200"])
+def test_authenticated_catalog_query_count_is_constant(client, user, path):
+    book_ids = create_books(20)
+    grant_books(user["email"], book_ids[:5])
+    small = count_statements(client, path, user)
+
+    more_ids = create_books(180)
+    grant_books(user["email"], more_ids[:40])
+    large = count_statements(client, path, user)
+
+    assert small == large
+    assert large <= 3
+
+
+def test_catalog_marks_owned_books(client, user):
+    book_ids = create_books(10)
+    grant_books(user["email"], book_ids[2:4])
+    books = client.get("/books", headers=user).json()
+    assert {book["id"] for book in books if book["is_purchased"]} == set(book_ids[2:4])
+    assert not any(book["is_purchased"] for book in client.get("/books").json())
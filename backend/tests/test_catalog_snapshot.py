@@ -0,0 +1,142 @@
+"""The pre-serialized GET /books snapshot under concurrent rebuilds"""
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import main
+from catalog import CatalogSnapshot
+from conftest import StatementCounter, create_books, create_user, grant_books, run_backend
+
+
+def test_concurrent_requests_share_one_rebuild(client):
+    create_books(50)
+    client.get("/books")
+    main.catalog.bump()
+    with StatementCounter() as statements:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            responses = list(pool.map(lambda _: client.get("/books"), range(16)))
+    assert {res.status_code for res in responses} == {200}
+    assert {len(res.json()) for res in responses} == {50}
+    assert len(statements) == 1
+
+
+def test_concurrent_async_rebuilds_do_not_block_the_event_loop():
+    # Under DB_ASYNC, run_db would serialize the whole catalog on the event
+    # loop thread; the rebuild has to stay on a worker thread
+    result = run_backend(
+        """
+        import asyncio
+        import threading
+        import httpx
+        import manage
+        manage.run_migrations()
+        from db import engine
+        manage.seed_database(engine, books=2000, users=1, orders=0)
+        import main
+
+        rebuild_threads = []
+        rebuild = main.catalog._rebuild
+
+        def recording_rebuild(db):
+            rebuild_threads.append(threading.get_ident())
+            rebuild(db)
+
+        main.catalog._rebuild = recording_rebuild
+
+        async def fetch_all():
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                for _ in range(3):
+                    main.catalog.bump()
+                    responses = await asyncio.gather(*(client.get("/books") for _ in range(20)))
+                    assert {res.status_code for res in responses} == {200}
+                    assert {len(res.json()) for res in responses} == {2000}
+
+        asyncio.run(asyncio.wait_for(fetch_all(), 60))
+        # One rebuild per bump, none of them on the loop (main) thread
+        assert len(rebuild_threads) == 3, rebuild_threads
+        assert threading.get_ident() not in rebuild_threads
+        print("ok")
+        """,
+        timeout=90,
+        DB_ASYNC="true",
+    )
+    assert result.stdout.split()[-1] == "ok"
+
+
+def new_book(client, admin, title="Fresh"):
+    book = {"title": title, "author": "A", "price": 5, "pdf_url": "https://example.com/fresh.pdf"}
+    res = client.post("/admin/books", json=book, headers=admin)
+    assert res.status_code == 200
+    return res.json()["id"]
+
+
+def test_unchanged_catalog_answers_304(client):
+    create_books(3)
+    first = client.get("/books")
+    etag = first.headers["etag"]
+    for if_none_match in (etag, f"W/{etag}", f'"other", {etag}', "*"):
+        res = client.get("/books", headers={"If-None-Match": if_none_match})
+        assert res.status_code == 304, if_none_match
+        assert res.headers["etag"] == etag
+        assert res.content == b""
+    assert client.get("/books", headers={"If-None-Match": '"stale"'}).status_code == 200
+
+
+def test_etag_changes_when_a_book_is_created_or_deleted(client, admin):
+    create_books(3)
+    before = client.get("/books").headers["etag"]
+    book_id = new_book(client, admin)
+    res = client.get("/books", headers={"If-None-Match": before})
+    assert res.status_code == 200
+    created = res.headers["etag"]
+    assert created != before
+    assert book_id in [book["id"] for book in res.json()]
+
+    assert client.delete(f"/admin/books/{book_id}", headers=admin).status_code == 200
+    res = client.get("/books", headers={"If-None-Match": created})
+    assert res.status_code == 200
+    assert res.headers["etag"] == before  # Same books as before, same body
+    assert book_id not in [book["id"] for book in res.json()]
+
+
+def test_etag_is_per_user_view(client, user):
+    book_ids = create_books(3)
+    other = create_user("other@example.com")
+    grant_books(user["email"], book_ids[:1])
+    public = client.get("/books").headers["etag"]
+    owner = client.get("/books", headers=user)
+    assert owner.headers["etag"] != public
+    # A user who owns nothing sees the public body, so shares its ETag
+    assert client.get("/books", headers=other).headers["etag"] == public
+    # The owner's ETag does not validate the public view, nor the reverse
+    assert client.get("/books", headers={"If-None-Match": owner.headers["etag"]}).status_code == 200
+    assert client.get("/books", headers=dict(user, **{"If-None-Match": public})).status_code == 200
+    assert client.get("/books", headers=dict(user, **{"If-None-Match": owner.headers["etag"]})).status_code == 304
+
+
+def test_body_and_etag_always_match_during_rebuilds(db):
+    snapshot = CatalogSnapshot()
+    snapshot.rebuild(db)
+    stop = threading.Event()
+    mismatches = []
+
+    def read():
+        while not stop.is_set():
+            body, etag = snapshot.render()
+            if etag != '"%s"' % hashlib.sha1(body).hexdigest():
+                mismatches.append(etag)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+        reader.start()
+    try:
+        for i in range(30):
+            create_books(1)
+            snapshot.bump()
+            snapshot.rebuild(db)
+    finally:
+        stop.set()
+        for reader in readers:
+            reader.join()
+    assert mismatches == []
@@ -0,0 +1,226 @@
+"""Cover thumbnails fetched from a local http.server, and the SSRF guards on fetching"""
+import http.server
+import io
+import ipaddress
+import os
+import socket
+import threading
+
+import pytest
+
+Image = pytest.importorskip("PIL.Image")
+
+import covers
+from conftest import create_books
+
+GENERIC_ERROR = "Could not load the cover image"
+
+
+def png(width: int = 800, height: int = 1200) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(output, "PNG")
+    return output.getvalue()
+
+
+class CoverServer(http.server.ThreadingHTTPServer):
+    """Serves /cover.png, redirects /moved to it and records every path requested"""
+
+    def __init__(self):
+        self.requests = []
+        self.image = png()
+        super().__init__(("127.0.0.1", 0), CoverHandler)
+
+    def url(self, path: str = "/cover.png", host: str = "127.0.0.1") -> str:
+        return f"http://{host}:{self.server_address[1]}{path}"
+
+
+class CoverHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.path == "/moved":
+            self.send_response(302)
+            self.send_header("Location", self.server.url())
+            self.end_headers()
+            return
+        if self.path != "/cover.png":
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(self.server.image)))
+        self.end_headers()
+        self.wfile.write(self.server.image)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = CoverServer()
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def allow_loopback(monkeypatch):
+    """Let covers be fetched from the test server on 127.0.0.1"""
+    monkeypatch.setattr(covers, "COVER_ALLOWED_NETWORKS", (ipaddress.ip_network("127.0.0.0/8"),))
+
+
+@pytest.fixture
+def resolver(monkeypatch):
+    """Answer lookups of the given names with the given IPs, as a DNS server would"""
+    answers = {}
+    getaddrinfo = socket.getaddrinfo
+
+    def fake_getaddrinfo(host, port, *args, **kwargs):
+        if host in answers:
+            return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (ip, port)) for ip in answers[host]]
+        return getaddrinfo(host, port, *args, **kwargs)
+
+    monkeypatch.setattr(socket, "getaddrinfo", fake_getaddrinfo)
+    return answers
+
+
+def get_cover(client, book_id, headers=None):
+    return client.get(f"/books/{book_id}/cover", params={"w": 200}, headers=headers, follow_redirects=False)
+
+
+def test_cover_is_fetched_once_and_resized(client, server, allow_loopback):
+    book_ids = create_books(2, cover_url=server.url())
+    res = get_cover(client, book_ids[0], {"Accept": "image/webp"})
+    assert res.status_code == 200
+    assert res.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(res.content)).width == 320  # Rounded up to a configured width
+
+    # Another book with the same cover, another format and a revalidation: no new fetch
+    assert get_cover(client, book_ids[1]).headers["content-type"] == "image/jpeg"
+    assert get_cover(client, book_ids[0], {"Accept": "image/webp", "If-None-Match": res.headers["etag"]}).status_code == 304
+    assert server.requests == ["/cover.png"]
+
+
+def test_hostname_is_resolved_and_checked(client, server, allow_loopback, resolver):
+    resolver["covers.example.com"] = ["127.0.0.1"]
+    book_id = create_books(1, cover_url=server.url(host="covers.example.com"))[0]
+    assert get_cover(client, book_id).status_code == 200
+    assert server.requests == ["/cover.png"]
+
+
+@pytest.mark.parametrize("address", ["127.0.0.1", "10.1.2.3", "192.168.0.10", "169.254.169.254", "::1", "::ffff:127.0.0.1"])
+def test_internal_addresses_are_refused(client, server, resolver, address):
+    resolver["covers.example.com"] = ["93.184.216.34", address]
+    book_id = create_books(1, cover_url=server.url(host="covers.example.com"))[0]
+    res = get_cover(client, book_id)
+    assert res.status_code == 502
+    assert res.json()["detail"] == GENERIC_ERROR
+    assert server.requests == []
+
+
+def test_loopback_is_refused_without_the_allowlist(client, server):
+    book_id = create_books(1, cover_url=server.url())[0]
+    assert get_cover(client, book_id).status_code == 502
+    assert server.requests == []
+
+
+def test_redirects_are_not_followed(client, server, allow_loopback):
+    book_id = create_books(1, cover_url=server.url("/moved"))[0]
+    res = get_cover(client, book_id)
+    assert res.status_code == 502
+    assert res.json()["detail"] == GENERIC_ERROR
+    assert server.requests == ["/moved"]
+
+
+@pytest.mark.parametrize("url", ["file:///etc/passwd", "ftp://127.0.0.1/cover.png", "gopher://127.0.0.1:70/", "http:///cover.png"])
+def test_only_http_urls_are_fetched(client, allow_loopback, url):
+    book_id = create_books(1, cover_url=url)[0]
+    res = get_cover(client, book_id)
+    assert res.status_code == 502
+    assert res.json()["detail"] == GENERIC_ERROR
+
+
+def test_fetch_errors_are_not_echoed(client, server, allow_loopback):
+    book_id = create_books(1, cover_url=server.url("/missing.png"))[0]
+    res = get_cover(client, book_id)
+    assert res.status_code == 502
+    assert res.json()["detail"] == GENERIC_ERROR
+    assert server.requests == ["/missing.png"]
+
+
+@pytest.mark.parametrize(
+    "address, allowed",
+    [
+        ("93.184.216.34", True),
+        ("2606:2800:220:1:248:1893:25c8:1946", True),
+        ("127.0.0.1", False),
+        ("10.1.2.3", False),
+        ("172.16.0.1", False),
+        ("100.64.0.1", False),  # Carrier-grade NAT
+        ("169.254.169.254", False),
+        ("0.0.0.0", False),
+        ("224.0.0.1", False),
+        ("::1", False),
+        ("fd00::1", False),
+        ("fe80::1", False),
+        ("::ffff:10.0.0.1", False),
+    ],
+)
+def test_allowed_addresses(address, allowed):
+    assert covers._allowed_address(ipaddress.ip_address(address)) is allowed
+
+
+def test_allowlisted_networks_are_allowed(monkeypatch):
+    monkeypatch.setattr(covers, "COVER_ALLOWED_NETWORKS", (ipaddress.ip_network("10.0.5.0/24"),))
+    assert covers._allowed_address(ipaddress.ip_address("10.0.5.7"))
+    assert covers._allowed_address(ipaddress.ip_address("::ffff:10.0.5.7"))
+    assert not covers._allowed_address(ipaddress.ip_address("10.0.6.7"))
+
+
+def test_public_address_refuses_a_name_with_any_internal_address(resolver):
+    resolver["covers.example.com"] = ["93.184.216.34"]
+    assert covers._public_address("covers.example.com", 80) == ("93.184.216.34", 80)
+    resolver["covers.example.com"] = ["93.184.216.34", "10.0.0.1"]
+    with pytest.raises(covers.CoverError, match="non-public"):
+        covers._public_address("covers.example.com", 80)
+
+
+def test_fetch_connects_to_the_address_it_checked(server, allow_loopback, resolver, monkeypatch, tmp_path):
+    # The name is looked up once, so a second answer (DNS rebinding) is never used
+    resolver["covers.example.com"] = ["127.0.0.1"]
+    lookups = []
+    getaddrinfo = socket.getaddrinfo
+
+    def counting_getaddrinfo(host, *args, **kwargs):
+        lookups.append(host)
+        return getaddrinfo(host, *args, **kwargs)
+
+    monkeypatch.setattr(socket, "getaddrinfo", counting_getaddrinfo)
+    assert covers.CoverCache(tmp_path)._fetch(server.url(host="covers.example.com")) == server.image
+    assert lookups.count("covers.example.com") == 1
+
+
+def test_oversized_images_are_refused_before_decoding(monkeypatch):
+    monkeypatch.setattr(covers, "COVER_MAX_SOURCE_PIXELS", 800 * 1200 - 1)
+    with pytest.raises(covers.CoverError, match="800x1200 pixels"):
+        covers.CoverCache._resize(png(), 320, "JPEG")
+    monkeypatch.setattr(covers, "COVER_MAX_SOURCE_PIXELS", 800 * 1200)
+    assert Image.open(io.BytesIO(covers.CoverCache._resize(png(), 320, "JPEG"))).size == (320, 480)
+
+
+def test_eviction_deletes_least_recently_used_files(tmp_path):
+    cache = covers.CoverCache(tmp_path, max_bytes=3500)
+    paths = [cache._path("thumbs", f"{i:02d}-thumb") for i in range(3)]
+    for i, path in enumerate(paths):
+        cache._write(path, bytes(1000))
+        os.utime(path, (1000 + i, 1000 + i))
+    # Reading the oldest file makes it the most recently used
+    assert cache._read(paths[0]) == bytes(1000)
+
+    cache._write(cache._path("thumbs", "03-thumb"), bytes(1000))
+    # 4000 bytes is over the limit; files go, oldest first, until at most 90% (3150) is left
+    assert [path.exists() for path in paths] == [True, False, True]
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["size_bytes"] == 3000
@@ -0,0 +1,43 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from conftest import run_backend
+from db import engine
+from db_metrics import pool_metrics
+
+
+def test_failed_statement_does_not_leak_its_start_time():
+    with engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+        assert not conn.info.get("query_start")
+        queries = pool_metrics.queries
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert pool_metrics.queries == queries + 1
+        assert not conn.info.get("query_start")
+
+
+def test_async_engine_uses_the_timed_pool():
+    result = run_backend(
+        """
+        import asyncio
+        from sqlalchemy import text
+        import manage
+        manage.run_migrations()
+        import db
+        from db_metrics import TimedAsyncQueuePool, pool_metrics
+
+        assert isinstance(db.async_engine.pool, TimedAsyncQueuePool), type(db.async_engine.pool)
+        before = pool_metrics.checkouts
+        for _ in range(3):
+            asyncio.run(db.run_db(lambda session: session.execute(text("SELECT 1")).scalar()))
+        print(pool_metrics.checkouts - before, pool_metrics.pool_state(db.async_engine.pool)["pool_size"])
+        """,
+        DB_ASYNC="true",
+        DB_POOL_SIZE="3",
+    )
+    checkouts, pool_size = result.stdout.split()[-2:]
+    assert int(checkouts) >= 3
+    assert pool_size == "3"
@@ -0,0 +1,36 @@
+from sqlalchemy.orm import Query
+
+from conftest import create_books, grant_books
+from models import Book, Entitlement, OrderItem
+
+
+def assert_book_gone(db, book_id):
+    assert db.query(Book).filter(Book.id == book_id).count() == 0
+    assert db.query(OrderItem).filter(OrderItem.book_id == book_id).count() == 0
+    assert db.query(Entitlement).filter(Entitlement.book_id == book_id).count() == 0
+
+
+def test_deleting_a_purchased_book_removes_its_entitlements(client, admin, user, db):
+    book_ids = create_books(2)
+    grant_books(user["email"], book_ids)
+    res = client.delete(f"/admin/books/{book_ids[0]}", headers=admin)
+    assert res.status_code == 200
+    assert res.json()["purchase_count"] == 1
+    assert_book_gone(db, book_ids[0])
+    # The other book is untouched
+    assert db.query(Entitlement).filter(Entitlement.book_id == book_ids[1]).count() == 1
+
+
+def test_per_item_fallback_removes_entitlements(client, admin, user, db, monkeypatch):
+    book_id = create_books(1)[0]
+    grant_books(user["email"], [book_id])
+
+    def fail_bulk_delete(self, *args, **kwargs):
+        raise RuntimeError("bulk delete unavailable")
+
+    monkeypatch.setattr(Query, "delete", fail_bulk_delete)
+    res = client.delete(f"/admin/books/{book_id}", headers=admin)
+    monkeypatch.undo()
+    assert res.status_code == 200, res.text
+    assert res.json()["deleted_order_items"] == 1
+    assert_book_gone(db, book_id)
@@ -0,0 +1,100 @@
+"""Download redirects, signed download links and the entitlement cache"""
+import time
+
+import main
+from conftest import StatementCounter, create_books, grant_books
+from downloads import DownloadSigner, EntitlementCache, entitlement_cache
+
+
+def pdf_url(book_id: int) -> str:
+    return f"https://example.com/books/{book_id}.pdf"
+
+
+def test_download_requires_the_book(client, user):
+    book_id = create_books(1)[0]
+    assert client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False).status_code == 403
+    assert client.get(f"/books/{book_id}/download-link", headers=user).status_code == 403
+    assert client.get(f"/books/{book_id + 1}/download", headers=user, follow_redirects=False).status_code == 404
+    # Refusals are not cached: buying the book works at once
+    grant_books(user["email"], [book_id])
+    res = client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False)
+    assert res.status_code == 307
+    assert res.headers["location"] == pdf_url(book_id)
+
+
+def test_repeat_downloads_are_answered_from_the_cache(client, user):
+    book_id = create_books(1)[0]
+    grant_books(user["email"], [book_id])
+    client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False)
+    with StatementCounter() as statements:
+        res = client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False)
+    assert res.headers["location"] == pdf_url(book_id)
+    assert len(statements) == 0
+    assert entitlement_cache.stats()["hits"] >= 1
+
+
+def test_signed_link_redirects_without_queries(client, user):
+    book_id = create_books(1)[0]
+    grant_books(user["email"], [book_id])
+    link = client.get(f"/books/{book_id}/download-link", headers=user).json()
+    assert link["expires_in"] == main.download_signer.ttl
+    with StatementCounter() as statements:
+        # No credentials: the token alone grants the download
+        res = client.get(link["url"], follow_redirects=False)
+    assert res.status_code == 307
+    assert res.headers["location"] == pdf_url(book_id)
+    assert len(statements) == 0
+
+
+def test_tampered_and_expired_links_are_rejected(client, user, monkeypatch):
+    book_ids = create_books(2)
+    grant_books(user["email"], book_ids[:1])
+    token = client.get(f"/books/{book_ids[0]}/download-link", headers=user).json()["url"].rsplit("/", 1)[1]
+    payload, signature = token.split(".")
+
+    # Signed with another key, another book's payload under the genuine
+    # signature, a corrupted signature, and malformed tokens
+    forged, _ = DownloadSigner(secret="attacker").sign(1, book_ids[1], pdf_url(book_ids[1]))
+    for bad in (forged, f"{forged.split('.')[0]}.{signature}", f"{payload}.{signature[:-2]}AA", "not-a-token", f"{payload}."):
+        assert client.get(f"/downloads/{bad}", follow_redirects=False).status_code == 403, bad
+
+    monkeypatch.setattr(time, "time", lambda: 2 ** 40)
+    assert client.get(f"/downloads/{token}", follow_redirects=False).status_code == 403
+
+
+def test_links_from_a_shared_secret_work_on_every_worker():
+    first, second = DownloadSigner(secret="shared"), DownloadSigner(secret="shared")
+    token, expires_at = first.sign(7, 11, "https://example.com/11.pdf")
+    assert second.verify(token) == (7, 11, expires_at, "https://example.com/11.pdf")
+    assert DownloadSigner(secret="other").verify(token) is None
+    assert DownloadSigner(secret="shared", ttl=-1).verify(DownloadSigner(secret="shared", ttl=-1).sign(7, 11, "u")[0]) is None
+
+
+def test_refund_revokes_the_cached_entitlement(client, user):
+    book_id = create_books(1)[0]
+    order_id = client.post("/buy", json={"book_id": book_id}, headers=user).json()["order_id"]
+    client.post("/payment/verify", params={"order_id": order_id}, headers=user)
+    assert client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False).status_code == 307
+
+    res = client.post("/payment/verify", params={"order_id": order_id, "status": "failed"}, headers=user)
+    assert res.json()["status"] == "failed"
+    assert client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False).status_code == 403
+
+
+def test_deleting_a_book_drops_its_cached_entitlements(client, admin, user):
+    book_id = create_books(1)[0]
+    grant_books(user["email"], [book_id])
+    client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False)
+    assert client.delete(f"/admin/books/{book_id}", headers=admin).status_code == 200
+    assert client.get(f"/books/{book_id}/download", headers=user, follow_redirects=False).status_code == 404
+
+
+def test_entitlement_cache_evicts_least_recently_used():
+    cache = EntitlementCache(ttl=60, max_size=2)
+    cache.put(1, 1, "a")
+    cache.put(1, 2, "b")
+    cache.get(1, 1)
+    cache.put(1, 3, "c")
+    assert (cache.get(1, 1), cache.get(1, 2), cache.get(1, 3)) == ("a", None, "c")
+    assert cache.stats()["evictions"] == 1
+    assert EntitlementCache(ttl=0).get(1, 1) is None
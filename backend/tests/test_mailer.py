@@ -0,0 +1,171 @@
+"""Mail delivery against a local aiosmtpd server"""
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+aiosmtpd = pytest.importorskip("aiosmtpd.controller")
+
+import mailer
+import main
+from conftest import create_books
+from mailer import MailQueue
+
+
+class RecordingHandler:
+    """Accepts every message, optionally refusing the first few or answering slowly"""
+
+    def __init__(self, refuse: int = 0, delay: float = 0.0):
+        self.refuse = refuse
+        self.delay = delay
+        self.messages = []
+        self.lock = threading.Lock()
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.delay:
+            time.sleep(self.delay)  # Blocks the SMTP server like a slow relay
+        with self.lock:
+            if self.refuse:
+                self.refuse -= 1
+                return "451 Try again later"
+            self.messages.append(envelope.content.decode("utf-8", "replace"))
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    """Start a stand-in SMTP server and point the mailer at it; yields a function to set its handler"""
+    controllers = []
+
+    def serve(handler: RecordingHandler) -> RecordingHandler:
+        port = free_port()
+        controller = aiosmtpd.Controller(handler, hostname="127.0.0.1", port=port)
+        controller.start()
+        controllers.append(controller)
+        monkeypatch.setattr(mailer, "SMTP_SERVER", "127.0.0.1")
+        monkeypatch.setattr(mailer, "SMTP_PORT", port)
+        monkeypatch.setattr(mailer, "SMTP_STARTTLS", False)
+        monkeypatch.setattr(mailer, "EMAIL_PASSWORD", "")
+        monkeypatch.setattr(mailer, "MAIL_RETRY_BACKOFF", 0.01)
+        return handler
+
+    yield serve
+    for controller in controllers:
+        controller.stop()
+
+
+def wait_for(condition, timeout: float = 10) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def outbox_files(outbox):
+    return sorted(path.name for path in outbox.rglob("*.json"))
+
+
+def test_message_is_delivered_and_removed_from_the_outbox(smtp, tmp_path):
+    handler = smtp(RecordingHandler())
+    queue = MailQueue(tmp_path, workers=2)
+    try:
+        queue.enqueue("admin@example.com", "Payment SUCCESS - Order #1", "details")
+        assert wait_for(lambda: queue.stats()["sent"] == 1)
+    finally:
+        queue.stop()
+    assert len(handler.messages) == 1
+    assert "Subject: Payment SUCCESS - Order #1" in handler.messages[0]
+    assert outbox_files(tmp_path) == []
+
+
+def test_refused_message_is_retried(smtp, tmp_path):
+    handler = smtp(RecordingHandler(refuse=2))
+    queue = MailQueue(tmp_path)
+    try:
+        queue.enqueue("admin@example.com", "retry me", "body")
+        assert wait_for(lambda: queue.stats()["sent"] == 1)
+    finally:
+        queue.stop()
+    assert queue.stats()["retried"] == 2
+    assert len(handler.messages) == 1
+
+
+def test_message_is_parked_after_max_attempts(smtp, tmp_path, monkeypatch):
+    smtp(RecordingHandler(refuse=100))
+    monkeypatch.setattr(mailer, "MAIL_MAX_ATTEMPTS", 2)
+    queue = MailQueue(tmp_path)
+    try:
+        queue.enqueue("admin@example.com", "never sent", "body")
+        assert wait_for(lambda: queue.stats()["failed"] == 1)
+    finally:
+        queue.stop()
+    assert [path.name for path in (tmp_path / "failed").glob("*.json")] != []
+    assert list(tmp_path.glob("*.json")) == []
+
+
+def test_workers_sharing_an_outbox_send_each_leftover_once(smtp, tmp_path):
+    handler = smtp(RecordingHandler())
+    for i in range(40):
+        MailQueue._write(tmp_path / f"{i:04d}.json", {"id": str(i), "to": "a@example.com", "subject": f"m{i}", "body": "b", "attempts": 0})
+    # Stand-ins for several uvicorn workers starting at once
+    queues = [MailQueue(tmp_path, workers=2) for _ in range(4)]
+    threads = [threading.Thread(target=queue.start) for queue in queues]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert wait_for(lambda: sum(queue.stats()["sent"] for queue in queues) == 40)
+    finally:
+        for queue in queues:
+            queue.stop()
+    subjects = sorted(message.split("Subject: ")[1].split("\n")[0].strip() for message in handler.messages)
+    assert subjects == sorted(f"m{i}" for i in range(40))
+    assert outbox_files(tmp_path) == []
+
+
+def test_claims_of_a_dead_process_are_sent_on_start(smtp, tmp_path):
+    handler = smtp(RecordingHandler())
+    dead = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    orphan_dir = tmp_path / "claimed" / f"{dead.stdout.strip()}-deadbeef"
+    orphan_dir.mkdir(parents=True)
+    (orphan_dir / "0001.json").write_text(json.dumps({"id": "1", "to": "a@example.com", "subject": "orphan", "body": "b", "attempts": 1}))
+    queue = MailQueue(tmp_path)
+    try:
+        queue.start()
+        assert wait_for(lambda: queue.stats()["sent"] == 1)
+    finally:
+        queue.stop()
+    assert "Subject: orphan" in handler.messages[0]
+    assert not orphan_dir.exists()
+
+
+def test_payment_verification_does_not_wait_for_smtp(smtp, tmp_path, monkeypatch, client, user):
+    handler = smtp(RecordingHandler(delay=1.0))
+    queue = MailQueue(tmp_path)
+    monkeypatch.setattr(main, "mail_queue", queue)
+    monkeypatch.setattr(main, "MAIL_ENABLED", True)
+    book_id = create_books(1)[0]
+    order_id = client.post("/buy", json={"book_id": book_id}, headers=user).json()["order_id"]
+    try:
+        start = time.perf_counter()
+        res = client.post("/payment/verify", params={"order_id": order_id}, headers=user)
+        elapsed = time.perf_counter() - start
+        assert res.status_code == 200
+        assert elapsed < 0.5
+        assert wait_for(lambda: queue.stats()["sent"] == 1)
+    finally:
+        queue.stop()
+    assert f"Order #{order_id}" in handler.messages[0]
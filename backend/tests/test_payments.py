@@ -0,0 +1,97 @@
+"""Payment verification under retries and concurrent calls"""
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from conftest import create_books, create_user
+from idempotency import IDEMPOTENCY_HEADER
+from models import Entitlement, Order
+
+
+class RecordingQueue:
+    """Stands in for the mail queue and counts enqueued emails per subject"""
+
+    def __init__(self):
+        self.subjects = Counter()
+        self._lock = threading.Lock()
+
+    def enqueue(self, to, subject, body):
+        with self._lock:
+            self.subjects[subject] += 1
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    queue = RecordingQueue()
+    monkeypatch.setattr(main, "mail_queue", queue)
+    monkeypatch.setattr(main, "MAIL_ENABLED", True)
+    return queue
+
+
+def checkout(client, headers, book_ids) -> int:
+    return client.post("/cart/checkout", json={"book_ids": book_ids}, headers=headers).json()["order_id"]
+
+
+def test_concurrent_verifications_pay_each_order_once(client, user, outbox, db):
+    book_ids = create_books(12)
+    order_ids = [checkout(client, user, book_ids[i:i + 3]) for i in range(0, 12, 3)]
+    calls = [(order_id, attempt) for attempt in range(8) for order_id in order_ids]
+
+    def verify(call):
+        order_id, attempt = call
+        headers = dict(user)
+        if attempt % 2:
+            headers[IDEMPOTENCY_HEADER] = f"verify-{order_id}"
+        return client.post("/payment/verify", params={"order_id": order_id}, headers=headers)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        responses = list(pool.map(verify, calls))
+
+    assert {res.status_code for res in responses} == {200}
+    assert {res.json()["status"] for res in responses} == {"paid"}
+    assert outbox.subjects == Counter({f"Payment SUCCESS - Order #{order_id}": 1 for order_id in order_ids})
+    assert {status for (status,) in db.query(Order.status).filter(Order.id.in_(order_ids))} == {"paid"}
+    assert sorted(book_id for (book_id,) in db.query(Entitlement.book_id)) == book_ids
+
+
+def test_idempotency_key_replays_the_first_response(client, user, outbox):
+    order_id = checkout(client, user, create_books(1))
+    headers = dict(user, **{IDEMPOTENCY_HEADER: "retry-1"})
+    first = client.post("/payment/verify", params={"order_id": order_id}, headers=headers)
+    retry = client.post("/payment/verify", params={"order_id": order_id}, headers=headers)
+    assert first.json() == retry.json()
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert sum(outbox.subjects.values()) == 1
+
+
+def test_idempotency_key_reused_for_another_request_is_rejected(client, user, outbox):
+    order_id = checkout(client, user, create_books(1))
+    headers = dict(user, **{IDEMPOTENCY_HEADER: "retry-2"})
+    assert client.post("/payment/verify", params={"order_id": order_id}, headers=headers).status_code == 200
+    res = client.post("/payment/verify", params={"order_id": order_id, "status": "failed"}, headers=headers)
+    assert res.status_code == 422
+    assert IDEMPOTENCY_HEADER in res.json()["detail"]
+
+
+def test_verifying_someone_elses_order_is_not_found(client, user, outbox):
+    order_id = checkout(client, user, create_books(1))
+    other = create_user("other@example.com")
+    assert client.post("/payment/verify", params={"order_id": order_id}, headers=other).status_code == 404
+    assert not outbox.subjects
+
+
+@pytest.mark.parametrize("count", [0, main.CART_MAX_BOOKS + 1])
+def test_checkout_rejects_empty_and_oversized_carts(client, user, count):
+    res = client.post("/cart/checkout", json={"book_ids": list(range(1, count + 1))}, headers=user)
+    assert res.status_code == 422
+    assert f"between 1 and {main.CART_MAX_BOOKS} books" in res.text
+
+
+def test_checkout_accepts_a_full_cart(client, user, db):
+    book_ids = create_books(main.CART_MAX_BOOKS)
+    order_id = checkout(client, user, book_ids)
+    assert db.get(Order, order_id).status == "pending"
@@ -0,0 +1,96 @@
+import textwrap
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+import profiling
+from conftest import run_backend
+from profiling import RequestStats, track_queries
+
+
+def test_failed_statements_are_counted_and_do_not_leak_timers():
+    engine = create_engine("sqlite://")
+    track_queries(engine)
+    stats = RequestStats()
+    token = profiling._current_request.set(stats)
+    try:
+        with engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+            assert not conn.info.get("request_query_start")
+    finally:
+        profiling._current_request.reset(token)
+    assert stats.statements == 2
+
+
+# PROFILING_ENABLED and METRICS_TOKEN are read at import, so these run the app
+# in a fresh interpreter with profiling switched on
+PROFILED_APP = """
+import manage
+manage.run_migrations()
+from fastapi.testclient import TestClient
+import main
+from db import SessionLocal
+from models import Book, User
+
+session = SessionLocal()
+session.add_all([
+    User(email="admin@example.com", password_hash="password123", role="admin"),
+    User(email="reader@example.com", password_hash="password123", role="user"),
+    Book(title="Book 1", author="Author", price=10, pdf_path="https://example.com/books/1.pdf"),
+])
+session.commit()
+session.close()
+client = TestClient(main.app)
+admin = {"email": "admin@example.com", "password": "password123"}
+reader = {"email": "reader@example.com", "password": "password123"}
+"""
+
+
+def run_profiled(code: str):
+    return run_backend(PROFILED_APP + textwrap.dedent(code), PROFILING_ENABLED="true", METRICS_TOKEN="secret")
+
+
+def test_responses_carry_server_timing():
+    run_profiled("""
+        res = client.get("/books")
+        assert res.status_code == 200, res.text
+        timing = dict(part.strip().split(";", 1) for part in res.headers["server-timing"].split(","))
+        assert set(timing) == {"total", "db", "ser"}, timing
+        assert 'desc="' in timing["db"] and not timing["db"].endswith('desc="0 queries"'), timing
+        assert float(timing["total"].split("=")[1]) > 0
+        # Errors are timed too
+        assert "server-timing" in client.get("/books", params={"sort": "popularity"}).headers
+    """)
+
+
+def test_metrics_require_the_token():
+    run_profiled("""
+        client.get("/books")
+        client.get("/books")
+        assert client.get("/metrics").status_code == 401
+        assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+        res = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/plain; version=0.0.4")
+        assert "# TYPE nopaper_http_requests_total counter" in res.text
+        assert 'nopaper_http_requests_total{method="GET",route="/books",status="200"} 2' in res.text, res.text
+    """)
+
+
+def test_only_admins_get_a_profile():
+    pytest.importorskip("pyinstrument")
+    run_profiled("""
+        for headers in ({}, reader, dict(reader, password="wrong")):
+            res = client.get("/books", headers=dict(headers, **{"X-Profile": "text"}))
+            assert res.status_code == 200
+            assert res.headers["content-type"] == "application/json", res.headers
+            assert res.json()[0]["title"] == "Book 1"
+
+        res = client.get("/books", headers=dict(admin, **{"X-Profile": "text"}))
+        assert res.status_code == 200
+        assert res.headers["content-type"].startswith("text/plain"), res.headers
+        assert "list_books" in res.text, res.text
+    """)
@@ -0,0 +1,32 @@
+"""The hot queries must be answered through indexes (query_plans.py as a test)"""
+import query_plans
+from conftest import create_books, create_user, grant_books
+from db import engine
+from models import Order
+
+
+def seed_orders():
+    user = create_user()
+    book_ids = create_books(30)
+    for i in range(10):
+        grant_books(user["email"], book_ids[i * 3:i * 3 + 3])
+
+
+def test_hot_queries_use_indexes(capsys):
+    seed_orders()
+    assert query_plans.check() == 0, capsys.readouterr().out
+
+
+def test_missing_index_is_reported(capsys):
+    seed_orders()
+    index = next(index for index in Order.__table__.indexes if index.name == "ix_orders_created_at_id")
+    index.drop(engine)
+    # Pooled SQLite connections can go on planning with the schema they had
+    # cached; start the check from fresh ones
+    engine.dispose()
+    try:
+        assert query_plans.check() > 0, capsys.readouterr().out
+        assert "FULL SCAN  admin_orders_page: orders" in capsys.readouterr().out
+    finally:
+        index.create(engine)
+        engine.dispose()
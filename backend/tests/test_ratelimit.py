@@ -0,0 +1,119 @@
+import pytest
+
+import main
+import ratelimit
+from conftest import StatementCounter, run_backend
+from ratelimit import MemoryBucketStore, RateLimiter, RedisBucketStore
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    """Turn rate limiting on with small limits for the duration of a test"""
+    rules = dict(ratelimit.RATE_LIMIT_RULES, login_email="2/60", login_ip="100/60", register_ip="2/3600", auth_email="2/60")
+    limiter = RateLimiter(MemoryBucketStore(), rules, enabled=True)
+    monkeypatch.setattr(main, "rate_limiter", limiter)
+    return limiter
+
+
+def test_bucket_allows_a_burst_then_refills(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    store = MemoryBucketStore()
+    assert [store.take("k", 3, 0.5)[0] for _ in range(4)] == [True, True, True, False]
+    assert store.take("k", 3, 0.5)[1] == pytest.approx(2.0)
+    now[0] += 2.0
+    assert store.take("k", 3, 0.5)[0]
+    assert not store.take("k", 3, 0.5)[0]
+
+
+def test_memory_store_drops_least_recently_used_buckets():
+    store = MemoryBucketStore(max_keys=2)
+    for key in ("a", "b", "c"):
+        store.take(key, 1, 1)
+    assert len(store) == 2
+    # "a" was dropped and comes back full
+    assert store.take("a", 1, 0.001)[0]
+
+
+def test_login_is_throttled_per_email_before_touching_the_database(client, limiter, user):
+    attempt = {"email": user["email"], "password": "wrong-password"}
+    assert [client.post("/login", json=attempt).status_code for _ in range(2)] == [400, 400]
+    # Same address with different case and spacing shares the bucket
+    with StatementCounter() as statements:
+        res = client.post("/login", json=dict(attempt, email=f"  {user['email'].upper()}"))
+    assert res.status_code == 429
+    assert int(res.headers["Retry-After"]) >= 1
+    assert len(statements) == 0
+    assert limiter.stats()["throttled"]["login_email"] == 1
+    # Another account is not affected
+    assert client.post("/login", json={"email": "other@example.com", "password": "x"}).status_code == 400
+
+
+def test_register_is_throttled_per_ip(client, limiter):
+    codes = [
+        client.post("/register", json={"email": f"new{i}@example.com", "password": "Password123!"}).status_code
+        for i in range(3)
+    ]
+    assert codes[2] == 429
+    assert limiter.stats()["throttled"]["register_ip"] == 1
+
+
+def test_header_auth_failures_are_throttled(client, limiter, user):
+    # Uses one of the two attempts: the credentials were not cached yet
+    assert client.get("/me/library", headers=user).status_code == 200
+    headers = {"email": user["email"], "password": "wrong-password"}
+    codes = [client.get("/me/library", headers=headers).status_code for _ in range(3)]
+    assert codes == [401, 429, 429]
+    # Credentials already in the auth cache never reach the limiter
+    assert [client.get("/me/library", headers=user).status_code for _ in range(3)] == [200, 200, 200]
+
+
+def test_store_errors_let_requests_through():
+    class BrokenStore:
+        def take(self, key, capacity, rate):
+            raise ConnectionError("store unavailable")
+
+        def __len__(self):
+            return 0
+
+    limiter = RateLimiter(BrokenStore(), {"login_ip": "1/60"}, enabled=True)
+    assert limiter.check(("login_ip", "1.2.3.4"), ("login_ip", "1.2.3.4")) is None
+    assert limiter.stats()["store_errors"] == 2
+
+
+def test_redis_buckets_are_shared_between_workers():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")  # fakeredis runs Lua scripts through lupa
+    server = fakeredis.FakeServer()
+    workers = [RedisBucketStore(client=fakeredis.FakeRedis(server=server)) for _ in range(2)]
+    assert workers[0].take("login_email:a@example.com", 2, 1 / 30) == (True, 0.0)
+    assert workers[1].take("login_email:a@example.com", 2, 1 / 30)[0]
+    allowed, retry_after = workers[0].take("login_email:a@example.com", 2, 1 / 30)
+    assert not allowed
+    assert 0 < retry_after <= 30
+
+
+def register(client, i, forwarded_for=None):
+    headers = {"X-Forwarded-For": forwarded_for} if forwarded_for else None
+    return client.post("/register", json={"email": f"fwd{i}@example.com", "password": "Password123!"}, headers=headers).status_code
+
+
+def test_register_limit_is_per_forwarded_client(client, limiter, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_FORWARDED", True)
+    # Every request arrives from the same proxy; the proxy appends the caller
+    assert [register(client, i, "203.0.113.7") for i in range(3)] == [200, 200, 429]
+    assert register(client, 3, "203.0.113.8") == 200
+    # A client cannot dodge its bucket by prepending a forged entry
+    assert register(client, 4, "198.51.100.1, 203.0.113.7") == 429
+
+
+def test_forwarded_header_is_ignored_unless_trusted(client, limiter, monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_TRUST_FORWARDED", False)
+    assert [register(client, i, f"203.0.113.{i}") for i in range(3)] == [200, 200, 429]
+
+
+def test_trust_forwarded_defaults_on_behind_render_or_railway():
+    unset = dict(RENDER="", RAILWAY_ENVIRONMENT_ID="", RAILWAY_ENVIRONMENT="")
+    for env, expected in ((dict(RENDER="true"), "True"), (dict(RAILWAY_ENVIRONMENT_ID="abc"), "True"), ({}, "False")):
+        result = run_backend("import ratelimit; print(ratelimit.RATE_LIMIT_TRUST_FORWARDED)", **dict(unset, **env))
+        assert result.stdout.split()[-1] == expected, env
@@ -0,0 +1,116 @@
+import random
+import threading
+
+from conftest import create_books, rebuild_search_index
+from db import SessionLocal
+from models import Book
+from search import PREFIX_MATCH_FACTOR, SearchIndex, _escape_like, database_search, tokenize
+
+WORDS = "river rivet road robin rose stone stove star start glass globe night north noon".split()
+
+
+def scan_search(index: SearchIndex, query: str, limit: int, offset: int) -> list:
+    """Reference ranking: score every matching book"""
+    totals = None
+    for token in dict.fromkeys(tokenize(query)):
+        scores = {}
+        for term in index._expand(token):
+            factor = 1.0 if term == token else PREFIX_MATCH_FACTOR
+            for book_id, weight in index._postings[term].items():
+                scores[book_id] = max(scores.get(book_id, 0.0), weight * factor)
+        totals = scores if totals is None else {b: t + scores[b] for b, t in totals.items() if b in scores}
+    ranked = sorted((totals or {}).items(), key=lambda item: (-item[1], item[0]))
+    return [book_id for book_id, _ in ranked[offset:offset + limit]]
+
+
+def test_ranking_matches_a_full_scan():
+    rng = random.Random(7)
+    index = SearchIndex()
+    for book_id in range(1, 400):
+        index._add(
+            book_id,
+            " ".join(rng.choices(WORDS, k=3)),
+            rng.choice(WORDS),
+            " ".join(rng.choices(WORDS, k=rng.randint(0, 6))),
+        )
+    for book_id in rng.sample(range(1, 400), 50):
+        index.remove(book_id)
+    queries = WORDS + [word[:n] for word in WORDS for n in (1, 2, 3)]
+    queries += [" ".join(rng.sample(queries, rng.randint(2, 3))) for _ in range(200)]
+    for query in queries:
+        for limit, offset in ((20, 0), (5, 3), (1, 0), (100, 40)):
+            assert index.search(query, limit, offset) == scan_search(index, query, limit, offset), query
+
+
+def test_search_endpoint_ranks_title_matches_first(client):
+    create_books(1, title="Notes", description="a garden in winter")
+    title_id = create_books(1, title="The Winter Garden", description="notes")[0]
+    rebuild_search_index()
+    res = client.get("/books/search", params={"q": "winter gar"})
+    assert res.status_code == 200
+    assert [book["id"] for book in res.json()][0] == title_id
+
+
+class PausingSession:
+    """Wraps a session so the index build pauses mid-scan until released"""
+
+    def __init__(self, session, scanning: threading.Event, resume: threading.Event):
+        self.session, self.scanning, self.resume = session, scanning, resume
+
+    def query(self, *columns):
+        rows = self.session.query(*columns).order_by(Book.id).all()
+        scanning, resume = self.scanning, self.resume
+
+        class Query:
+            def order_by(self, *args):
+                return self
+
+            def yield_per(self, size):
+                for i, row in enumerate(rows):
+                    if i == 1:
+                        scanning.set()
+                        resume.wait(10)
+                    yield row
+
+        return Query()
+
+
+def test_changes_during_a_rebuild_survive_the_swap():
+    book_ids = create_books(3, title="Lantern")
+    index = SearchIndex()
+    session = SessionLocal()
+    scanning, resume = threading.Event(), threading.Event()
+    build = threading.Thread(target=index.build, args=(PausingSession(session, scanning, resume),))
+    try:
+        build.start()
+        assert scanning.wait(10)
+        # A book created and one deleted while the build has already read the table
+        db = SessionLocal()
+        try:
+            new_book = Book(title="Lantern Night", author="A", price=5, description="", pdf_path="x")
+            db.add(new_book)
+            db.commit()
+            db.refresh(new_book)
+            index.add(new_book)
+            index.remove(book_ids[2])
+        finally:
+            db.close()
+        resume.set()
+        build.join(10)
+    finally:
+        session.close()
+    assert index.ready
+    assert sorted(index.search("lantern", limit=10)) == sorted([book_ids[0], book_ids[1], new_book.id])
+
+
+def test_database_search_matches_underscores_literally():
+    create_books(1, title="A snake_case guide")
+    create_books(1, title="A snakeXcase guide")
+    create_books(1, title="Percent 100% done")
+    db = SessionLocal()
+    try:
+        assert [db.get(Book, book_id).title for book_id in database_search(db, "snake_case")] == ["A snake_case guide"]
+        assert len(database_search(db, "guide")) == 2
+    finally:
+        db.close()
+    assert _escape_like("100%_\\") == "100\\%\\_\\\\"
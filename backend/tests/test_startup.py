@@ -0,0 +1,24 @@
+"""Cold start: importing main stays cheap and never touches the database"""
+import manage
+from conftest import run_backend
+
+
+def test_import_time_is_within_budget():
+    total, children = manage.measure_import_time("main")
+    slowest = ", ".join(f"{name} {cumulative / 1000:.0f}ms" for cumulative, name in sorted(children, reverse=True)[:5])
+    assert total / 1000 <= manage.IMPORT_TIME_BUDGET_MS, slowest
+
+
+def test_optional_subsystems_load_lazily():
+    result = run_backend("""
+        import sys
+        import main
+        print(",".join(m for m in ("smtplib", "email.mime.text", "PIL", "pyinstrument", "redis") if m in sys.modules))
+    """)
+    assert result.stdout.strip() == ""
+
+
+def test_import_does_not_connect_to_the_database(tmp_path):
+    missing = tmp_path / "no-such-dir" / "nopaper.db"
+    run_backend("import main", DB_URL=f"sqlite:///{missing}")
+    assert not missing.parent.exists()
@@ -19,6 +19,9 @@ function AdminDashboard() {
   });
   const [books, setBooks] = useState([]);
   const [orders, setOrders] = useState([]);
+  // X-Next-Cursor of the last orders page; null once every order is loaded
+  const [ordersCursor, setOrdersCursor] = useState(null);
+  const [loadingOrders, setLoadingOrders] = useState(false);
   const [stats, setStats] = useState({});
   const [loading, setLoading] = useState(false);
   const [expandedDescriptions, setExpandedDescriptions] = useState(new Set());
@@ -39,14 +42,21 @@ function AdminDashboard() {
     }
   }, [email, password]);
 
-  const fetchOrders = useCallback(async () => {
+  // /admin/orders returns one page, newest first, and the cursor of the next
+  // page in the X-Next-Cursor header
+  const fetchOrders = useCallback(async (cursor = null) => {
+    setLoadingOrders(true);
     try {
       const res = await axios.get(`${API_URL}/admin/orders`, {
         headers: { email, password },
+        params: cursor ? { cursor } : {},
       });
-      setOrders(res.data);
+      setOrders((prev) => (cursor ? [...prev, ...res.data] : res.data));
+      setOrdersCursor(res.headers["x-next-cursor"] || null);
     } catch (e) {
       console.error("Failed to fetch orders:", e);
+    } finally {
+      setLoadingOrders(false);
     }
   }, [email, password]);
 
@@ -382,7 +392,7 @@ function AdminDashboard() {
                 <div key={book.id} className="book-card-admin">
                   {book.cover_url && (
                     <div className="book-cover-admin">
-                      <img src={book.cover_url} alt={`${book.title} cover`} onError={(e) => { e.target.style.display = 'none'; }} />
+                      <img src={`${API_URL}/books/${book.id}/cover?w=320`} srcSet={`${API_URL}/books/${book.id}/cover?w=640 2x`} alt={`${book.title} cover`} onError={(e) => { e.target.style.display = 'none'; }} />
                     </div>
                   )}
                   <div className="book-header-admin">
@@ -468,6 +478,15 @@ function AdminDashboard() {
               {orders.length === 0 && (
                 <p className="no-data">No purchases yet</p>
               )}
+              {ordersCursor && (
+                <button
+                  className="load-more-btn"
+                  onClick={() => fetchOrders(ordersCursor)}
+                  disabled={loadingOrders}
+                >
+                  {loadingOrders ? "Loading..." : "Load older orders"}
+                </button>
+              )}
             </div>
           </div>
         )}
@@ -219,7 +219,7 @@ function UserDashboard() {
             <div key={b.id} className={`book-card ${b.is_purchased ? 'purchased' : ''}`}>
               {b.cover_url && (
                 <div className="book-cover">
-                  <img src={b.cover_url} alt={`${b.title} cover`} onError={(e) => { e.target.style.display = 'none'; }} />
+                  <img src={`${API_URL}/books/${b.id}/cover?w=320`} srcSet={`${API_URL}/books/${b.id}/cover?w=640 2x`} alt={`${b.title} cover`} onError={(e) => { e.target.style.display = 'none'; }} />
                 </div>
               )}
               <div className="book-header">
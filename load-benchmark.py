@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""Load benchmark: measure request throughput of a running backend.
+
+Run it once against a server started with DB_ASYNC=false and once with
+DB_ASYNC=true to compare the sync and async database paths, e.g.
+
+    python load-benchmark.py --path /books --path /books/1/download \
+        --email user@example.com --password password123 --concurrency 200
+"""
+import argparse
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def fetch(url, headers):
+    req = urllib.request.Request(url, headers=headers)
+    opener = urllib.request.build_opener(NoRedirect)
+    start = time.perf_counter()
+    try:
+        with opener.open(req, timeout=30) as res:
+            res.read()
+            code = res.status
+    except urllib.error.HTTPError as e:
+        code = e.code
+    except Exception:
+        code = 0
+    return code, time.perf_counter() - start
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    # Download endpoints redirect to third-party PDF hosts; time only our server
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def run(base_url, path, headers, total, concurrency):
+    url = base_url.rstrip("/") + path
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: fetch(url, headers), range(total)))
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for _, latency in results)
+    ok = sum(1 for code, _ in results if 200 <= code < 400)
+    print(f"{path}")
+    print(f"  requests: {total}  ok: {ok}  errors: {total - ok}")
+    print(f"  throughput: {total / elapsed:.1f} req/s")
+    print(f"  latency p50: {latencies[len(latencies) // 2] * 1000:.1f} ms"
+          f"  p99: {latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--path", action="append", help="Endpoint path (repeatable, default /books)")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--email")
+    parser.add_argument("--password")
+    parser.add_argument("--token", help="Session token from /login")
+    args = parser.parse_args()
+
+    headers = {}
+    if args.token:
+        headers["Authorization"] = f"Bearer {args.token}"
+    elif args.email and args.password:
+        headers["email"] = args.email
+        headers["password"] = args.password
+
+    for path in args.path or ["/books"]:
+        run(args.url, path, headers, args.requests, args.concurrency)
+
+
+if __name__ == "__main__":
+    main()
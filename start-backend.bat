@@ -10,6 +10,8 @@ echo Backend URL: http://localhost:8000
 echo API Docs: http://localhost:8000/docs
 echo ========================================
 echo.
+echo Applying database migrations...
+alembic upgrade head || echo Migrations failed; starting the server anyway
 uvicorn main:app --reload --host 0.0.0.0 --port 8000
 pause
 
@@ -8,6 +8,9 @@ cd backend
 Write-Host "Backend URL: http://localhost:8000" -ForegroundColor Green
 Write-Host "API Docs: http://localhost:8000/docs" -ForegroundColor Cyan
 Write-Host ""
+Write-Host "Applying database migrations..." -ForegroundColor Yellow
+alembic upgrade head
+if ($LASTEXITCODE -ne 0) { Write-Host "Migrations failed; starting the server anyway" -ForegroundColor Red }
 Write-Host "Server starting..." -ForegroundColor Yellow
 Write-Host ""
 uvicorn main:app --reload --host 0.0.0.0 --port 8000